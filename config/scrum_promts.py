@@ -12,6 +12,7 @@ Analyze the development progress of user_story "{taiga_name}" (Ref: {taiga_ref})
 1. **Internal Analysis** *(Do not display in chat)*  
    - Retrieve the **User Story Status** from Taiga: Task progress, Comments, Completion status, Due date, URL link
    - Retrieve the last 3 days of messages from the corresponding **Discord chat thread** with the channel name: "#{taiga_ref} {taiga_name}".
+   - Both retrievals are independent: request them from the taiga and the discord worker in the same step.
    - **Compare Taiga and Discord data**:  
       - Identify key decisions, updates, blockers, or issues discussed in Discord.
       - Cross-check with Taiga tasks.
@@ -72,3 +73,17 @@ Analyze the initial state of user_story "{taiga_name}" (Ref: {taiga_ref}) in pro
 Deliver a clear, precise status update on User Story "#{taiga_ref} {taiga_name}" that reconciles the Taiga data.  
 Make concrete suggestions for closing tickets or further processing open tasks.
 '''
+
+# unchanged_standup_promt.format(taiga_ref=taiga_ref, taiga_name=taiga_name, url=url)
+# Posted without running the agents, when neither the user story nor the thread changed since the last run.
+unchanged_standup_promt = '''Good Morning Team :sunrise:
+
+No changes on User Story "#{taiga_ref} {taiga_name}" in Taiga or in this thread since the last update.
+{url}
+
+For today’s Daily Standup, please share:
+- What was completed yesterday?
+- What will be worked on today?
+- Are there any blockers or issues?
+
+Thank you!'''
@@ -0,0 +1,136 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict, deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional
+
+
+class JobPriority(IntEnum):
+    # Lower value = scheduled first
+    INTERACTIVE = 0  # Mentions and direct messages
+    SCHEDULED = 1  # Thread init, scrum master and other background jobs
+
+
+class _AgentJob:
+    def __init__(self, func: Callable[[], Awaitable], thread_id: str, priority: JobPriority, seq: int,
+                 future: asyncio.Future):
+        self.func = func
+        self.thread_id = thread_id
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+
+    def __lt__(self, other: "_AgentJob"):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AgentScheduler:
+    """
+    Bounded scheduler for agent invocations.
+
+    Jobs are coroutines (e.g. a graph ainvoke) that run on the event loop, at most max_async_jobs at a time.
+    Interactive jobs are always dispatched before scheduled ones, and jobs sharing a thread_id run strictly one after
+    another in the order they were submitted (so the checkpoint of a conversation is never written concurrently).
+    """
+
+    def __init__(self, max_async_jobs: int = 32, wait_history_size: int = 200):
+        self.max_async_jobs = max_async_jobs
+        self._free_async_slots = max_async_jobs
+        self._seq = itertools.count()
+
+        # Only the head job of each thread_id is in the ready heap, the rest waits in the per thread queue.
+        self._ready: [_AgentJob] = []
+        self._queued_by_thread: dict[str, deque] = defaultdict(deque)
+
+        self._wait_times = {p: deque(maxlen=wait_history_size) for p in JobPriority}
+        self._completed = {p: 0 for p in JobPriority}
+        self._failed = {p: 0 for p in JobPriority}
+
+    async def run_async(self, coro_func: Callable[[], Awaitable], thread_id: str,
+                        priority: JobPriority = JobPriority.SCHEDULED) -> Any:
+        """
+        Schedules a coroutine job (e.g. a graph ainvoke) on the event loop and waits for its result.
+
+        :param coro_func: Callable without arguments that returns the coroutine to run
+        :param thread_id: The graph thread_id. Jobs with the same thread_id are executed in FIFO order.
+        :param priority: Priority class of the job
+        :return: The result of the coroutine
+        """
+        loop = asyncio.get_running_loop()
+        job = _AgentJob(coro_func, thread_id, priority, next(self._seq), loop.create_future())
+
+        thread_queue = self._queued_by_thread[thread_id]
+        thread_queue.append(job)
+        if len(thread_queue) == 1:
+            heapq.heappush(self._ready, job)
+
+        self._dispatch(loop)
+        return await job.future
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        while self._free_async_slots > 0 and self._ready:
+            job = heapq.heappop(self._ready)
+            self._free_async_slots -= 1
+            self._start(job)
+
+            try:
+                exec_future = asyncio.ensure_future(job.func(), loop=loop)
+            except Exception as e:
+                # The job function failed before returning its coroutine
+                exec_future = loop.create_future()
+                exec_future.set_exception(e)
+            exec_future.add_done_callback(lambda f, j=job: self._on_job_done(loop, j, f))
+
+    def _start(self, job: _AgentJob):
+        job.started_at = time.monotonic()
+        self._wait_times[job.priority].append(job.started_at - job.enqueued_at)
+
+    def _on_job_done(self, loop: asyncio.AbstractEventLoop, job: _AgentJob, exec_future: asyncio.Future):
+        self._free_async_slots += 1
+
+        if exec_future.cancelled():
+            job.future.cancel()
+        elif exec_future.exception() is not None:
+            self._failed[job.priority] += 1
+            if not job.future.done():
+                job.future.set_exception(exec_future.exception())
+        else:
+            self._completed[job.priority] += 1
+            if not job.future.done():
+                job.future.set_result(exec_future.result())
+
+        thread_queue = self._queued_by_thread[job.thread_id]
+        thread_queue.popleft()
+        if thread_queue:
+            heapq.heappush(self._ready, thread_queue[0])
+        else:
+            del self._queued_by_thread[job.thread_id]
+
+        self._dispatch(loop)
+
+    def queue_depth(self, priority: Optional[JobPriority] = None) -> int:
+        """Number of jobs waiting (not running) overall or for one priority class."""
+        running = self.max_async_jobs - self._free_async_slots
+        if priority is None:
+            return sum(len(q) for q in self._queued_by_thread.values()) - running
+        return sum(1 for q in self._queued_by_thread.values() for job in q
+                   if job.priority == priority and job.started_at is None)
+
+    def get_metrics(self) -> dict:
+        metrics = {"async_slots": self.max_async_jobs,
+                   "busy_async_slots": self.max_async_jobs - self._free_async_slots,
+                   "queue_depth": self.queue_depth()}
+        for priority in JobPriority:
+            waits = self._wait_times[priority]
+            metrics[priority.name.lower()] = {
+                "queue_depth": self.queue_depth(priority),
+                "completed": self._completed[priority],
+                "failed": self._failed[priority],
+                "avg_wait_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "max_wait_s": round(max(waits), 3) if waits else 0.0,
+            }
+        return metrics
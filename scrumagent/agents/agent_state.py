@@ -1,4 +1,6 @@
 from langgraph.graph import MessagesState
 
 class State(MessagesState):
-    next: str
\ No newline at end of file
+    next: str | list[str]
+    # Rolling summary of the messages that were removed from the history (MAX_MSG_MODE="summary")
+    summary: str
\ No newline at end of file
@@ -1,10 +1,11 @@
 import os
-import time
 
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 
+from scrumagent.agents.prompt_layout import cache_friendly_prompt
+
 from scrumagent.tools.discord_tool import (
     discord_search_tool,
     discord_channel_msgs_tool,
@@ -19,7 +20,7 @@ Agent for Discord Chat
 DISCORD_GUILD_ID = os.getenv("DISCORD_GUILD_ID")
 
 # llm = ChatOpenAI(model_name="o3-mini")
-llm = ChatOpenAI(model_name="gpt-4o-mini")
+llm = ChatOpenAI(model_name="gpt-4o-mini", stream_usage=True)
 
 discord_search_agent = create_react_agent(
     llm,
@@ -37,7 +38,7 @@ discord_search_agent = create_react_agent(
     # "   - **Output:** Returns a confirmation message that includes the sent message content and its message ID.\n\n"
 
     # Build the state modifier prompt for the agent
-    state_modifier=(
+    state_modifier=cache_friendly_prompt(
         "You are a Discord Expert Agent with in-depth knowledge of the company's Discord server. "
         "Your role is to assist with managing and extracting information from the server by selecting the most appropriate tool for each request. "
         "Below are the tools available to you along with detailed descriptions and usage guidelines:\n\n"
@@ -66,7 +67,7 @@ discord_search_agent = create_react_agent(
         "Only prompt the user for clarification if you are 100% sure that the necessary information cannot be derived automatically from context or by available helper tools.\n\n"
 
         "Additional Context:\n"
-        f"- Current timestamp: {time.time()}\n"
+        "- Current timestamp: see the request context after the conversation\n"
         f"- Discord Guild ID: {os.getenv('DISCORD_GUILD_ID')}\n\n"
 
         "Remember: Your goal is to orchestrate these tools effectively to retrieve, process, and deliver the correct information from the Discord server."
@@ -0,0 +1,252 @@
+import math
+import os
+import re
+import threading
+from collections import OrderedDict, Counter
+from typing import Literal, NamedTuple, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage
+from langchain_openai import OpenAIEmbeddings
+from langgraph.types import Command
+
+from .agent_state import State
+from .supervisor_agent import members, history_exceeds_limit
+
+FAST_ROUTER_MIN_SIMILARITY = float(os.getenv("FAST_ROUTER_MIN_SIMILARITY", 0.6))
+FAST_ROUTER_MIN_MARGIN = float(os.getenv("FAST_ROUTER_MIN_MARGIN", 0.08))
+
+# Only the user's text is classified, not the metadata the bot appends to it (channel name, attachments, ...)
+DISCORD_MSG_REGEX = re.compile(r"^DiscordMsg: (?P<content>.*?) \(From user: ", re.DOTALL)
+USER_STORY_CONTEXT_REGEX = re.compile(r"\(Corresponding taiga user story id: \d+\)")
+
+# (node, pattern). A rule only fires if all matching rules point to the same node.
+ROUTING_RULES = [
+    ("taiga", re.compile(r"\btaiga\b|\buser ?stor(y|ies)\b|\bsprints?\b|\bbacklog\b", re.IGNORECASE)),
+    ("discord", re.compile(r"\b(search|find|look up|check)\b.{0,40}\b(discord|chat|channel|thread)s?\b|"
+                           r"\b(discord|channel|chat)\b.{0,20}\b(messages?|history|posts?)\b", re.IGNORECASE)),
+    ("web_browser", re.compile(r"\b(search|look up|browse)\b.{0,20}\b(web|internet|online)\b|"
+                               r"\b(google|duckduckgo|arxiv|wikipedia|youtube)\b", re.IGNORECASE)),
+]
+
+# In a user story thread these requests always mean the story of the thread
+USER_STORY_ACTION_REGEX = re.compile(
+    r"\b(update|set|change|assign|close|create|add|move|rename|mark)\b.{0,40}"
+    r"\b(task|status|description|watchers?|assignee|due date|done|closed|in progress)\b", re.IGNORECASE)
+
+# Labelled examples for the embedding classifier
+ROUTING_EXAMPLES = {
+    "taiga": [
+        "Set the status of this user story to in progress",
+        "Create a new task for writing the documentation",
+        "Who is assigned to this story?",
+        "What are the open user stories in the current sprint?",
+        "Add Anna as a watcher",
+        "Close the task about the login page",
+        "Change the description of the story",
+        "Which tasks are still open?",
+    ],
+    "discord": [
+        "What did we discuss about the deployment last week?",
+        "Find the message where someone posted the server password",
+        "Summarize the recent messages in the general channel",
+        "Who talked about the database migration?",
+        "Search the chat for the meeting notes",
+        "Send a message to the team channel",
+    ],
+    "web_browser": [
+        "Find recent papers about retrieval augmented generation",
+        "What is the latest version of Python?",
+        "Look up the documentation of the discord.py library",
+        "Search for a tutorial on docker compose",
+        "What does the Wikipedia article say about Scrum?",
+        "Find a YouTube video explaining kubernetes",
+    ],
+}
+
+
+class RouteDecision(NamedTuple):
+    node: str
+    confidence: float
+    reason: str  # "rule", "user_story_rule" or "embedding"
+
+
+class FastRouter:
+    """
+    Cheap pre-router in front of the supervisor for unambiguous requests.
+
+    Keyword/regex rules are checked first, then the message is compared to labelled examples by embedding
+    similarity (the example embeddings are computed once, query embeddings are kept in a small LRU cache).
+    If no route is confident enough, None is returned and the LLM supervisor decides as usual.
+    """
+
+    def __init__(self, embeddings: Embeddings = None, examples: dict = None,
+                 min_similarity: float = FAST_ROUTER_MIN_SIMILARITY, min_margin: float = FAST_ROUTER_MIN_MARGIN,
+                 max_cached_queries: int = 512):
+        self.examples = examples if examples is not None else ROUTING_EXAMPLES
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.max_cached_queries = max_cached_queries
+
+        self._embeddings = embeddings
+        self._example_vectors: Optional[list[tuple[str, list[float]]]] = None
+        self._query_cache: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        return self._embeddings
+
+    def route(self, text: str, in_user_story_thread: bool = False) -> Optional[RouteDecision]:
+        decision = self._route_by_rules(text, in_user_story_thread)
+        if decision is None and self.examples:
+            try:
+                decision = self._route_by_embedding(text)
+            except Exception as e:
+                print(f"Fast router embedding classification failed: {e!r}")
+        return self._record(decision)
+
+    async def aroute(self, text: str, in_user_story_thread: bool = False) -> Optional[RouteDecision]:
+        """Async variant of route, the embeddings are requested without blocking the event loop."""
+        decision = self._route_by_rules(text, in_user_story_thread)
+        if decision is None and self.examples:
+            try:
+                decision = await self._aroute_by_embedding(text)
+            except Exception as e:
+                print(f"Fast router embedding classification failed: {e!r}")
+        return self._record(decision)
+
+    def _record(self, decision: Optional[RouteDecision]) -> Optional[RouteDecision]:
+        with self._lock:
+            self._stats["turns"] += 1
+            if decision:
+                self._stats[f"{decision.reason}_hits"] += 1
+                self._stats[f"node_{decision.node}"] += 1
+            else:
+                self._stats["fallbacks"] += 1
+        return decision
+
+    def _route_by_rules(self, text: str, in_user_story_thread: bool) -> Optional[RouteDecision]:
+        matched_nodes = {node for node, pattern in ROUTING_RULES if pattern.search(text)}
+        if len(matched_nodes) == 1:
+            return RouteDecision(matched_nodes.pop(), 1.0, "rule")
+        if not matched_nodes and in_user_story_thread and USER_STORY_ACTION_REGEX.search(text):
+            return RouteDecision("taiga", 1.0, "user_story_rule")
+        # Several nodes matched: the request needs more than one worker, the supervisor has to plan it
+        return None
+
+    def _labelled_examples(self) -> list[tuple[str, str]]:
+        return [(node, example) for node, examples in self.examples.items() for example in examples]
+
+    def _route_by_embedding(self, text: str) -> Optional[RouteDecision]:
+        if self._example_vectors is None:
+            labelled = self._labelled_examples()
+            vectors = self.embeddings.embed_documents([example for _, example in labelled])
+            self._example_vectors = [(node, _normalize(v)) for (node, _), v in zip(labelled, vectors)]
+
+        return self._classify(self._embed_query(text))
+
+    async def _aroute_by_embedding(self, text: str) -> Optional[RouteDecision]:
+        if self._example_vectors is None:
+            labelled = self._labelled_examples()
+            vectors = await self.embeddings.aembed_documents([example for _, example in labelled])
+            self._example_vectors = [(node, _normalize(v)) for (node, _), v in zip(labelled, vectors)]
+
+        query = self._cached_query(text)
+        if query is None:
+            query = self._cache_query(text, _normalize(await self.embeddings.aembed_query(text)))
+        return self._classify(query)
+
+    def _classify(self, query: list[float]) -> Optional[RouteDecision]:
+        best_per_node = {}
+        for node, vector in self._example_vectors:
+            similarity = sum(a * b for a, b in zip(query, vector))
+            best_per_node[node] = max(similarity, best_per_node.get(node, -1.0))
+
+        ranked = sorted(best_per_node.items(), key=lambda item: item[1], reverse=True)
+        best_node, best_similarity = ranked[0]
+        margin = best_similarity - ranked[1][1] if len(ranked) > 1 else best_similarity
+        if best_similarity >= self.min_similarity and margin >= self.min_margin:
+            return RouteDecision(best_node, best_similarity, "embedding")
+        return None
+
+    def _embed_query(self, text: str) -> list[float]:
+        vector = self._cached_query(text)
+        if vector is None:
+            vector = self._cache_query(text, _normalize(self.embeddings.embed_query(text)))
+        return vector
+
+    def _cached_query(self, text: str) -> Optional[list[float]]:
+        with self._lock:
+            if text in self._query_cache:
+                self._query_cache.move_to_end(text)
+                return self._query_cache[text]
+        return None
+
+    def _cache_query(self, text: str, vector: list[float]) -> list[float]:
+        with self._lock:
+            self._query_cache[text] = vector
+            while len(self._query_cache) > self.max_cached_queries:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        turns = stats.get("turns", 0)
+        hits = turns - stats.get("fallbacks", 0)
+        return {**stats, "hit_rate": round(hits / turns, 3) if turns else 0.0}
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+fast_router = FastRouter()
+
+
+def _routable_request(state: State) -> Optional[tuple[str, bool]]:
+    """The user text and whether it was sent in a user story thread, or None if the supervisor has to plan."""
+    messages = state["messages"]
+    last_message = messages[-1] if messages else None
+
+    # Longer histories go to the supervisor, it trims/summarizes them before any worker sees them
+    if not isinstance(last_message, HumanMessage) or history_exceeds_limit(messages):
+        return None
+
+    match = DISCORD_MSG_REGEX.match(last_message.content if isinstance(last_message.content, str) else "")
+    if not match:
+        # Scheduled prompts (scrum master, thread init) are planned by the supervisor
+        return None
+    return match.group("content"), bool(USER_STORY_CONTEXT_REGEX.search(last_message.content))
+
+
+def _route_command(decision: Optional[RouteDecision]) -> Command:
+    if decision is None or decision.node not in members:
+        return Command(goto="supervisor")
+
+    print(f"Fast router: {decision.node} ({decision.reason}, confidence {decision.confidence:.2f})")
+    return Command(goto=decision.node, update={"next": decision.node})
+
+
+def fast_router_node(state: State) -> Command[Literal["supervisor", *members]]:
+    """
+    Entry node of the graph if FAST_ROUTER is active. Unambiguous discord requests go straight to their worker,
+    everything else (and every later hop) is handled by the supervisor.
+    """
+    request = _routable_request(state)
+    if request is None:
+        return Command(goto="supervisor")
+    return _route_command(fast_router.route(*request))
+
+
+async def afast_router_node(state: State) -> Command[Literal["supervisor", *members]]:
+    """Async variant of fast_router_node."""
+    request = _routable_request(state)
+    if request is None:
+        return Command(goto="supervisor")
+    return _route_command(await fast_router.aroute(*request))
@@ -0,0 +1,35 @@
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+# Prompts are laid out as a byte-stable prefix (role, worker specs, output schema, conversation history) and a small
+# dynamic suffix (current time, conversation). Identical prefixes are served from the provider's prompt cache,
+# so nothing that changes per request may appear in the static system prompts.
+
+# Start of the request context message, the local response cache finds it by this prefix
+REQUEST_CONTEXT_PREFIX = "Request context:"
+
+
+def dynamic_context_message(conversation: str = None) -> SystemMessage:
+    """The per request context, appended after the history."""
+    # Minute resolution: identical requests of a conversation within a minute get identical prompts
+    now = int(time.time()) // 60 * 60
+    context = (f"{REQUEST_CONTEXT_PREFIX} the current time is "
+               f"{datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='minutes')} (Unix timestamp: {now}).")
+    if conversation:
+        context += f" Conversation: {conversation}."
+    return SystemMessage(content=context)
+
+
+def cache_friendly_prompt(static_prompt: str) -> Callable[[dict], list[BaseMessage]]:
+    """
+    Prompt for create_react_agent: the static system prompt first, the dynamic context after the messages.
+    """
+    system_message = SystemMessage(content=static_prompt)
+
+    def prompt(state: dict) -> list[BaseMessage]:
+        return [system_message] + state["messages"] + [dynamic_context_message()]
+
+    return prompt
@@ -0,0 +1,58 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a team chat with an AI scrum assistant. "
+    "Extend the current summary with the new messages. Keep every specific detail that may be needed later "
+    "(names, user story refs, task states, decisions, dates, links) and drop small talk. "
+    "Answer only with the updated summary, at most 400 words."
+)
+
+
+def split_evicted(messages: list[BaseMessage], keep_recent: int) -> tuple[list, list]:
+    """
+    Splits the history into the messages to summarize and the recent ones that are kept verbatim.
+    The kept window starts at a human message, so a question is never separated from its answers.
+    """
+    cut = max(len(messages) - keep_recent, 0)
+    while cut < len(messages) - 1 and not isinstance(messages[cut], HumanMessage):
+        cut += 1
+    return messages[:cut], messages[cut:]
+
+
+def format_messages(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{m.name or m.type}: {m.content}" for m in messages)
+
+
+def summary_prompt(summary: str, evicted: list[BaseMessage]) -> list[BaseMessage]:
+    return [
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Current summary:\n{summary or '(empty)'}\n\n"
+                             f"New messages:\n{format_messages(evicted)}"),
+    ]
+
+
+def update_rolling_summary(llm: BaseChatModel, summary: str, evicted: list[BaseMessage]) -> str:
+    """Folds the evicted messages into the summary. Only the new messages are sent, not the whole history."""
+    if not evicted:
+        return summary
+    return llm.invoke(summary_prompt(summary, evicted)).content
+
+
+async def aupdate_rolling_summary(llm: BaseChatModel, summary: str, evicted: list[BaseMessage]) -> str:
+    """Async variant of update_rolling_summary."""
+    if not evicted:
+        return summary
+    return (await llm.ainvoke(summary_prompt(summary, evicted))).content
+
+
+def summary_messages(summary: str) -> list[BaseMessage]:
+    """The summary as context message for the prompts, empty if there is none yet."""
+    if not summary:
+        return []
+    return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")]
+
+
+def with_summary(state: dict) -> dict:
+    """Worker input: the state with the rolling summary in front of the recent messages."""
+    return {**state, "messages": summary_messages(state.get("summary", "")) + state["messages"]}
@@ -1,18 +1,23 @@
 import os
-import time
-from datetime import datetime
 from typing import Literal
 
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage, RemoveMessage, trim_messages
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END
 from langgraph.types import Command
 from typing_extensions import TypedDict
 
 from .agent_state import State
+from .prompt_layout import dynamic_context_message
+from .rolling_summary import split_evicted, summary_messages, update_rolling_summary, aupdate_rolling_summary
+from .token_budget import MessageTokenCounter
 
 MAX_MSG_COUNT = int(os.getenv("MAX_MSG_COUNT"))
 MAX_MSG_MODE = os.getenv("MAX_MSG_MODE")
+MAX_MSG_TOKENS = int(os.getenv("MAX_MSG_TOKENS", 8000))
+# Recent messages kept verbatim next to the rolling summary in MAX_MSG_MODE="summary"
+SUMMARY_KEEP_RECENT = min(int(os.getenv("SUMMARY_KEEP_RECENT", 10)), MAX_MSG_COUNT - 1)
 
 ACTIVATE_DEEPSEEK = os.getenv("ACTIVATE_DEEPSEEK", "").lower() in ("true", "1", "yes", "on")
 
@@ -82,6 +87,7 @@ Your job is to:
   1. Read and understand the user's request.
   2. Determine which worker(s) can best fulfill the request or sub-parts of it.
   3. Send sub-requests to each relevant worker and gather their partial responses.
+     Workers that don't depend on each other's results are called together in one step and run in parallel.
   4. Synthesize a complete, coherent final answer for the user by combining all relevant partial results.
   5. Provide this final answer clearly, then respond with "FINISH" at the very end and stop.
 
@@ -94,99 +100,142 @@ Instructions:
   • If the user references tasks in Taiga (issues, sprints, statuses, user stories), use 'taiga'.
   • If the user wants to search or retrieve messages from Discord, use 'discord'.
   • If the user needs a web or research query, use 'web_browser'.
+  • If the request needs data from several workers at the same time (e.g. the state of a user story in Taiga
+    and the related discussion in Discord), list all of them in "next". They run in parallel and you receive
+    all their results together. Only list workers sequentially if one needs the result of another.
+    'human_input' is never combined with other workers.
   • If you can answer the user's request directly (e.g., a general question like "tell me a joke"),
-    then do so yourself by setting "next": "FINISH" and placing your final answer in "messages".
+    then do so yourself by setting "next": ["FINISH"] and placing your final answer in "messages".
   • Always combine the results from any involved workers before giving your final response.
   • Once you have formed the final answer, output it clearly and do not respond further.
   • When you are ready to finalize, you may produce an internal END signal, but do not show the word END in the user-facing answer.
-  • Keep the current time and Unix timestamp in your thinking process.
+  • Keep the current time and Unix timestamp (given in the request context after the conversation) in your thinking process.
   
 When you respond, produce valid JSON **only**, with two keys:
-1. "next" — one of {options}
-2. "messages" — a string message.
+1. "next" — a list of one or more of {members}, or ["FINISH"]
+2. "messages" — a string message. If several workers are called, address each of them with its sub-request.
 
 Your entire output must look like this example (with your own contents):
 {{
-  "next": "taiga",
+  "next": ["taiga", "discord"],
   "messages": "Your message here"
 }}
 
 If no worker is needed, simply use:
 {{
-  "next": "FINISH",
+  "next": ["FINISH"],
   "messages": "Your final answer"
 }}
 
-The current time is {datetime.utcnow().isoformat()}.
-Unix timestamp: {time.time()}.
-
 Act as a careful orchestrator to ensure each worker is called appropriately, gather all partial results, then formulate a single final response that directly answers the user's request.
 """
 system_message = SystemMessage(content=system_prompt)
 
 
 class Router(TypedDict):
-    next: Literal[*options]
+    next: list[Literal[*options]]
     messages: str
 
 
+def resolve_next_nodes(next_nodes) -> list | str:
+    """
+    Maps the "next" of the Router to the nodes to run in the next step. Several workers run in parallel,
+    the graph joins them again at the supervisor. FINISH only ends the run if no worker was requested.
+    """
+    if isinstance(next_nodes, str):
+        next_nodes = [next_nodes]
+    workers = list(dict.fromkeys(n for n in next_nodes if n in members))
+    if not workers:
+        return END
+    # human_input interrupts the run, it can't run next to other workers
+    if "human_input" in workers:
+        return "human_input"
+    return workers[0] if len(workers) == 1 else workers
+
+
 # llm = ChatOpenAI(model_name="o3-mini")
-llm = ChatOpenAI(model_name="gpt-4o")
+llm = ChatOpenAI(model_name="gpt-4o", stream_usage=True)  # stream_usage: report token costs also when streaming
 
 trimmer = trim_messages(strategy="last", max_tokens=MAX_MSG_COUNT,
                         token_counter=len, start_on="human")
 
+# Budget in real tokens of the history (without the system prompt). Counts are cached per message id.
+token_counter = MessageTokenCounter(model_name="gpt-4o")
+token_trimmer = trim_messages(strategy="last", max_tokens=MAX_MSG_TOKENS,
+                              token_counter=token_counter, start_on="human")
+
+
+def history_exceeds_limit(messages: list) -> bool:
+    """True if the supervisor would trim or summarize this history."""
+    if MAX_MSG_MODE == "tokens":
+        return token_counter(messages) > MAX_MSG_TOKENS
+    return len(messages) > MAX_MSG_COUNT
+
 
-def supervisor_node(state: State) -> Command[Literal[*members, END]]:
+def compact_history(state: State) -> tuple[list, list, list]:
+    """
+    Applies MAX_MSG_MODE to the history.
+
+    :return: The messages for the prompt, the RemoveMessages for the dropped ones and the evicted messages that
+             still have to be folded into the rolling summary.
+    """
     messages = state["messages"]
 
-    if MAX_MSG_MODE == "trim":
+    if MAX_MSG_MODE in ("trim", "tokens"):
         # https://python.langchain.com/docs/how_to/chatbots_memory/#trimming-messages
         # https://python.langchain.com/docs/how_to/trim_messages/
-        trimmed_messages = trimmer.invoke(messages)
+        trimmed_messages = (token_trimmer if MAX_MSG_MODE == "tokens" else trimmer).invoke(messages)
+        if not trimmed_messages:
+            # A single message above the budget is still sent, otherwise the request would be lost
+            trimmed_messages = messages[-1:]
 
-        delete_messages = [RemoveMessage(id=m.id) for m in messages if m not in trimmed_messages]
+        kept_ids = {m.id for m in trimmed_messages}
+        return trimmed_messages, [RemoveMessage(id=m.id) for m in messages if m.id not in kept_ids], []
 
-        messages = [system_message] + trimmed_messages
-        response = llm.with_structured_output(Router).invoke(messages)
-        message_updates = delete_messages + [AIMessage(content=response["messages"], name="supervisor")]
+    if MAX_MSG_MODE == "summary" and len(messages) > MAX_MSG_COUNT:
+        # Rolling summary in its own state key. Only the messages evicted from the recent window are
+        # summarized, so the cost of a summary update doesn't grow with the history.
+        evicted, messages = split_evicted(messages, SUMMARY_KEEP_RECENT)
+        return messages, [RemoveMessage(id=m.id) for m in evicted], evicted
 
-    elif MAX_MSG_MODE == "summary" and len(messages) > MAX_MSG_COUNT:
-        # https://python.langchain.com/docs/how_to/chatbots_memory/#summary-memory
+    return messages, [], []
 
-        message_history = messages[:-1]  # exclude the most recent user input
-        last_human_message = messages[-1]
 
-        # Invoke the model to generate conversation summary
-        summary_prompt = (
-            "Distill the above chat messages into a single summary message. "
-            "Include as many specific details as you can."
-        )
-        summary_message = llm.invoke(
-            message_history + [HumanMessage(content=summary_prompt)]
-        )
-        summary_message.content = "Chat History: " + summary_message.content
+def supervisor_prompt(messages: list, summary: str, config: RunnableConfig) -> list:
+    # Static system prompt first, per request context last, so the prefix stays cacheable
+    context = [dynamic_context_message(conversation=config.get("configurable", {}).get("thread_id"))]
+    return [system_message] + summary_messages(summary) + messages + context
 
-        delete_messages = [RemoveMessage(id=m.id) for m in messages]
-        # Re-add user message
-        human_message = HumanMessage(content=last_human_message.content)
-        # Call the model with summary & response
-        response = llm.with_structured_output(Router).invoke([system_message, summary_message, human_message])
 
-        message_updates = delete_messages + [summary_message, human_message,
-                                             AIMessage(content=response["messages"], name="supervisor")]
+def supervisor_command(response: Router, delete_messages: list, state_updates: dict) -> Command:
+    print(f"Supervisor response: {response}")
 
+    goto = resolve_next_nodes(response["next"])
+    message_updates = delete_messages + [AIMessage(content=response["messages"], name="supervisor")]
 
-    else:
-        messages = [system_message] + messages
-        response = llm.with_structured_output(Router).invoke(messages)
-        message_updates = [AIMessage(content=response["messages"], name="supervisor")]
+    return Command(goto=goto, update={"next": goto, "messages": message_updates, **state_updates})
 
-    print(f"Supervisor response: {response}")
 
-    goto = response["next"]
+def supervisor_node(state: State, config: RunnableConfig) -> Command[Literal[*members, END]]:
+    messages, delete_messages, evicted = compact_history(state)
+    summary = state.get("summary", "") if MAX_MSG_MODE == "summary" else ""
+    state_updates = {}
+    if evicted:
+        summary = update_rolling_summary(llm, summary, evicted)
+        state_updates["summary"] = summary
+
+    response = llm.with_structured_output(Router).invoke(supervisor_prompt(messages, summary, config))
+    return supervisor_command(response, delete_messages, state_updates)
+
 
-    if goto == "FINISH":
-        goto = END
+async def asupervisor_node(state: State, config: RunnableConfig) -> Command[Literal[*members, END]]:
+    """Async variant of supervisor_node, used by graph.ainvoke/astream."""
+    messages, delete_messages, evicted = compact_history(state)
+    summary = state.get("summary", "") if MAX_MSG_MODE == "summary" else ""
+    state_updates = {}
+    if evicted:
+        summary = await aupdate_rolling_summary(llm, summary, evicted)
+        state_updates["summary"] = summary
 
-    return Command(goto=goto, update={"next": goto, "messages": message_updates})
+    response = await llm.with_structured_output(Router).ainvoke(supervisor_prompt(messages, summary, config))
+    return supervisor_command(response, delete_messages, state_updates)
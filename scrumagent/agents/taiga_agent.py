@@ -8,7 +8,9 @@ from langchain_taiga.tools.taiga_tools import (get_entity_by_ref_tool,
                                          search_entities_tool,
                                          add_attachment_by_ref_tool)
 
-llm = ChatOpenAI(model_name="gpt-4o")
+from scrumagent.tools.taiga_snapshot_tool import taiga_snapshot_user_story_tool
+
+llm = ChatOpenAI(model_name="gpt-4o", stream_usage=True)
 
 taiga_agent = create_react_agent(
     llm,
@@ -18,6 +20,7 @@ taiga_agent = create_react_agent(
         add_comment_by_ref_tool,
         create_entity_tool,
         add_attachment_by_ref_tool,
+        taiga_snapshot_user_story_tool,
         # search_entities_tool
     ],
     state_modifier=(
@@ -30,11 +33,13 @@ taiga_agent = create_react_agent(
         "2. update_entity_by_ref - Modify entity properties\n"
         "3. add_comment_by_ref - Add contextual comments\n"
         "4. create_entity_tool - Create entity details\n"
-        "5. add_attachment_by_ref - Add attachments\n\n"
+        "5. add_attachment_by_ref - Add attachments\n"
+        "6. taiga_snapshot_user_story_tool - Fast read-only user story overview incl. all tasks\n\n"
         # "5. search_entities_tool - Search entities\n\n"
 
         "## Workflow Requirements\n"
-        "1. ALWAYS verify existence with get_entity_by_ref_tool first\n"
+        "1. ALWAYS verify existence with get_entity_by_ref_tool before modifications. "
+        "For read-only user story overviews prefer taiga_snapshot_user_story_tool\n"
         "2. Use exact entity_types: 'task', 'userstory', 'issue'\n"
         "3. Parameters must mirror URL structure:\n"
         "   {TAIGA_URL}/project/{project_slug}/{entity_type}/{entity_ref}\n\n"
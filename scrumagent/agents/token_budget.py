@@ -0,0 +1,67 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from langchain_core.messages import BaseMessage
+
+# Per message overhead of the chat format (role, separators), see the OpenAI cookbook on counting tokens
+TOKENS_PER_MESSAGE = 4
+
+
+class MessageTokenCounter:
+    """
+    Token counter for trim_messages based on the local tiktoken tokenizer of the model.
+
+    Messages are immutable once they are in the graph state, so the count of every message is cached by its id
+    and only computed once. If the tokenizer can't be loaded (tiktoken downloads it on first use),
+    the count is estimated with 4 characters per token.
+    """
+
+    def __init__(self, model_name: str = "gpt-4o", encode: Callable[[str], list] = None,
+                 max_cached_messages: int = 20000):
+        self.model_name = model_name
+        self.max_cached_messages = max_cached_messages
+        self._encode = encode
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_encode(self) -> Optional[Callable[[str], list]]:
+        if self._encode is None:
+            try:
+                import tiktoken
+                self._encode = tiktoken.encoding_for_model(self.model_name).encode
+            except Exception as e:
+                print(f"Tokenizer for {self.model_name} not available, estimating token counts: {e!r}")
+                self._encode = False
+        return self._encode or None
+
+    def count_text(self, text: str) -> int:
+        encode = self._get_encode()
+        if encode:
+            return len(encode(text))
+        return (len(text) + 3) // 4
+
+    def count_message(self, message: BaseMessage) -> int:
+        if message.id:
+            with self._lock:
+                if message.id in self._cache:
+                    self._cache.move_to_end(message.id)
+                    return self._cache[message.id]
+
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        tokens = TOKENS_PER_MESSAGE + self.count_text(content)
+        if getattr(message, "tool_calls", None):
+            tokens += self.count_text(json.dumps(message.tool_calls, default=str))
+        if message.name:
+            tokens += self.count_text(message.name)
+
+        if message.id:
+            with self._lock:
+                self._cache[message.id] = tokens
+                while len(self._cache) > self.max_cached_messages:
+                    self._cache.popitem(last=False)
+        return tokens
+
+    def __call__(self, messages: list[BaseMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
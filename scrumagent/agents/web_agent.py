@@ -10,11 +10,14 @@ from langchain_community.utilities import WikipediaAPIWrapper
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 
+from scrumagent.llm_cache import llm_cache
+
 """
 Web Browser Agent
 """
 
-llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0, stream_usage=True,
+                 cache=llm_cache.for_call_site("web_browser", ttl=24 * 60 * 60))
 ddg_tool = DuckDuckGoSearchResults(max_results=4, output_format="list")
 arxiv_tool = ArxivQueryRun()
 youtube_tool = YouTubeSearchTool()
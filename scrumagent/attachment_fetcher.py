@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import discord
+import httpx
+
+# Only the bodies of these types are downloaded. Other attachments are only checked for availability.
+DEFAULT_DOWNLOAD_CONTENT_TYPES = ("image/", "text/", "application/pdf", "application/json")
+
+
+class FetchedAttachment(NamedTuple):
+    filename: str
+    url: str
+    content_type: Optional[str]
+    ok: bool
+    status_code: Optional[int] = None
+    content: Optional[bytes] = None
+    sha256: Optional[str] = None
+    from_cache: bool = False
+    error: Optional[str] = None
+
+
+class AttachmentFetcher:
+    """
+    Fetches discord attachments concurrently with one shared, pooled httpx.AsyncClient.
+
+    Size and content type are checked (first from the discord metadata, then from the response headers)
+    before the body is streamed. Downloaded bodies are kept in a small LRU cache keyed by the attachment url.
+    Filename, size and content type don't identify the content, so a re-posted file (new url) is downloaded again.
+    The bodies are stored by their sha256, urls with the same content share one copy.
+    """
+
+    def __init__(self, max_bytes: int = 25 * 1024 * 1024, cache_max_bytes: int = 100 * 1024 * 1024,
+                 download_content_types: tuple = DEFAULT_DOWNLOAD_CONTENT_TYPES, timeout: float = 30.0,
+                 max_connections: int = 10):
+        self.max_bytes = max_bytes
+        self.cache_max_bytes = cache_max_bytes
+        self.download_content_types = download_content_types
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: OrderedDict[str, bytes] = OrderedDict()  # sha256 -> content
+        self._cache_size = 0
+        self._url_to_hash: dict[str, str] = {}  # url -> sha256
+        self._hash_to_urls: dict[str, set[str]] = {}  # sha256 -> urls, to drop the urls of an evicted body
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_all(self, attachments: [discord.Attachment]) -> [FetchedAttachment]:
+        """Fetches all attachments of a message concurrently. The result keeps the order of the input."""
+        return list(await asyncio.gather(*[self.fetch(attachment) for attachment in attachments]))
+
+    async def fetch(self, attachment: discord.Attachment) -> FetchedAttachment:
+        filename, url, content_type = attachment.filename, attachment.url, attachment.content_type
+
+        cached_hash = self._url_to_hash.get(url)
+        if cached_hash in self._cache:
+            self._cache.move_to_end(cached_hash)
+            return FetchedAttachment(filename, url, content_type, ok=True, status_code=200,
+                                     content=self._cache[cached_hash], sha256=cached_hash, from_cache=True)
+
+        if attachment.size and attachment.size > self.max_bytes:
+            return FetchedAttachment(filename, url, content_type, ok=False,
+                                     error=f"Attachment too large ({attachment.size} bytes)")
+
+        try:
+            async with self.client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    return FetchedAttachment(filename, url, content_type, ok=False,
+                                             status_code=response.status_code)
+
+                content_type = response.headers.get("content-type", content_type)
+                content_length = int(response.headers.get("content-length") or 0)
+                if content_length > self.max_bytes:
+                    return FetchedAttachment(filename, url, content_type, ok=False, status_code=response.status_code,
+                                             error=f"Attachment too large ({content_length} bytes)")
+
+                if not content_type or not content_type.startswith(self.download_content_types):
+                    # Available, but nothing we can process. Don't download the body.
+                    return FetchedAttachment(filename, url, content_type, ok=True, status_code=response.status_code)
+
+                chunks, received = [], 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_bytes:
+                        return FetchedAttachment(filename, url, content_type, ok=False,
+                                                 status_code=response.status_code,
+                                                 error=f"Attachment exceeded {self.max_bytes} bytes while streaming")
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            return FetchedAttachment(filename, url, content_type, ok=False, error=str(e))
+
+        content = b"".join(chunks)
+        sha256 = hashlib.sha256(content).hexdigest()
+        self._add_to_cache(sha256, content, url)
+        return FetchedAttachment(filename, url, content_type, ok=True, status_code=200, content=content, sha256=sha256)
+
+    def _add_to_cache(self, sha256: str, content: bytes, url: str):
+        if len(content) > self.cache_max_bytes:
+            return
+
+        previous_hash = self._url_to_hash.get(url)
+        if previous_hash is not None and previous_hash != sha256:
+            self._hash_to_urls[previous_hash].discard(url)
+        self._url_to_hash[url] = sha256
+        self._hash_to_urls.setdefault(sha256, set()).add(url)
+
+        if sha256 in self._cache:
+            self._cache.move_to_end(sha256)
+            return
+
+        self._cache[sha256] = content
+        self._cache_size += len(content)
+        while self._cache_size > self.cache_max_bytes:
+            old_hash, old_content = self._cache.popitem(last=False)
+            self._cache_size -= len(old_content)
+            for old_url in self._hash_to_urls.pop(old_hash, ()):
+                self._url_to_hash.pop(old_url, None)
@@ -4,24 +4,34 @@ from typing import Literal
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage
 from langgraph.checkpoint.memory import MemorySaver
-from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.checkpoint.mongodb import MongoDBSaver, AsyncMongoDBSaver
 from langgraph.graph import MessagesState
-from langgraph.graph import StateGraph, START
+from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 from langgraph.types import interrupt
+from langgraph.utils.runnable import RunnableCallable
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 
 from scrumagent.agents.agent_state import State
 from scrumagent.agents.deepseek_r1_agent import llm_agent
 from scrumagent.agents.discord_agent import discord_search_agent
-from scrumagent.agents.supervisor_agent import supervisor_node
+from scrumagent.agents.fast_router import fast_router_node, afast_router_node
+from scrumagent.agents.rolling_summary import with_summary
+from scrumagent.agents.supervisor_agent import supervisor_node, asupervisor_node
 from scrumagent.agents.taiga_agent import taiga_agent
 from scrumagent.agents.web_agent import research_agent
+from scrumagent.checkpoint_serializer import (CHECKPOINT_DEDUP, AsyncMongoMessageStore, DedupAsyncMongoDBSaver,
+                                               DedupCompressSerializer, MongoMessageStore, SQLiteMessageStore)
+from scrumagent.local_checkpointer import LRUSpillSaver
+from scrumagent.utils import get_local_state_path
 from scrumagent.tools.timeframe_parser_tool import interpret_timeframe_tool, current_timestamp_tool
 
 load_dotenv()
 
 ACTIVATE_DEEPSEEK = os.getenv("ACTIVATE_DEEPSEEK", "").lower() in ("true", "1", "yes", "on")
+FAST_ROUTER = os.getenv("FAST_ROUTER", "").lower() in ("true", "1", "yes", "on")
+LOCAL_CHECKPOINT_PERSIST = os.getenv("LOCAL_CHECKPOINT_PERSIST", "true").lower() in ("true", "1", "yes", "on")
 
 def human_input_node(state: State) -> Command[Literal["supervisor"]]:
     # It doesn't work like expected. It doesn't wait for the user input.
@@ -49,57 +59,67 @@ def human_input_node(state: State) -> Command[Literal["supervisor"]]:
 #         goto="supervisor",
 #     )
 
-def web_node(state: State) -> Command[Literal["supervisor"]]:
-    result = research_agent.invoke(state)
-    print(f"Web Agent response: {result['messages'][-1].content}")
+def worker_command(result: dict, name: str) -> Command[Literal["supervisor"]]:
+    """Hands the final answer of a worker agent back to the supervisor."""
     return Command(
         update={
             "messages": [
-                AIMessage(content=result["messages"][-1].content, name="web_browser")
+                AIMessage(content=result["messages"][-1].content, name=name)
             ]
         },
         goto="supervisor",
     )
 
 
+def web_node(state: State) -> Command[Literal["supervisor"]]:
+    result = research_agent.invoke(with_summary(state))
+    print(f"Web Agent response: {result['messages'][-1].content}")
+    return worker_command(result, "web_browser")
+
+
+async def aweb_node(state: State) -> Command[Literal["supervisor"]]:
+    result = await research_agent.ainvoke(with_summary(state))
+    print(f"Web Agent response: {result['messages'][-1].content}")
+    return worker_command(result, "web_browser")
+
+
 def llm_node(state: State) -> Command[Literal["supervisor"]]:
-    result = llm_agent.invoke(state)
+    result = llm_agent.invoke(with_summary(state))
     print(f"Deepseek response: {result['messages'][-1].content}")
-    return Command(
-        update={
-            "messages": [
-                AIMessage(content=result["messages"][-1].content, name="deepseek")
-            ]
-        },
-        goto="supervisor",
-    )
+    return worker_command(result, "deepseek")
+
+
+async def allm_node(state: State) -> Command[Literal["supervisor"]]:
+    result = await llm_agent.ainvoke(with_summary(state))
+    print(f"Deepseek response: {result['messages'][-1].content}")
+    return worker_command(result, "deepseek")
 
 
 def discord_search_node(state: State) -> Command[Literal["supervisor"]]:
-    result = discord_search_agent.invoke(state)
+    result = discord_search_agent.invoke(with_summary(state))
     print(f"Discord Agent response: {result['messages'][-1].content}")
-    return Command(
-        update={
-            "messages": [
-                AIMessage(content=result["messages"][-1].content, name="discord")
-            ]
-        },
-        goto="supervisor",
-    )
+    return worker_command(result, "discord")
+
+
+async def adiscord_search_node(state: State) -> Command[Literal["supervisor"]]:
+    result = await discord_search_agent.ainvoke(with_summary(state))
+    print(f"Discord Agent response: {result['messages'][-1].content}")
+    return worker_command(result, "discord")
 
 
 def taiga_node(state: State) -> Command[Literal["supervisor"]]:
     print("Taiga Agent invoked state: " + state["messages"][-1].content)
-    result = taiga_agent.invoke(state)
+    result = taiga_agent.invoke(with_summary(state))
     print(f"Taiga Agent response: {result['messages'][-1].content}")
-    return Command(
-        update={
-            "messages": [
-                AIMessage(content=result["messages"][-1].content, name="taiga")
-            ]
-        },
-        goto="supervisor",
-    )
+    return worker_command(result, "taiga")
+
+
+async def ataiga_node(state: State) -> Command[Literal["supervisor"]]:
+    print("Taiga Agent invoked state: " + state["messages"][-1].content)
+    # The langchain_taiga tools have no coroutines, ainvoke runs them in the default executor
+    result = await taiga_agent.ainvoke(with_summary(state))
+    print(f"Taiga Agent response: {result['messages'][-1].content}")
+    return worker_command(result, "taiga")
 
 
 def time_parser_node(state: State) -> Command[Literal["supervisor"]]:
@@ -143,20 +163,43 @@ def current_timestamp_node(state: State) -> Command[Literal["supervisor"]]:
     )
 
 
-def build_graph():
+def dual_node(func, afunc) -> RunnableCallable:
+    """
+    A node with a sync and an async implementation: graph.invoke runs func, graph.ainvoke/astream run afunc.
+    add_node can't read the Command return annotation from it, so its destinations are passed explicitly.
+    """
+    # Not traced as a separate run, same as a plain function node
+    return RunnableCallable(func, afunc, trace=False)
+
+
+def build_graph(async_checkpointer: bool = False):
+    """
+    :param async_checkpointer: Use the motor based AsyncMongoDBSaver (if MONGO_DB_URL is set), so the checkpoints
+                               of graph.ainvoke don't block the event loop. It has to be created in a running loop,
+                               and the sync graph API (invoke, get_state) is only available from other threads.
+    """
     # https://langchain-ai.github.io/langgraph/concepts/persistence/#using-in-langgraph
     # TODO!: Add the in-memory store to the graph + search for the in-memory store.
 
-    builder = StateGraph(MessagesState)
-    builder.add_edge(START, "supervisor")
-    builder.add_node("supervisor", supervisor_node)
-    builder.add_node("web_browser", web_node)
-    builder.add_node("discord", discord_search_node)
+    # State = MessagesState + the rolling summary of older messages
+    builder = StateGraph(State)
+    workers = ("web_browser", "discord", "human_input", "taiga") + (("deepseek",) if ACTIVATE_DEEPSEEK else ())
+    if FAST_ROUTER:
+        # Unambiguous requests skip the first supervisor call and go straight to their worker
+        builder.add_edge(START, "router")
+        builder.add_node("router", dual_node(fast_router_node, afast_router_node),
+                         destinations=("supervisor",) + workers)
+    else:
+        builder.add_edge(START, "supervisor")
+    # Every node runs natively async with graph.ainvoke, without a thread per node
+    builder.add_node("supervisor", dual_node(supervisor_node, asupervisor_node), destinations=workers + (END,))
+    builder.add_node("web_browser", dual_node(web_node, aweb_node), destinations=("supervisor",))
+    builder.add_node("discord", dual_node(discord_search_node, adiscord_search_node), destinations=("supervisor",))
     # builder.add_node("coder", coder_node)
     if ACTIVATE_DEEPSEEK:
-        builder.add_node("deepseek", llm_node)
+        builder.add_node("deepseek", dual_node(llm_node, allm_node), destinations=("supervisor",))
     builder.add_node("human_input", human_input_node)
-    builder.add_node("taiga", taiga_node)
+    builder.add_node("taiga", dual_node(taiga_node, ataiga_node), destinations=("supervisor",))
     # builder.add_node("time_parser", time_parser_node)
 
     # checkpointer = MemorySaver()
@@ -167,9 +210,30 @@ def build_graph():
         # https://langchain-ai.github.io/langgraph/how-tos/persistence_mongodb/
         ## https://langchain-ai.github.io/langgraph/how-tos/persistence_postgres/#use-sync-connection
 
-        client = MongoClient(MONGO_DB_URL)
-        checkpointer = MongoDBSaver(client)
+        if async_checkpointer:
+            # Same collections as the MongoDBSaver, both savers read each other's checkpoints
+            async_client = AsyncIOMotorClient(MONGO_DB_URL)
+            saver_kwargs = {"checkpoint_collection_name": "checkpoints", "writes_collection_name": "checkpoint_writes"}
+            if CHECKPOINT_DEDUP:
+                # Each message is stored once, the message store I/O is awaited around the saver calls
+                checkpointer = DedupAsyncMongoDBSaver(
+                    async_client, AsyncMongoMessageStore(async_client["checkpointing_db"]["checkpoint_messages"]),
+                    **saver_kwargs)
+            else:
+                checkpointer = AsyncMongoDBSaver(async_client, **saver_kwargs)
+        else:
+            client = MongoClient(MONGO_DB_URL)
+            checkpointer = MongoDBSaver(client)
+            if CHECKPOINT_DEDUP:
+                # Each message is stored once, the checkpoints only reference them (the saver doesn't take a serde)
+                checkpointer.serde = DedupCompressSerializer(
+                    MongoMessageStore(client["checkpointing_db"]["checkpoint_messages"]))
         # checkpointer.setup()
+    elif LOCAL_CHECKPOINT_PERSIST:
+        # Without MongoDB: hot threads in memory (bounded), everything persisted in a local SQLite db
+        checkpoints_db = get_local_state_path("checkpoints.sqlite")
+        serde = DedupCompressSerializer(SQLiteMessageStore(checkpoints_db)) if CHECKPOINT_DEDUP else None
+        checkpointer = LRUSpillSaver(db_path=checkpoints_db, serde=serde)
     else:
         checkpointer = MemorySaver()
 
@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+load_dotenv()
+
+CHECKPOINT_KEEP_LATEST = int(os.getenv("CHECKPOINT_KEEP_LATEST", 20))
+CHECKPOINT_SNAPSHOT_INTERVAL_HOURS = float(os.getenv("CHECKPOINT_SNAPSHOT_INTERVAL_HOURS", 24))
+CHECKPOINT_MAX_SNAPSHOTS = int(os.getenv("CHECKPOINT_MAX_SNAPSHOTS", 7))
+CHECKPOINT_THREAD_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_THREAD_MAX_AGE_DAYS", 90))
+
+# Offset between the UUID epoch (1582-10-15) and the Unix epoch in 100 ns intervals
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+_DELETE_CHUNK_SIZE = 1000
+
+
+def checkpoint_time(checkpoint_id: str) -> Optional[float]:
+    """Unix time of a checkpoint, taken from its id (langgraph uses time ordered UUIDv6 ids)."""
+    try:
+        value = uuid.UUID(checkpoint_id)
+    except (TypeError, ValueError):
+        return None
+    if value.version != 6:
+        return None
+    timestamp = ((value.int >> 80) << 12) | ((value.int >> 64) & 0xFFF)
+    return (timestamp - _UUID_EPOCH_OFFSET) / 1e7
+
+
+def select_checkpoints_to_delete(checkpoint_ids: Iterable[str], keep_latest: int = CHECKPOINT_KEEP_LATEST,
+                                 snapshot_interval_s: float = CHECKPOINT_SNAPSHOT_INTERVAL_HOURS * 3600,
+                                 max_snapshots: int = CHECKPOINT_MAX_SNAPSHOTS) -> list[str]:
+    """
+    Retention plan of one (thread_id, checkpoint_ns): the latest keep_latest checkpoints are kept, of the older ones
+    only the newest checkpoint of each snapshot interval, for at most max_snapshots intervals.
+    """
+    ordered = sorted(checkpoint_ids, reverse=True)  # UUIDv6 ids sort by time
+    to_delete = []
+    snapshot_buckets = set()
+    for checkpoint_id in ordered[keep_latest:]:
+        created_at = checkpoint_time(checkpoint_id)
+        bucket = None
+        if created_at is not None and snapshot_interval_s > 0:
+            bucket = int(created_at // snapshot_interval_s)
+        if bucket is not None and bucket not in snapshot_buckets and len(snapshot_buckets) < max_snapshots:
+            snapshot_buckets.add(bucket)
+        else:
+            to_delete.append(checkpoint_id)
+    return to_delete
+
+
+class CheckpointRetention:
+    """
+    Compaction and retention for the collections of the MongoDBSaver/AsyncMongoDBSaver.
+
+    The saver writes the full channel state at every super-step (and at every update_state) and never deletes
+    anything. run() keeps the latest checkpoints of every thread plus a few periodic snapshots, drops threads
+    without activity for CHECKPOINT_THREAD_MAX_AGE_DAYS and deletes the pending writes of removed checkpoints.
+    Blocking (pymongo), run it off the event loop.
+    """
+
+    def __init__(self, client: MongoClient, db_name: str = "checkpointing_db",
+                 checkpoint_collection_name: str = "checkpoints", writes_collection_name: str = "checkpoint_writes",
+                 keep_latest: int = CHECKPOINT_KEEP_LATEST,
+                 snapshot_interval_hours: float = CHECKPOINT_SNAPSHOT_INTERVAL_HOURS,
+                 max_snapshots: int = CHECKPOINT_MAX_SNAPSHOTS,
+                 thread_max_age_days: float = CHECKPOINT_THREAD_MAX_AGE_DAYS, message_store=None):
+        """
+        :param message_store: MessageStore of the DedupCompressSerializer. Messages that no checkpoint has used for
+                              longer than a stale thread is kept are deleted from it.
+        """
+        self.db = client[db_name]
+        self.checkpoints = self.db[checkpoint_collection_name]
+        self.writes = self.db[writes_collection_name]
+        self.keep_latest = keep_latest
+        self.snapshot_interval_s = snapshot_interval_hours * 3600
+        self.max_snapshots = max_snapshots
+        self.thread_max_age_s = thread_max_age_days * 24 * 3600
+        self.message_store = message_store
+        self._indexes_created = False
+
+    def ensure_indexes(self):
+        """The savers query and sort by these keys, without the indexes every lookup scans the collection."""
+        self.checkpoints.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                       ("checkpoint_id", DESCENDING)], name="thread_ns_checkpoint")
+        self.writes.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                  ("checkpoint_id", ASCENDING), ("task_id", ASCENDING), ("idx", ASCENDING)],
+                                 name="thread_ns_checkpoint_task")
+        self._indexes_created = True
+
+    def run(self) -> dict:
+        """One retention pass. Returns the number of deleted documents and the reclaimed data size in bytes."""
+        if not self._indexes_created:
+            self.ensure_indexes()
+
+        started = time.monotonic()
+        size_before = self._data_size()
+        report = {"threads": 0, "pruned_threads": 0, "deleted_checkpoints": 0, "deleted_writes": 0,
+                  "deleted_messages": 0}
+
+        groups = list(self.checkpoints.aggregate([
+            {"$group": {"_id": {"thread_id": "$thread_id", "checkpoint_ns": "$checkpoint_ns"},
+                        "count": {"$sum": 1}, "latest": {"$max": "$checkpoint_id"}}}
+        ], allowDiskUse=True))
+
+        latest_per_thread = {}
+        for group in groups:
+            thread_id = group["_id"]["thread_id"]
+            latest_per_thread[thread_id] = max(latest_per_thread.get(thread_id, ""), group["latest"] or "")
+        report["threads"] = len(latest_per_thread)
+
+        stale_threads = set()
+        if self.thread_max_age_s > 0:
+            cutoff = time.time() - self.thread_max_age_s
+            stale_threads = {thread_id for thread_id, latest in latest_per_thread.items()
+                             if (checkpoint_time(latest) or cutoff) < cutoff}
+            for thread_id in stale_threads:
+                report["deleted_checkpoints"] += self.checkpoints.delete_many({"thread_id": thread_id}).deleted_count
+                report["deleted_writes"] += self.writes.delete_many({"thread_id": thread_id}).deleted_count
+            report["pruned_threads"] = len(stale_threads)
+
+        for group in groups:
+            thread_id, checkpoint_ns = group["_id"]["thread_id"], group["_id"]["checkpoint_ns"]
+            if thread_id in stale_threads or group["count"] <= self.keep_latest:
+                continue
+            checkpoint_ids = [doc["checkpoint_id"] for doc in self.checkpoints.find(
+                {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}, {"checkpoint_id": 1, "_id": 0})]
+            to_delete = select_checkpoints_to_delete(checkpoint_ids, self.keep_latest, self.snapshot_interval_s,
+                                                     self.max_snapshots)
+            for start in range(0, len(to_delete), _DELETE_CHUNK_SIZE):
+                query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                         "checkpoint_id": {"$in": to_delete[start:start + _DELETE_CHUNK_SIZE]}}
+                report["deleted_checkpoints"] += self.checkpoints.delete_many(query).deleted_count
+                report["deleted_writes"] += self.writes.delete_many(query).deleted_count
+
+        if self.message_store is not None and self.thread_max_age_s > 0:
+            # Every checkpoint write marks its messages as used (at most twice a day), one day of margin
+            report["deleted_messages"] = self.message_store.purge(self.thread_max_age_s + 24 * 3600)
+
+        size_after = self._data_size()
+        if size_before is not None and size_after is not None:
+            report["reclaimed_bytes"] = size_before - size_after
+        else:
+            report["reclaimed_bytes"] = None
+        report["duration_s"] = round(time.monotonic() - started, 3)
+        return report
+
+    def _data_size(self) -> Optional[int]:
+        """Uncompressed data size of both collections (WiredTiger reuses the freed space, it isn't returned)."""
+        try:
+            return sum(self.db.command("collStats", collection.name).get("size", 0)
+                       for collection in (self.checkpoints, self.writes))
+        except Exception as e:
+            print(f"Checkpoint retention: collection stats not available: {e!r}")
+            return None
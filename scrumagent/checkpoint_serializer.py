@@ -0,0 +1,308 @@
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from scrumagent.utils import sqlite_connect
+
+load_dotenv()
+
+CHECKPOINT_DEDUP = os.getenv("CHECKPOINT_DEDUP", "true").lower() in ("true", "1", "yes", "on")
+
+# Type prefix of deduplicated, compressed payloads. Other types are plain JsonPlusSerializer data (old checkpoints).
+DEDUP_TYPE_PREFIX = "dedup+zlib:"
+MESSAGE_REF_KEY = "__message_ref__"
+# A stored message is marked as used again at most this often (for MessageStore.purge)
+TOUCH_INTERVAL_S = 12 * 3600
+
+
+class SQLiteMessageStore:
+    """Content-addressed message payloads for the local checkpointer."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS checkpoint_messages "
+                         "(key TEXT PRIMARY KEY, type TEXT, data BLOB, last_seen REAL)")
+
+    def put_many(self, payloads: dict[str, tuple[str, bytes]]):
+        now = time.time()
+        with sqlite_connect(self.db_path) as conn:
+            conn.executemany("INSERT INTO checkpoint_messages VALUES (?, ?, ?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET last_seen = excluded.last_seen",
+                             [(key, type_, data, now) for key, (type_, data) in payloads.items()])
+
+    def touch(self, keys: list[str]):
+        with sqlite_connect(self.db_path) as conn:
+            conn.executemany("UPDATE checkpoint_messages SET last_seen = ? WHERE key = ?",
+                             [(time.time(), key) for key in keys])
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[str, bytes]]:
+        with sqlite_connect(self.db_path) as conn:
+            rows = conn.execute(f"SELECT key, type, data FROM checkpoint_messages "
+                                f"WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return {key: (type_, data) for key, type_, data in rows}
+
+    def purge(self, max_age_s: float) -> int:
+        with sqlite_connect(self.db_path) as conn:
+            return conn.execute("DELETE FROM checkpoint_messages WHERE last_seen < ?",
+                                (time.time() - max_age_s,)).rowcount
+
+
+class MongoMessageStore:
+    """Content-addressed message payloads next to the MongoDB checkpoints (sync pymongo collection)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._index_created = False
+
+    def put_many(self, payloads: dict[str, tuple[str, bytes]]):
+        from pymongo import UpdateOne
+        if not self._index_created:
+            # On the first write, a read-only store never touches the index
+            self.collection.create_index("last_seen")
+            self._index_created = True
+        now = time.time()
+        self.collection.bulk_write([
+            UpdateOne({"_id": key}, {"$setOnInsert": {"type": type_, "data": data}, "$set": {"last_seen": now}},
+                      upsert=True)
+            for key, (type_, data) in payloads.items()], ordered=False)
+
+    def touch(self, keys: list[str]):
+        self.collection.update_many({"_id": {"$in": keys}}, {"$set": {"last_seen": time.time()}})
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[str, bytes]]:
+        return {doc["_id"]: (doc["type"], doc["data"]) for doc in self.collection.find({"_id": {"$in": keys}})}
+
+    def purge(self, max_age_s: float) -> int:
+        return self.collection.delete_many({"last_seen": {"$lt": time.time() - max_age_s}}).deleted_count
+
+
+class AsyncMongoMessageStore:
+    """The MongoMessageStore for the AsyncMongoDBSaver (motor collection, same documents)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._index_created = False
+
+    async def put_many(self, payloads: dict[str, tuple[str, bytes]]):
+        from pymongo import UpdateOne
+        if not self._index_created:
+            await self.collection.create_index("last_seen")
+            self._index_created = True
+        now = time.time()
+        await self.collection.bulk_write([
+            UpdateOne({"_id": key}, {"$setOnInsert": {"type": type_, "data": data}, "$set": {"last_seen": now}},
+                      upsert=True)
+            for key, (type_, data) in payloads.items()], ordered=False)
+
+    async def touch(self, keys: list[str]):
+        await self.collection.update_many({"_id": {"$in": keys}}, {"$set": {"last_seen": time.time()}})
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[str, bytes]]:
+        return {doc["_id"]: (doc["type"], doc["data"])
+                async for doc in self.collection.find({"_id": {"$in": keys}})}
+
+
+class DedupCompressSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer that stores every message only once.
+
+    Consecutive checkpoints of a thread differ by a few messages, but each of them contains the whole history.
+    Messages are written to the message store, content-addressed by the hash of their serialized form, and the
+    checkpoint only holds references to them. The remaining payload is zlib compressed. Known message keys are
+    remembered, so a super-step only writes the new messages.
+
+    Checkpoints written by the plain JsonPlusSerializer are still readable.
+
+    With an async message store (async_store=True) dumps_typed and loads_typed never do I/O, they run on the event
+    loop: the saver stores the new messages with astore_messages before a write and resolves the remaining
+    references with aresolve_messages after a read (see DedupAsyncMongoDBSaver).
+    """
+
+    def __init__(self, message_store, compression_level: int = 6, max_cached_messages: int = 10000,
+                 async_store: bool = False):
+        super().__init__()
+        self.message_store = message_store
+        self.async_store = async_store
+        self.compression_level = compression_level
+        self.max_cached_messages = max_cached_messages
+        # key -> (type, compressed data, last touch)
+        self._cache: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        new_payloads, touched = {}, []
+        # With an async store, only messages stored by astore_messages are referenced, the rest stays inline
+        stripped = self._strip_messages(obj, new_payloads, touched, stored_only=self.async_store)
+        type_, data = super().dumps_typed(stripped)
+
+        # The messages are stored before the checkpoint that references them
+        if new_payloads:
+            self.message_store.put_many(new_payloads)
+        if touched:
+            self.message_store.touch(touched)
+        return DEDUP_TYPE_PREFIX + type_, zlib.compress(data, self.compression_level)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if not type_.startswith(DEDUP_TYPE_PREFIX):
+            return super().loads_typed(data)
+
+        obj = super().loads_typed((type_[len(DEDUP_TYPE_PREFIX):], zlib.decompress(payload)))
+        refs = set()
+        self._collect_refs(obj, refs)
+        if not refs:
+            return obj
+
+        with self._lock:
+            payloads = {key: (self._cache[key][0], self._cache[key][1]) for key in refs if key in self._cache}
+        missing = [key for key in refs if key not in payloads]
+        if missing and self.async_store:
+            # Left as references for aresolve_messages
+            return self._resolve_refs(obj, payloads, drop_missing=False)
+        if missing:
+            loaded = self.message_store.get_many(missing)
+            self._remember({key: (*value, time.time()) for key, value in loaded.items()})
+            payloads.update(loaded)
+        return self._resolve_refs(obj, payloads)
+
+    async def astore_messages(self, obj: Any):
+        """Stores the new messages of obj in the async store, the next dumps_typed of obj references them."""
+        new_payloads, touched = {}, []
+        self._strip_messages(obj, new_payloads, touched, remember=False)
+        if new_payloads:
+            await self.message_store.put_many(new_payloads)
+            # Only remembered once stored, a concurrent dumps_typed must not reference them before
+            self._remember({key: (*payload, time.time()) for key, payload in new_payloads.items()})
+        if touched:
+            await self.message_store.touch(touched)
+
+    async def aresolve_messages(self, objs: list) -> list:
+        """Resolves the references loads_typed left in the objects from the async store, one query for all."""
+        refs = set()
+        for obj in objs:
+            self._collect_refs(obj, refs)
+        if not refs:
+            return objs
+        loaded = await self.message_store.get_many(list(refs))
+        self._remember({key: (*value, time.time()) for key, value in loaded.items()})
+        return [self._resolve_refs(obj, loaded) for obj in objs]
+
+    def _strip_messages(self, obj: Any, new_payloads: dict, touched: list, stored_only: bool = False,
+                        remember: bool = True) -> Any:
+        if isinstance(obj, BaseMessage):
+            type_, data = super().dumps_typed(obj)
+            key = hashlib.sha256(type_.encode("UTF-8") + data).hexdigest()
+            now = time.time()
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    if now - cached[2] > TOUCH_INTERVAL_S and not stored_only:
+                        cached[2] = now
+                        touched.append(key)
+            if cached is None:
+                if stored_only:
+                    return obj
+                new_payloads[key] = (type_, zlib.compress(data, self.compression_level))
+                if remember:
+                    self._remember({key: (*new_payloads[key], now)})
+            return {MESSAGE_REF_KEY: key}
+        if isinstance(obj, dict):
+            return {k: self._strip_messages(v, new_payloads, touched, stored_only, remember) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._strip_messages(v, new_payloads, touched, stored_only, remember) for v in obj]
+        return obj
+
+    def _collect_refs(self, obj: Any, refs: set):
+        if isinstance(obj, dict):
+            if MESSAGE_REF_KEY in obj and len(obj) == 1:
+                refs.add(obj[MESSAGE_REF_KEY])
+            else:
+                for v in obj.values():
+                    self._collect_refs(v, refs)
+        elif isinstance(obj, list):
+            for v in obj:
+                self._collect_refs(v, refs)
+
+    def _resolve_refs(self, obj: Any, payloads: dict, drop_missing: bool = True) -> Any:
+        if isinstance(obj, dict):
+            if MESSAGE_REF_KEY in obj and len(obj) == 1:
+                key = obj[MESSAGE_REF_KEY]
+                if key not in payloads and not drop_missing:
+                    return obj
+                if key not in payloads:
+                    print(f"Checkpoint message {key} is missing in the message store, it is dropped.")
+                    return None
+                type_, data = payloads[key]
+                # Deserialized for every load, the graph may modify the message objects
+                return super().loads_typed((type_, zlib.decompress(data)))
+            return {k: self._resolve_refs(v, payloads, drop_missing) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return self._resolve_list(obj, payloads, drop_missing)
+        return obj
+
+    def _resolve_list(self, items: list, payloads: dict, drop_missing: bool = True) -> list:
+        resolved = []
+        for item in items:
+            value = self._resolve_refs(item, payloads, drop_missing)
+            # Missing messages are dropped instead of leaving a None in the history
+            if value is None and isinstance(item, dict) and MESSAGE_REF_KEY in item:
+                continue
+            resolved.append(value)
+        return resolved
+
+    def _remember(self, entries: dict[str, tuple]):
+        with self._lock:
+            for key, (type_, data, last_touch) in entries.items():
+                self._cache[key] = [type_, data, last_touch]
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached_messages:
+                self._cache.popitem(last=False)
+
+
+class DedupAsyncMongoDBSaver(AsyncMongoDBSaver):
+    """
+    AsyncMongoDBSaver with the DedupCompressSerializer on an AsyncMongoMessageStore.
+
+    The message store I/O is awaited around the saver calls instead of blocking the event loop inside the serializer:
+    new messages are stored before a checkpoint or write references them, references are resolved after a read.
+    """
+
+    def __init__(self, client, message_store: AsyncMongoMessageStore, **kwargs):
+        super().__init__(client, **kwargs)
+        self.serde = DedupCompressSerializer(message_store, async_store=True)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoint_tuple = await super().aget_tuple(config)
+        return await self._resolve_messages(checkpoint_tuple) if checkpoint_tuple else None
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in super().alist(config, **kwargs):
+            yield await self._resolve_messages(checkpoint_tuple)
+
+    async def aput(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        await self.serde.astore_messages(checkpoint)
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes, task_id: str) -> None:
+        await self.serde.astore_messages([value for _, value in writes])
+        await super().aput_writes(config, writes, task_id)
+
+    async def _resolve_messages(self, checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+        writes = checkpoint_tuple.pending_writes or []
+        checkpoint, *values = await self.serde.aresolve_messages(
+            [checkpoint_tuple.checkpoint] + [value for _, _, value in writes])
+        return checkpoint_tuple._replace(checkpoint=checkpoint, pending_writes=[
+            (task_id, channel, value) for (task_id, channel, _), value in zip(writes, values)])
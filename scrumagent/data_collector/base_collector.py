@@ -1,8 +1,18 @@
+import hashlib
+
 import discord
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 
+# Ids per existence lookup
+_EXISTENCE_CHUNK_SIZE = 1000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("UTF-8")).hexdigest()
+
+
 class BaseCollector:
     # DB_IDENTIFIER is used to identify the source of the data in the DB
     # Add as source in the metadata of the document
@@ -21,8 +31,37 @@ class BaseCollector:
         return self.add_to_db_batch(ids=[_id], texts=[text], metadatas=[metadata])
 
     def add_to_db_batch(self, ids: [str], texts: [str], metadatas: [{}]) -> [str]:
-        print(f"Adding {len(ids)} docs to the DB")
-        return self.db.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        """
+        Idempotent: docs that are already stored with the same text are skipped before anything is embedded.
+        The texts are compared by the content_hash metadata (or the stored text for docs without it).
+        """
+        if ids is None:
+            # Without ids the DB generates new ones, there is nothing to compare
+            print(f"Adding {len(texts)} docs to the DB")
+            return self.db.add_texts(texts=texts, metadatas=metadatas)
+
+        # Unique ids (the last occurrence wins), the hash is stored with the doc
+        docs = {}
+        for _id, text, metadata in zip(ids, texts, metadatas):
+            docs[_id] = (text, {**metadata, "content_hash": content_hash(text)})
+
+        stored_hashes = self.get_stored_content_hashes(list(docs))
+        new_ids = [_id for _id, (_, metadata) in docs.items() if stored_hashes.get(_id) != metadata["content_hash"]]
+
+        print(f"Adding {len(new_ids)} docs to the DB ({len(docs) - len(new_ids)} unchanged skipped)")
+        if new_ids:
+            self.db.add_texts(texts=[docs[_id][0] for _id in new_ids], metadatas=[docs[_id][1] for _id in new_ids],
+                              ids=new_ids)
+        return list(docs)
+
+    def get_stored_content_hashes(self, ids: [str]) -> {str: str}:
+        """Content hashes of the stored docs among ids (one bulk lookup per chunk of ids)."""
+        hashes = {}
+        for start in range(0, len(ids), _EXISTENCE_CHUNK_SIZE):
+            stored = self.db.get(ids=ids[start:start + _EXISTENCE_CHUNK_SIZE], include=["metadatas", "documents"])
+            for _id, metadata, document in zip(stored["ids"], stored["metadatas"], stored["documents"]):
+                hashes[_id] = (metadata or {}).get("content_hash") or content_hash(document or "")
+        return hashes
 
     def add_to_db_docs(self, docs: [Document], ids: [str] = None) -> [str]:
         texts = [doc.page_content for doc in docs]
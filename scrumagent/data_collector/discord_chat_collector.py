@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import itertools
 import os
@@ -9,6 +10,7 @@ from discord import Thread
 from langchain_chroma import Chroma
 
 from .base_collector import BaseCollector
+from .ingestion_watermarks import IngestionWatermarks
 from scrumagent import util_logging
 
 
@@ -25,9 +27,18 @@ class DiscordChatCollector(BaseCollector):
     # Filter out new_member and chat_input_command messages. Add more if needed
     FILTERED_MSG_TYPES = [discord.MessageType.new_member, discord.MessageType.chat_input_command]
 
-    def __init__(self, bot: discord.Client, chroma_db: Chroma, filter_channels: [str] = None):
+    def __init__(self, bot: discord.Client, chroma_db: Chroma, filter_channels: [str] = None,
+                 watermarks: IngestionWatermarks = None, catchup_concurrency: int = 4, catchup_chunk_size: int = 200):
+        """
+        :param catchup_concurrency: Number of channels whose history is read concurrently at startup
+        :param catchup_chunk_size: The history is read and written in chunks of this many messages
+        """
         super().__init__(bot, chroma_db)
         self.filter_channels = filter_channels
+        # Resume points of the catch-up, maintained by add_to_db_batch
+        self.watermarks = watermarks or IngestionWatermarks()
+        self.catchup_concurrency = catchup_concurrency
+        self.catchup_chunk_size = catchup_chunk_size
 
     @util_logging.exception(__name__)
     async def on_startup(self):
@@ -35,35 +46,102 @@ class DiscordChatCollector(BaseCollector):
 
     @util_logging.exception(__name__)
     async def check_all_unread_massages(self):
+        if not self.watermarks.is_backfilled():
+            await asyncio.to_thread(self.backfill_watermarks)
+
+        # The starting points are fixed before any history is read (live messages move the watermarks meanwhile).
+        # Every channel keeps a cursor until its catch-up is complete, an interrupted run resumes from it.
+        catchup = []
         for guild in self.bot.guilds:
             channel_que = [guild.channels, guild.threads]
             for channel in itertools.chain(*channel_que):
-                print(f"Checking channel: {channel.name}, type: {channel.type}, id: {channel.id}")
                 if (self.filter_channels and channel.name not in self.filter_channels and
                         (type(channel) != Thread or channel.parent.name not in self.filter_channels)):
                     continue
                 if isinstance(channel, discord.TextChannel) or isinstance(channel, discord.Thread):
-                    last_timestamp = self.get_last_msg_timestamps_in_db(guild, channel)
-                    try:
-                        after = datetime.datetime.fromtimestamp(last_timestamp) if last_timestamp else None
-                        messages = [msg async for msg in channel.history(limit=None, after=after)] if channel else []
-                        self.add_discord_messages_to_db(guild, channel, messages)
-                    except discord.Forbidden:
-                        print(f"  - No access to channel: {channel.name}")
+                    unfinished, last_message_id = self.watermarks.get_catchup_cursor(guild.id, channel.id)
+                    if not unfinished:
+                        last_message_id, _ = self.watermarks.get(guild.id, channel.id)
+                        self.watermarks.set_catchup_cursor(guild.id, channel.id, last_message_id)
+                    catchup.append((guild, channel, last_message_id))
+
+        semaphore = asyncio.Semaphore(self.catchup_concurrency)
+
+        async def catch_up_bounded(guild, channel, last_message_id):
+            async with semaphore:
+                try:
+                    await self.catch_up_channel(guild, channel, last_message_id)
+                except discord.Forbidden:
+                    print(f"  - No access to channel: {channel.name}")
+                    self.watermarks.clear_catchup_cursor(guild.id, channel.id)
+                except Exception:
+                    # The cursor stays, the next start resumes this channel
+                    logger.exception(f"Error: catch-up of channel {channel.name} ({channel.id}) failed")
+
+        await asyncio.gather(*[catch_up_bounded(*args) for args in catchup])
+
+    async def catch_up_channel(self, guild, channel, last_message_id: int = None):
+        """
+        Streams the history after last_message_id oldest first and writes it in chunks of catchup_chunk_size.
+        The catch-up cursor is moved after every written chunk.
+        """
+        print(f"Checking channel: {channel.name}, type: {channel.type}, id: {channel.id}")
+        # Snowflake pagination: only the messages after the newest stored one
+        after = discord.Object(id=last_message_id) if last_message_id else None
+        chunk, total = [], 0
+        async for msg in channel.history(limit=None, after=after, oldest_first=True):
+            chunk.append(msg)
+            if len(chunk) >= self.catchup_chunk_size:
+                total += await self._write_catchup_chunk(guild, channel, chunk)
+                chunk = []
+        if chunk:
+            total += await self._write_catchup_chunk(guild, channel, chunk)
+        self.watermarks.clear_catchup_cursor(guild.id, channel.id)
+        if total:
+            print(f"  - {channel.name}: {total} messages caught up")
+
+    async def _write_catchup_chunk(self, guild, channel, messages: [discord.Message]) -> int:
+        ids, texts, metadatas = self.prepare_discord_messages(guild, channel, messages)
+        if ids:
+            # Embedding request + Chroma write are blocking. Errors propagate, the cursor must not pass a lost chunk.
+            await asyncio.to_thread(self.add_to_db_batch, ids=ids, texts=texts, metadatas=metadatas)
+        self.watermarks.set_catchup_cursor(guild.id, channel.id, messages[-1].id)
+        return len(ids)
 
     @util_logging.exception(__name__)
-    def get_last_msg_timestamps_in_db(self, guild, channel) -> float:
-        chats = self.db.get(
-            where={"$and": [{"guild_id": guild.id}, {"channel_id": channel.id}, {"source": self.DB_IDENTIFIER}]})
+    def get_last_msg_timestamps_in_db(self, guild, channel, exclude_author_id: int = None) -> float:
+        _, last_timestamp = self.watermarks.get(guild.id, channel.id, exclude_author_id=exclude_author_id)
+        return last_timestamp
+
+    def backfill_watermarks(self):
+        """One time scan of the stored messages, for collections that were filled before the watermark table."""
+        chats = self.db.get(where={"source": self.DB_IDENTIFIER}, include=["metadatas"])
+        self.watermarks.advance([self._message_id(_id) for _id in chats["ids"]], chats["metadatas"])
+        self.watermarks.set_backfilled()
+        print(f"Ingestion watermarks backfilled from {len(chats['ids'])} stored messages.")
 
-        if len(chats["ids"]) == 0:
-            return None
+    def add_to_db_batch(self, ids: [str], texts: [str], metadatas: [{}]) -> [str]:
+        result = super().add_to_db_batch(ids=ids, texts=texts, metadatas=metadatas)
+        # After the write, a failed batch doesn't move the resume point
+        self.watermarks.advance([self._message_id(_id) for _id in ids], metadatas)
+        return result
 
-        last_timetamp = max([chat["timestamp"] for chat in chats["metadatas"]]) if chats else None
-        return last_timetamp
+    def _message_id(self, doc_id: str) -> int:
+        return int(doc_id[len(self.DB_IDENTIFIER) + 1:])
 
     @util_logging.exception(__name__)
     def add_discord_messages_to_db(self, guild, channel, messages: [discord.Message]):
+        ids, texts, metadatas = self.prepare_discord_messages(guild, channel, messages)
+
+        if len(ids) > 0:
+            print(f"Adding {len(ids)} messages to the database")
+            return self.add_to_db_batch(ids=ids, texts=texts, metadatas=metadatas)
+
+    def prepare_discord_messages(self, guild, channel, messages: [discord.Message]) -> Tuple[List, List, List]:
+        """
+        Converts discord messages into ids, texts and metadatas for the DB without writing them.
+        Used directly by the ingestion queue, so no embedding request happens on the event loop.
+        """
         ids, texts, metadatas = [], [], []
 
         for msg in messages:
@@ -81,10 +159,7 @@ class DiscordChatCollector(BaseCollector):
                                   "msg_reference": f"{self.DB_IDENTIFIER}_{msg.reference.message_id}" if msg.reference else "None",
                                   "attachments": f"{[attachment.to_dict() for attachment in msg.attachments] if msg.attachments else []}"})
 
-        if len(ids) > 0:
-            print(f"Adding {len(ids)} messages to the database")
-            print(metadatas)
-            return self.add_to_db_batch(ids=ids, texts=texts, metadatas=metadatas)
+        return ids, texts, metadatas
 
     @util_logging.exception(__name__)
     def get_files_from_messages(self, guild, channel, messages: [discord.Message]):
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Optional
+
+from .base_collector import BaseCollector
+from scrumagent import util_logging
+
+logger = util_logging.init_module_logger(__name__)
+
+
+class IngestionQueue:
+    """
+    Micro-batching queue in front of BaseCollector.add_to_db_batch.
+
+    The event loop only appends to an in-memory buffer. A background task flushes the buffer
+    when it reaches max_batch_size or when the oldest entry is older than max_batch_age seconds.
+    The flush itself (embedding request + Chroma write) runs in a worker thread, so a chat burst
+    costs one embedding request per batch instead of one per message and never blocks the gateway.
+    """
+
+    def __init__(self, collector: BaseCollector, max_batch_size: int = 64, max_batch_age: float = 5.0):
+        self.collector = collector
+        self.max_batch_size = max_batch_size
+        self.max_batch_age = max_batch_age
+
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._oldest_enqueued_at: Optional[float] = None
+        self._in_flight = 0
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._worker_task: Optional[asyncio.Task] = None
+
+        self.flushed_batches = 0
+        self.flushed_docs = 0
+        self.failed_docs = 0
+
+    def start(self):
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self):
+        if self._worker_task:
+            self._worker_task.cancel()
+            self._worker_task = None
+        while self._ids:
+            await self._flush_batch()
+
+    def enqueue(self, ids: [str], texts: [str], metadatas: [{}]):
+        """Non blocking. Can be called directly from discord event handlers."""
+        if not ids:
+            return
+        if not self._ids:
+            self._oldest_enqueued_at = time.monotonic()
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+
+        self._has_items.set()
+        if len(self._ids) >= self.max_batch_size:
+            self._batch_full.set()
+
+    def backlog(self) -> int:
+        """Number of docs that are not yet written to the DB (buffered + currently flushing)."""
+        return len(self._ids) + self._in_flight
+
+    def get_metrics(self) -> dict:
+        return {"backlog": self.backlog(), "flushed_batches": self.flushed_batches,
+                "flushed_docs": self.flushed_docs, "failed_docs": self.failed_docs}
+
+    async def _worker(self):
+        while True:
+            await self._has_items.wait()
+
+            # Wait until the batch is full or the oldest entry reached max_batch_age
+            while len(self._ids) < self.max_batch_size:
+                timeout = self._oldest_enqueued_at + self.max_batch_age - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush_batch()
+
+    async def _flush_batch(self):
+        ids = self._ids[:self.max_batch_size]
+        texts = self._texts[:self.max_batch_size]
+        metadatas = self._metadatas[:self.max_batch_size]
+        del self._ids[:self.max_batch_size]
+        del self._texts[:self.max_batch_size]
+        del self._metadatas[:self.max_batch_size]
+
+        if self._ids:
+            self._oldest_enqueued_at = time.monotonic()
+        else:
+            self._has_items.clear()
+            self._batch_full.clear()
+            self._oldest_enqueued_at = None
+
+        if not ids:
+            return
+
+        self._in_flight += len(ids)
+        try:
+            # Embedding + Chroma write are blocking, keep them off the event loop
+            await asyncio.to_thread(self.collector.add_to_db_batch, ids=ids, texts=texts, metadatas=metadatas)
+            self.flushed_batches += 1
+            self.flushed_docs += len(ids)
+        except Exception:
+            self.failed_docs += len(ids)
+            logger.exception(f"Error: flushing {len(ids)} docs to the DB failed")
+        finally:
+            self._in_flight -= len(ids)
+
+        print(f"Ingestion queue flushed {len(ids)} docs. Backlog: {self.backlog()}")
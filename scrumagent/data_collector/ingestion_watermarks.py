@@ -0,0 +1,89 @@
+import time
+from typing import Optional
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+
+class IngestionWatermarks:
+    """
+    Persistent resume points of the discord chat ingestion: (guild, channel, author) -> newest stored message.
+
+    Updated after every successful write batch of the collector, so a crash between the Chroma write and the
+    watermark update only re-fetches a few messages (the ids are stable, the re-fetch overwrites them), it never
+    skips any. One row per author allows the newest message of a channel without the bots own posts.
+    The table belongs to the Chroma collection of the collector, reset both together.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or get_local_state_path("discord_ingestion_watermarks.sqlite")
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    guild_id INTEGER, channel_id INTEGER, author_id INTEGER, last_message_id INTEGER,
+                    last_timestamp REAL, updated_at REAL, PRIMARY KEY (guild_id, channel_id, author_id));
+                CREATE TABLE IF NOT EXISTS watermark_state (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS catchup_cursors (
+                    guild_id INTEGER, channel_id INTEGER, last_message_id INTEGER, updated_at REAL,
+                    PRIMARY KEY (guild_id, channel_id));
+            """)
+
+    def advance(self, message_ids: list[int], metadatas: list[dict]):
+        """Moves the watermarks forward to the given messages (older messages don't move them back)."""
+        newest = {}
+        for message_id, metadata in zip(message_ids, metadatas):
+            key = (metadata["guild_id"], metadata["channel_id"], metadata.get("author_id", 0))
+            if key not in newest or message_id > newest[key][0]:
+                newest[key] = (message_id, metadata["timestamp"])
+        if not newest:
+            return
+
+        now = time.time()
+        with sqlite_connect(self.db_path) as conn:
+            conn.executemany("""
+                INSERT INTO watermarks VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (guild_id, channel_id, author_id) DO UPDATE SET
+                    last_message_id = excluded.last_message_id, last_timestamp = excluded.last_timestamp,
+                    updated_at = excluded.updated_at
+                WHERE excluded.last_message_id > watermarks.last_message_id
+            """, [(*key, message_id, timestamp, now) for key, (message_id, timestamp) in newest.items()])
+
+    def get(self, guild_id: int, channel_id: int,
+            exclude_author_id: int = None) -> tuple[Optional[int], Optional[float]]:
+        """The id and timestamp of the newest stored message of the channel, (None, None) if there is none."""
+        query = "SELECT MAX(last_message_id), MAX(last_timestamp) FROM watermarks WHERE guild_id = ? AND channel_id = ?"
+        params = [guild_id, channel_id]
+        if exclude_author_id:
+            query += " AND author_id != ?"
+            params.append(exclude_author_id)
+        with sqlite_connect(self.db_path) as conn:
+            return tuple(conn.execute(query, params).fetchone())
+
+    def get_catchup_cursor(self, guild_id: int, channel_id: int) -> tuple[bool, Optional[int]]:
+        """
+        Progress of an unfinished catch-up of the channel: (True, last processed message id) or (False, None).
+
+        Live messages move the watermark while the history is still being read, so an interrupted catch-up
+        resumes from its own cursor instead.
+        """
+        with sqlite_connect(self.db_path) as conn:
+            row = conn.execute("SELECT last_message_id FROM catchup_cursors WHERE guild_id = ? AND channel_id = ?",
+                               (guild_id, channel_id)).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    def set_catchup_cursor(self, guild_id: int, channel_id: int, last_message_id: Optional[int]):
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO catchup_cursors VALUES (?, ?, ?, ?)",
+                         (guild_id, channel_id, last_message_id, time.time()))
+
+    def clear_catchup_cursor(self, guild_id: int, channel_id: int):
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("DELETE FROM catchup_cursors WHERE guild_id = ? AND channel_id = ?", (guild_id, channel_id))
+
+    def is_backfilled(self) -> bool:
+        with sqlite_connect(self.db_path) as conn:
+            return conn.execute("SELECT 1 FROM watermark_state WHERE key = 'backfilled'").fetchone() is not None
+
+    def set_backfilled(self):
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO watermark_state VALUES ('backfilled', ?)", (str(time.time()),))
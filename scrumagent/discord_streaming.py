@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import json
+import time
+from typing import Optional
+
+import discord
+from langchain_core.messages import BaseMessageChunk
+
+from scrumagent.utils import split_text_smart
+
+# Workers are shown with a status line and the tail of their output, so the progress fits in one message
+MAX_WORKER_PREVIEW_LENGTH = 1500
+# Replaces the placeholder if the agent run fails
+STREAMING_ERROR_TEXT = "Sorry, something went wrong while answering. Please try again."
+
+
+def get_top_level_node(metadata: dict) -> str:
+    """Returns the node of the multi agent graph a streamed chunk belongs to (also for chunks of sub graphs)."""
+    checkpoint_ns = metadata.get("langgraph_checkpoint_ns", "")
+    if checkpoint_ns:
+        return checkpoint_ns.split("|")[0].split(":")[0]
+    return metadata.get("langgraph_node", "")
+
+
+def extract_partial_json_string(raw: str, key: str) -> Optional[str]:
+    """
+    Extracts the (possibly unfinished) string value of key from an incomplete JSON object,
+    e.g. '{"next": "FINISH", "messages": "Hello Wor' -> 'Hello Wor'.
+    """
+    key_pos = raw.find(f'"{key}"')
+    if key_pos == -1:
+        return None
+    colon_pos = raw.find(":", key_pos + len(key) + 2)
+    if colon_pos == -1:
+        return None
+    quote_pos = raw.find('"', colon_pos)
+    if quote_pos == -1:
+        return None
+
+    value = raw[quote_pos:]
+    # Find the closing quote (if already streamed)
+    i = 1
+    while i < len(value):
+        if value[i] == "\\":
+            i += 2
+            continue
+        if value[i] == '"':
+            return json.loads(value[:i + 1])
+        i += 1
+
+    # Unfinished string: drop an incomplete escape sequence at the end and close it
+    for cut in range(0, 7):
+        try:
+            return json.loads(value[:len(value) - cut] + '"')
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class StreamTextAssembler:
+    """
+    Builds the text that is shown while the graph is running from the chunks of stream_mode="messages".
+
+    The supervisor answers with structured output, so its user facing text is the partial "messages"
+    field of the streamed JSON arguments. Worker tokens are shown as a status line plus the latest output.
+    Workers of the same step run in parallel, their chunks interleave and are kept apart per node.
+    """
+
+    def __init__(self):
+        self.node = None
+        self._message_ids: dict[str, str] = {}
+        self._raw: dict[str, str] = {}
+
+    def add_chunk(self, node: str, chunk: BaseMessageChunk) -> bool:
+        """:return: True if the display text changed"""
+        if (node == "supervisor") != (self.node == "supervisor"):
+            # The supervisor only runs before or after the workers, never next to them
+            self._message_ids, self._raw = {}, {}
+        if chunk.id != self._message_ids.get(node):
+            self._message_ids[node], self._raw[node] = chunk.id, ""
+        self.node = node
+
+        new_raw = chunk.content if isinstance(chunk.content, str) else ""
+        for tool_call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+            new_raw += tool_call_chunk.get("args") or ""
+
+        self._raw[node] += new_raw
+        return bool(new_raw)
+
+    @property
+    def raw(self) -> str:
+        return self._raw.get(self.node, "")
+
+    @property
+    def text(self) -> str:
+        if self.node == "supervisor":
+            return extract_partial_json_string(self.raw, "messages") or ""
+        if self.node:
+            preview_length = MAX_WORKER_PREVIEW_LENGTH // len(self._raw)
+            return "\n".join(f"_{node} is working..._\n{raw[-preview_length:]}" for node, raw in self._raw.items())
+        return ""
+
+
+class DiscordStreamingReply:
+    """
+    Reply that is edited progressively while the answer is generated.
+
+    Edits are throttled to one every min_edit_interval seconds (discord allows about 5 edits per 5 seconds).
+    Text beyond the 2000 char limit rolls over into additional messages.
+    """
+
+    def __init__(self, message: discord.Message, placeholder: str = ":hourglass_flowing_sand: ...",
+                 min_edit_interval: float = 1.2):
+        self.message = message
+        self.placeholder = placeholder
+        self.min_edit_interval = min_edit_interval
+
+        self._sent_messages: [discord.Message] = []
+        self._sent_texts: [str] = []
+        self._pending_text: Optional[str] = None
+        self._has_update = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        placeholder_msg = await self.message.reply(self.placeholder, suppress_embeds=True)
+        self._sent_messages.append(placeholder_msg)
+        self._sent_texts.append(self.placeholder)
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def update(self, text: str):
+        """Non blocking. The latest text wins, intermediate states may be skipped."""
+        if not text.strip():
+            return
+        self._pending_text = text
+        self._has_update.set()
+
+    async def finish(self, final_text: str):
+        if self._flush_task:
+            self._flush_task.cancel()
+            # An edit in flight would otherwise race with the final text
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self._apply(final_text)
+
+    async def _flush_loop(self):
+        while True:
+            await self._has_update.wait()
+            self._has_update.clear()
+            text, self._pending_text = self._pending_text, None
+            if text is not None:
+                started = time.monotonic()
+                try:
+                    await self._apply(text)
+                except discord.HTTPException as e:
+                    print(f"Streaming edit failed: {e}")
+                await asyncio.sleep(max(0.0, self.min_edit_interval - (time.monotonic() - started)))
+
+    async def _apply(self, text: str):
+        segments = split_text_smart(text) if text else [self.placeholder]
+        for i, segment in enumerate(segments):
+            if i < len(self._sent_messages):
+                if self._sent_texts[i] != segment:
+                    await self._sent_messages[i].edit(content=segment)
+                    self._sent_texts[i] = segment
+            else:
+                new_msg = await self.message.channel.send(segment, suppress_embeds=True)
+                self._sent_messages.append(new_msg)
+                self._sent_texts.append(segment)
+
+        # The text got shorter (e.g. a worker preview was replaced by the final answer)
+        while len(self._sent_messages) > len(segments):
+            await self._sent_messages.pop().delete()
+            self._sent_texts.pop()
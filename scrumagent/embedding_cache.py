@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+import time
+from array import array
+from typing import Optional
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+load_dotenv()
+
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() in ("true", "1", "yes", "on")
+
+# SQLite limits the number of parameters of a statement
+_LOOKUP_CHUNK_SIZE = 500
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("UTF-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent embedding cache in front of an embeddings model, keyed by (model, sha256(text)).
+
+    Short chat messages ("ok", "thanks"), repeated bot outputs, re-ingested messages and repeated search queries
+    are embedded once. A batch is looked up with one query, only the misses (deduplicated) are sent to the model.
+    Vectors are stored as float32.
+    """
+
+    def __init__(self, embeddings: Embeddings, db_path: str = None, model: str = None):
+        self.embeddings = embeddings
+        self.db_path = db_path or get_local_state_path("embedding_cache.sqlite")
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embedding_cache "
+                         "(model TEXT, text_hash TEXT, vector BLOB, created_at REAL, PRIMARY KEY (model, text_hash))")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [_text_hash(text) for text in texts]
+        cached = self._lookup(set(hashes))
+
+        misses = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached:
+                misses.setdefault(text_hash, text)
+        self._count(hits=len(texts) - len(misses), misses=len(misses))
+
+        if misses:
+            vectors = self.embeddings.embed_documents(list(misses.values()))
+            new_entries = dict(zip(misses.keys(), vectors))
+            self._store(new_entries)
+            cached.update(new_entries)
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        text_hash = _text_hash(text)
+        vector = self._lookup({text_hash}).get(text_hash)
+        self._count(hits=int(vector is not None), misses=int(vector is None))
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store({text_hash: vector})
+        return vector
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += misses
+
+    def _lookup(self, hashes: set[str]) -> dict[str, list[float]]:
+        hashes, found = list(hashes), {}
+        with sqlite_connect(self.db_path) as conn:
+            for start in range(0, len(hashes), _LOOKUP_CHUNK_SIZE):
+                chunk = hashes[start:start + _LOOKUP_CHUNK_SIZE]
+                rows = conn.execute(f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND "
+                                    f"text_hash IN ({','.join('?' * len(chunk))})", [self.model, *chunk])
+                for text_hash, vector in rows:
+                    found[text_hash] = array("f", vector).tolist()
+        return found
+
+    def _store(self, entries: dict[str, list[float]]):
+        now = time.time()
+        with sqlite_connect(self.db_path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?)",
+                             [(self.model, text_hash, array("f", vector).tobytes(), now)
+                              for text_hash, vector in entries.items()])
+
+
+def cached_embeddings(embeddings: Embeddings, db_path: Optional[str] = None) -> Embeddings:
+    """The embeddings behind the persistent cache, or unchanged if EMBEDDING_CACHE is off."""
+    return CachedEmbeddings(embeddings, db_path=db_path) if EMBEDDING_CACHE else embeddings
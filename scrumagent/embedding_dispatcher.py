@@ -0,0 +1,135 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import openai
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 100000))
+# OpenAIEmbeddings splits larger lists into sequential requests of 1000 (its chunk_size)
+EMBEDDING_BATCH_MAX_TEXTS = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", 1000))
+EMBEDDING_PARALLEL_REQUESTS = int(os.getenv("EMBEDDING_PARALLEL_REQUESTS", 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+
+
+def approximate_token_count(text: str) -> int:
+    """Fallback if the tiktoken encoding isn't available (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _default_token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")  # Encoding of the text-embedding-3 models
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"Embedding dispatcher: tiktoken encoding not available ({e!r}), token counts are approximated.")
+        return approximate_token_count
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits (429), server errors (5xx), timeouts and connection errors."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, openai.APIConnectionError)
+
+
+class EmbeddingDispatcher(Embeddings):
+    """
+    Sends the texts of an embed_documents call as requests of at most max_batch_tokens tokens (and max_batch_texts
+    texts), up to parallel_requests at a time. The limit is shared by all callers. Rate limits and server errors
+    are retried with exponential backoff and full jitter.
+
+    Every call with more than one request prints its throughput (embeddings per second); get_metrics has the
+    totals, to tune the batch size and parallelism of a backfill.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+                 max_batch_texts: int = EMBEDDING_BATCH_MAX_TEXTS, parallel_requests: int = EMBEDDING_PARALLEL_REQUESTS,
+                 max_retries: int = EMBEDDING_MAX_RETRIES, base_delay: float = 1.0, max_delay: float = 60.0,
+                 token_counter: Callable[[str], int] = None):
+        self.embeddings = embeddings
+        # The cache in front of the dispatcher keys the entries by the model
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_texts = max_batch_texts
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._token_counter = token_counter
+        self._executor = ThreadPoolExecutor(max_workers=parallel_requests, thread_name_prefix="embedding")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failed_requests": 0, "texts": 0, "tokens": 0, "busy_s": 0.0}
+
+    @property
+    def token_counter(self) -> Callable[[str], int]:
+        if self._token_counter is None:
+            self._token_counter = _default_token_counter()
+        return self._token_counter
+
+    def pack(self, texts: list[str]) -> list[tuple[int, int, int]]:
+        """Splits the texts into consecutive requests: (start, end, tokens)."""
+        batches = []
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = self.token_counter(text)
+            if i > start and (tokens + text_tokens > self.max_batch_tokens or i - start >= self.max_batch_texts):
+                batches.append((start, i, tokens))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts), tokens))
+        return batches
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        started = time.monotonic()
+        batches = self.pack(texts)
+        futures = [self._executor.submit(self._with_retries, self.embeddings.embed_documents, texts[start:end])
+                   for start, end, _ in batches]
+        vectors = [vector for future in futures for vector in future.result()]
+
+        duration = time.monotonic() - started
+        tokens = sum(batch_tokens for _, _, batch_tokens in batches)
+        with self._lock:
+            self._stats["texts"] += len(texts)
+            self._stats["tokens"] += tokens
+            self._stats["busy_s"] += duration
+        if len(batches) > 1:
+            print(f"Embedding dispatcher: {len(texts)} texts ({tokens} tokens) in {len(batches)} requests, "
+                  f"{len(texts) / max(duration, 1e-6):.0f} embeddings/s.")
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._with_retries(self.embeddings.embed_query, text)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["embeddings_per_s"] = round(stats["texts"] / stats["busy_s"], 1) if stats["busy_s"] else None
+        return stats
+
+    def _with_retries(self, func: Callable, *args):
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self._stats["requests"] += 1
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    with self._lock:
+                        self._stats["failed_requests"] += 1
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                with self._lock:
+                    self._stats["retries"] += 1
+                print(f"Embedding request failed ({e!r}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s.")
+                time.sleep(delay)
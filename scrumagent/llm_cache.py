@@ -0,0 +1,285 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+
+from scrumagent.agents.prompt_layout import REQUEST_CONTEXT_PREFIX
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+load_dotenv()
+
+LLM_CACHE = os.getenv("LLM_CACHE", "true").lower() in ("true", "1", "yes", "on")
+# Call sites that may also answer from a similar (not identical) prompt, e.g. "web_browser,timeframe_parser"
+LLM_CACHE_SEMANTIC_SITES = {s.strip() for s in os.getenv("LLM_CACHE_SEMANTIC_SITES", "").split(",") if s.strip()}
+LLM_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", 0.97))
+
+# Parts of serialized messages that differ between otherwise identical prompts
+VOLATILE_KEYS = {"id", "response_metadata", "usage_metadata"}
+
+
+def _message_kwargs(obj) -> dict:
+    return obj.get("kwargs", {}) if isinstance(obj, dict) else {}
+
+
+def is_request_context(obj) -> bool:
+    """The per request context message of the prompt layout (current time, conversation)."""
+    kwargs = _message_kwargs(obj)
+    content = kwargs.get("content")
+    return kwargs.get("type") == "system" and isinstance(content, str) and content.startswith(REQUEST_CONTEXT_PREFIX)
+
+
+def request_context(prompt: str) -> str:
+    """The request context of a serialized prompt, empty if it has none."""
+    try:
+        data = json.loads(prompt)
+    except ValueError:
+        return ""
+    if not isinstance(data, list):
+        return ""
+    return next((_message_kwargs(message)["content"] for message in data if is_request_context(message)), "")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Drops message ids and response metadata from a serialized prompt, so equal conversations get equal keys.
+    The request context (conversation, current time in minutes) stays part of the key: an answer is never served
+    to another conversation or after the minute it was generated for.
+    """
+    try:
+        data = json.loads(prompt)
+    except ValueError:
+        return prompt
+
+    def strip(obj):
+        if isinstance(obj, dict):
+            # The "id" of a serialized object is its class path (a list) and stays
+            return {k: strip(v) for k, v in obj.items() if k not in VOLATILE_KEYS or isinstance(v, list)}
+        if isinstance(obj, list):
+            return [strip(v) for v in obj]
+        return obj
+
+    return json.dumps(strip(data), sort_keys=True)
+
+
+def prompt_text(prompt: str) -> str:
+    """
+    The text of the last human or tool message of a serialized prompt, used for the similarity lookup.
+    Falls back to the last message other than the request context.
+    """
+    try:
+        data = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(data, list):
+        return prompt
+
+    messages = [message for message in data if isinstance(message, dict) and not is_request_context(message)]
+    candidates = [m for m in messages if _message_kwargs(m).get("type") in ("human", "tool")] or messages
+    if not candidates:
+        return prompt
+    content = _message_kwargs(candidates[-1]).get("content", "")
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("UTF-8")).hexdigest()
+
+
+class LLMCacheStore:
+    """
+    SQLite backed response cache shared by all LLM call sites.
+
+    Entries are keyed by call site, model parameters (llm_string) and the normalized prompt. Every call site has its
+    own TTL and tags; invalidate(tag) drops all entries of the call sites with that tag. Semantic matches are only
+    looked up among the entries with the same request context.
+
+    Only for deterministic call sites without side effects (parsers, summaries, web research), not for the agents
+    with write tools or the per conversation routing.
+    """
+
+    def __init__(self, db_path: str = None, embeddings: Embeddings = None,
+                 semantic_threshold: float = LLM_CACHE_SEMANTIC_THRESHOLD, max_semantic_candidates: int = 500):
+        self.semantic_threshold = semantic_threshold
+        self.max_semantic_candidates = max_semantic_candidates
+        self._db_path = db_path
+        self._db_ready = False
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+        self._stats: dict[str, Counter] = {}
+        self._updates = 0
+
+    @property
+    def db_path(self) -> str:
+        """The db is created on the first use, the call sites create their caches at import."""
+        if not self._db_ready:
+            with self._lock:
+                if not self._db_ready:
+                    self._db_path = self._db_path or get_local_state_path("llm_cache.sqlite")
+                    with sqlite_connect(self._db_path) as conn:
+                        conn.executescript("""
+                            CREATE TABLE IF NOT EXISTS llm_cache (
+                                call_site TEXT, llm_hash TEXT, prompt_hash TEXT, tags TEXT, created_at REAL,
+                                context_hash TEXT, embedding TEXT, return_val TEXT,
+                                PRIMARY KEY (call_site, llm_hash, prompt_hash));
+                            CREATE INDEX IF NOT EXISTS llm_cache_by_age ON llm_cache (call_site, llm_hash, created_at);
+                        """)
+                    self._db_ready = True
+        return self._db_path
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        return self._embeddings
+
+    def for_call_site(self, call_site: str, ttl: float, tags: Sequence[str] = (),
+                      semantic: bool = None) -> Optional["CallSiteCache"]:
+        """
+        The cache for the cache= parameter of a chat model, or None if LLM_CACHE is off.
+
+        :param semantic: Also answer from similar prompts. Defaults to call_site in LLM_CACHE_SEMANTIC_SITES.
+        """
+        if not LLM_CACHE:
+            return None
+        if semantic is None:
+            semantic = call_site in LLM_CACHE_SEMANTIC_SITES
+        return CallSiteCache(self, call_site, ttl, tags, semantic)
+
+    def _count(self, call_site: str, event: str):
+        with self._lock:
+            self._stats.setdefault(call_site, Counter())[event] += 1
+
+    def lookup(self, call_site: str, ttl: float, semantic: bool, prompt: str,
+               llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        normalized = normalize_prompt(prompt)
+        llm_hash, since = _hash(llm_string), time.time() - ttl
+        with sqlite_connect(self.db_path) as conn:
+            row = conn.execute("SELECT return_val FROM llm_cache WHERE call_site = ? AND llm_hash = ? AND "
+                               "prompt_hash = ? AND created_at >= ?",
+                               (call_site, llm_hash, _hash(normalized), since)).fetchone()
+            if row is None and semantic:
+                candidates = conn.execute(
+                    "SELECT embedding, return_val FROM llm_cache WHERE call_site = ? AND llm_hash = ? AND "
+                    "context_hash = ? AND created_at >= ? AND embedding IS NOT NULL ORDER BY created_at DESC LIMIT ?",
+                    (call_site, llm_hash, _hash(request_context(prompt)), since,
+                     self.max_semantic_candidates)).fetchall()
+            else:
+                candidates = []
+
+        if row is not None:
+            self._count(call_site, "exact_hits")
+            return _as_cache_hit(loads(row[0]))
+
+        if candidates:
+            query = _normalize_vector(self.embeddings.embed_query(prompt_text(prompt)))
+            best_similarity, best_val = max(
+                ((sum(a * b for a, b in zip(query, json.loads(embedding))), return_val)
+                 for embedding, return_val in candidates), key=lambda item: item[0])
+            if best_similarity >= self.semantic_threshold:
+                self._count(call_site, "semantic_hits")
+                return _as_cache_hit(loads(best_val))
+
+        self._count(call_site, "misses")
+        return None
+
+    def update(self, call_site: str, ttl: float, tags: Sequence[str], semantic: bool, prompt: str,
+               llm_string: str, return_val: RETURN_VAL_TYPE):
+        normalized = normalize_prompt(prompt)
+        embedding = None
+        if semantic:
+            embedding = json.dumps(_normalize_vector(self.embeddings.embed_query(prompt_text(prompt))))
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (call_site, _hash(llm_string), _hash(normalized), ",".join(tags), time.time(),
+                          _hash(request_context(prompt)), embedding, dumps(return_val)))
+            with self._lock:
+                self._updates += 1
+                purge = self._updates % 100 == 0
+            if purge:
+                # Entries are only valid for the TTL of their call site
+                conn.execute("DELETE FROM llm_cache WHERE call_site = ? AND created_at < ?",
+                             (call_site, time.time() - ttl))
+
+    def invalidate(self, tag: str = None, call_site: str = None) -> int:
+        """Drops all entries with the tag and/or of the call site (everything if both are None)."""
+        conditions, params = [], []
+        if tag is not None:
+            conditions.append("(',' || tags || ',') LIKE ?")
+            params.append(f"%,{tag},%")
+        if call_site is not None:
+            conditions.append("call_site = ?")
+            params.append(call_site)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with sqlite_connect(self.db_path) as conn:
+            deleted = conn.execute(f"DELETE FROM llm_cache{where}", params).rowcount
+        if deleted:
+            print(f"LLM cache: invalidated {deleted} entries (tag={tag}, call_site={call_site}).")
+        return deleted
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {call_site: dict(stats) for call_site, stats in self._stats.items()}
+
+
+class CallSiteCache(BaseCache):
+    """The view of the LLMCacheStore for one call site. Pass it as cache= to a chat model."""
+
+    def __init__(self, store: LLMCacheStore, call_site: str, ttl: float, tags: Sequence[str] = (),
+                 semantic: bool = False):
+        self.store = store
+        self.call_site = call_site
+        self.ttl = ttl
+        self.tags = tuple(tags)
+        self.semantic = semantic
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        try:
+            return self.store.lookup(self.call_site, self.ttl, self.semantic, prompt, llm_string)
+        except Exception as e:
+            # The cache must never break a request
+            print(f"LLM cache lookup failed for {self.call_site}: {e!r}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        try:
+            self.store.update(self.call_site, self.ttl, self.tags, self.semantic, prompt, llm_string, return_val)
+        except Exception as e:
+            print(f"LLM cache update failed for {self.call_site}: {e!r}")
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.invalidate(call_site=self.call_site)
+
+
+def _as_cache_hit(generations: RETURN_VAL_TYPE) -> RETURN_VAL_TYPE:
+    """
+    The model assigns a new id to messages without one, so a cached answer never replaces another message in the
+    state. Without usage metadata a hit isn't counted as token usage by the cost callbacks.
+    """
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        if message is not None:
+            message.id = None
+            if hasattr(message, "usage_metadata"):
+                message.usage_metadata = None
+            message.response_metadata = {k: v for k, v in message.response_metadata.items()
+                                         if k not in ("token_usage", "usage")}
+    return generations
+
+
+def _normalize_vector(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+llm_cache = LLMCacheStore()
@@ -0,0 +1,447 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+                                       get_checkpoint_id)
+from langgraph.checkpoint.memory import MemorySaver
+
+from scrumagent.checkpoint_retention import (CHECKPOINT_KEEP_LATEST, CHECKPOINT_MAX_SNAPSHOTS,
+                                             CHECKPOINT_SNAPSHOT_INTERVAL_HOURS, CHECKPOINT_THREAD_MAX_AGE_DAYS,
+                                             checkpoint_time, select_checkpoints_to_delete)
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+load_dotenv()
+
+LOCAL_CHECKPOINT_MEMORY_MB = float(os.getenv("LOCAL_CHECKPOINT_MEMORY_MB", 256))
+LOCAL_CHECKPOINT_HOT_CHECKPOINTS = int(os.getenv("LOCAL_CHECKPOINT_HOT_CHECKPOINTS", 5))
+
+_DELETE_CHUNK_SIZE = 500
+
+
+class _HotThread:
+    """Keys and size of the in-memory data of one thread."""
+
+    def __init__(self):
+        self.blob_keys = set()
+        self.write_keys = set()
+        # (checkpoint_ns, checkpoint_id) -> channel versions of the checkpoints in memory
+        self.versions: dict[tuple[str, str], dict] = {}
+        # False if older checkpoints of the thread are only in SQLite
+        self.complete = True
+        self.size = 0
+
+
+class LRUSpillSaver(MemorySaver):
+    """
+    Local checkpointer for deployments without MongoDB: bounded memory and persistent across restarts.
+
+    Every checkpoint, channel blob and pending write is written through to a local SQLite db. The MemorySaver
+    storage only holds the recently used ("hot") threads, and of each thread only the latest hot_checkpoints
+    checkpoints with their blobs and writes. Older checkpoints are read from SQLite when they are asked for.
+    If the serialized size of the hot threads exceeds max_memory_bytes, the least recently used threads are
+    dropped from memory. A thread that isn't in memory (evicted, or after a restart) is loaded from SQLite on its
+    first access. The SQLite db is kept bounded by LocalCheckpointRetention.
+    """
+
+    def __init__(self, db_path: str = None, max_memory_bytes: int = int(LOCAL_CHECKPOINT_MEMORY_MB * 1024 * 1024),
+                 hot_checkpoints: int = LOCAL_CHECKPOINT_HOT_CHECKPOINTS, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.db_path = db_path or get_local_state_path("checkpoints.sqlite")
+        self.max_memory_bytes = max_memory_bytes
+        self.hot_checkpoints = max(1, hot_checkpoints)
+        self._hot: OrderedDict[str, _HotThread] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {"loads": 0, "evictions": 0, "cold_reads": 0}
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, checkpoint_type TEXT, checkpoint BLOB,
+                    metadata_type TEXT, metadata BLOB, parent_checkpoint_id TEXT,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));
+                CREATE TABLE IF NOT EXISTS blobs (
+                    thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version, type TEXT, value BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, channel, version));
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER,
+                    channel TEXT, type TEXT, value BLOB, task_path TEXT,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));
+            """)
+
+    # --- memory management ---
+
+    def _touch(self, thread_id: str) -> _HotThread:
+        """Marks the thread as most recently used and loads it from SQLite if it isn't in memory."""
+        hot = self._hot.get(thread_id)
+        if hot is not None:
+            self._hot.move_to_end(thread_id)
+            return hot
+
+        hot = self._hot[thread_id] = _HotThread()
+        checkpoints, blobs, writes, hot.complete = self._read_thread(thread_id, latest_only=True)
+        if checkpoints:
+            self._stats["loads"] += 1
+
+        for ns, checkpoint_id, c_type, c_value, m_type, m_value, parent_id in checkpoints:
+            self.storage[thread_id][ns][checkpoint_id] = ((c_type, c_value), (m_type, m_value), parent_id)
+            hot.versions[(ns, checkpoint_id)] = self.serde.loads_typed((c_type, c_value))["channel_versions"]
+            self._add_size(hot, len(c_value) + len(m_value))
+        for ns, channel, version, b_type, b_value in blobs:
+            key = (thread_id, ns, channel, version)
+            self.blobs[key] = (b_type, b_value)
+            hot.blob_keys.add(key)
+            self._add_size(hot, len(b_value))
+        for ns, checkpoint_id, task_id, idx, channel, w_type, w_value, task_path in writes:
+            outer_key = (thread_id, ns, checkpoint_id)
+            self.writes[outer_key][(task_id, idx)] = (task_id, channel, (w_type, w_value), task_path)
+            hot.write_keys.add(outer_key)
+            self._add_size(hot, len(w_value))
+        return hot
+
+    def _read_thread(self, thread_id: str, latest_only: bool) -> tuple[list, list, list, bool]:
+        """
+        Reads the checkpoints of a thread from SQLite with their blobs and writes. With latest_only, only the latest
+        hot_checkpoints checkpoints per namespace and the blobs they reference.
+
+        :return: checkpoint, blob and write rows, and whether these are all checkpoints of the thread
+        """
+        with sqlite_connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, "
+                "parent_checkpoint_id FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_ns, checkpoint_id DESC",
+                (thread_id,)).fetchall()
+            if not latest_only:
+                blobs = conn.execute("SELECT checkpoint_ns, channel, version, type, value FROM blobs "
+                                     "WHERE thread_id = ?", (thread_id,)).fetchall()
+                writes = conn.execute("SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+                                      "task_path FROM writes WHERE thread_id = ?", (thread_id,)).fetchall()
+                return rows, blobs, writes, True
+
+            checkpoints, per_ns = [], {}
+            for row in rows:
+                per_ns[row[0]] = per_ns.get(row[0], 0) + 1
+                if per_ns[row[0]] <= self.hot_checkpoints:
+                    checkpoints.append(row)
+
+            needed_blobs = set()
+            for ns, _, c_type, c_value, *_ in checkpoints:
+                versions = self.serde.loads_typed((c_type, c_value))["channel_versions"]
+                needed_blobs.update((ns, channel, version) for channel, version in versions.items())
+            blobs = []
+            for ns, channel, version in needed_blobs:
+                blob = conn.execute("SELECT type, value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND "
+                                    "channel = ? AND version = ?", (thread_id, ns, channel, version)).fetchone()
+                if blob is not None:
+                    blobs.append((ns, channel, version, *blob))
+            writes = []
+            for ns, checkpoint_id, *_ in checkpoints:
+                writes += conn.execute("SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+                                       "task_path FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND "
+                                       "checkpoint_id = ?", (thread_id, ns, checkpoint_id)).fetchall()
+        return checkpoints, blobs, writes, len(checkpoints) == len(rows)
+
+    def _cold_saver(self, thread_id: str) -> MemorySaver:
+        """A throwaway MemorySaver with all checkpoints of the thread, for reads beyond the hot checkpoints."""
+        self._stats["cold_reads"] += 1
+        saver = MemorySaver(serde=self.serde)
+        checkpoints, blobs, writes, _ = self._read_thread(thread_id, latest_only=False)
+        for ns, checkpoint_id, c_type, c_value, m_type, m_value, parent_id in checkpoints:
+            saver.storage[thread_id][ns][checkpoint_id] = ((c_type, c_value), (m_type, m_value), parent_id)
+        for ns, channel, version, b_type, b_value in blobs:
+            saver.blobs[(thread_id, ns, channel, version)] = (b_type, b_value)
+        for ns, checkpoint_id, task_id, idx, channel, w_type, w_value, task_path in writes:
+            saver.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (task_id, channel, (w_type, w_value),
+                                                                             task_path)
+        return saver
+
+    def _trim(self, thread_id: str, hot: _HotThread):
+        """Keeps the latest hot_checkpoints checkpoints per namespace in memory, with their blobs and writes."""
+        for ns, checkpoints in self.storage[thread_id].items():
+            for checkpoint_id in sorted(checkpoints)[:-self.hot_checkpoints]:
+                (_, c_value), (_, m_value), _ = checkpoints.pop(checkpoint_id)
+                hot.versions.pop((ns, checkpoint_id), None)
+                self._add_size(hot, -len(c_value) - len(m_value))
+                hot.complete = False
+
+        needed_blobs = {(ns, channel, version) for (ns, _), versions in hot.versions.items()
+                        for channel, version in versions.items()}
+        for key in [key for key in hot.blob_keys if key[1:] not in needed_blobs]:
+            hot.blob_keys.discard(key)
+            self._add_size(hot, -len(self.blobs.pop(key)[1]))
+        for key in [key for key in hot.write_keys if key[2] not in self.storage[thread_id].get(key[1], {})]:
+            hot.write_keys.discard(key)
+            self._add_size(hot, -sum(len(value) for _, _, (_, value), _ in self.writes.pop(key, {}).values()))
+
+    def _track_writes(self, hot: _HotThread, results: list[CheckpointTuple]):
+        """The MemorySaver reads create empty write entries (defaultdict), they are dropped with the checkpoint."""
+        for result in results:
+            configurable = result.config["configurable"]
+            hot.write_keys.add((configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                                configurable["checkpoint_id"]))
+
+    def _add_size(self, hot: _HotThread, size: int):
+        hot.size += size
+        self._memory_bytes += size
+
+    def _evict(self, keep_thread_id: str):
+        """Drops the least recently used threads from memory until the cap is met (they stay in SQLite)."""
+        while self._memory_bytes > self.max_memory_bytes and len(self._hot) > 1:
+            thread_id, hot = next(iter(self._hot.items()))
+            if thread_id == keep_thread_id:
+                self._hot.move_to_end(thread_id)
+                continue
+            self._forget(thread_id)
+            self._stats["evictions"] += 1
+
+    def _forget(self, thread_id: str):
+        hot = self._hot.pop(thread_id, None)
+        if hot is None:
+            return
+        self.storage.pop(thread_id, None)
+        for key in hot.blob_keys:
+            self.blobs.pop(key, None)
+        for key in hot.write_keys:
+            self.writes.pop(key, None)
+        self._memory_bytes -= hot.size
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {"hot_threads": len(self._hot), "memory_bytes": self._memory_bytes, **self._stats}
+
+    # --- BaseCheckpointSaver ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            hot = self._touch(thread_id)
+            cold = (checkpoint_id is not None and not hot.complete
+                    and checkpoint_id not in self.storage[thread_id].get(checkpoint_ns, {}))
+            result = None if cold else super().get_tuple(config)
+            if result is not None:
+                self._track_writes(hot, [result])
+            self._evict(thread_id)
+        if cold:
+            return self._cold_saver(thread_id).get_tuple(config)
+        return result
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        if config:
+            thread_ids = [config["configurable"]["thread_id"]]
+        else:
+            with sqlite_connect(self.db_path) as conn:
+                thread_ids = [row[0] for row in conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+
+        for thread_id in thread_ids:
+            thread_config = {"configurable": {**(config or {}).get("configurable", {}), "thread_id": thread_id}}
+            with self._lock:
+                hot = self._touch(thread_id)
+                # Materialized under the lock, a later eviction must not change the dicts during the iteration
+                results = None if not hot.complete else list(
+                    super().list(thread_config, filter=filter, before=before, limit=limit))
+                self._track_writes(hot, results or [])
+                self._evict(thread_id)
+            if results is None:
+                # Older checkpoints are only in SQLite
+                results = list(self._cold_saver(thread_id).list(thread_config, filter=filter, before=before,
+                                                                limit=limit))
+            for result in results:
+                yield result
+                if limit is not None:
+                    limit -= 1
+            if limit is not None and limit <= 0:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            hot = self._touch(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+
+            (c_type, c_value), (m_type, m_value), parent_id = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            hot.versions[(checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            blob_rows = []
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                b_type, b_value = self.blobs[key]
+                blob_rows.append((thread_id, checkpoint_ns, channel, version, b_type, b_value))
+                if key not in hot.blob_keys:
+                    hot.blob_keys.add(key)
+                    self._add_size(hot, len(b_value))
+            self._add_size(hot, len(c_value) + len(m_value))
+
+            with sqlite_connect(self.db_path) as conn:
+                conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (thread_id, checkpoint_ns, checkpoint["id"], c_type, c_value, m_type, m_value,
+                              parent_id))
+                conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blob_rows)
+            self._trim(thread_id, hot)
+            self._evict(thread_id)
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""),
+                     config["configurable"]["checkpoint_id"])
+        with self._lock:
+            hot = self._touch(thread_id)
+            before = dict(self.writes.get(outer_key, {}))
+            super().put_writes(config, writes, task_id, task_path)
+
+            rows = []
+            for (w_task_id, idx), (_, channel, (w_type, w_value), w_task_path) in self.writes[outer_key].items():
+                previous = before.get((w_task_id, idx))
+                if previous is self.writes[outer_key][(w_task_id, idx)]:
+                    continue
+                rows.append((*outer_key, w_task_id, idx, channel, w_type, w_value, w_task_path))
+                self._add_size(hot, len(w_value) - (len(previous[2][1]) if previous else 0))
+            hot.write_keys.add(outer_key)
+
+            with sqlite_connect(self.db_path) as conn:
+                conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._trim(thread_id, hot)
+            self._evict(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._forget(thread_id)
+            super().delete_thread(thread_id)
+            with sqlite_connect(self.db_path) as conn:
+                for table in ("checkpoints", "blobs", "writes"):
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # SQLite reads and writes are blocking, the async API runs them in a worker thread
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for result in results:
+            yield result
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class LocalCheckpointRetention:
+    """
+    Retention of the local SQLite checkpoints, the counterpart of CheckpointRetention for the LRUSpillSaver.
+
+    Per thread and namespace it keeps the latest keep_latest checkpoints plus up to max_snapshots older
+    checkpoints, one per snapshot_interval_hours (see select_checkpoints_to_delete). Blobs no remaining checkpoint
+    references and writes of deleted checkpoints are removed too. Threads without a checkpoint in the last
+    thread_max_age_days days are deleted entirely.
+    """
+
+    def __init__(self, saver: LRUSpillSaver, keep_latest: int = CHECKPOINT_KEEP_LATEST,
+                 snapshot_interval_hours: float = CHECKPOINT_SNAPSHOT_INTERVAL_HOURS,
+                 max_snapshots: int = CHECKPOINT_MAX_SNAPSHOTS,
+                 thread_max_age_days: float = CHECKPOINT_THREAD_MAX_AGE_DAYS, message_store=None):
+        self.saver = saver
+        self.keep_latest = keep_latest
+        self.snapshot_interval_s = snapshot_interval_hours * 3600
+        self.max_snapshots = max_snapshots
+        self.thread_max_age_s = thread_max_age_days * 24 * 3600
+        self.message_store = message_store
+
+    def _data_size(self) -> int:
+        """Bytes in use by the db. Deleted rows free pages that later inserts reuse, the file itself doesn't shrink."""
+        with sqlite_connect(self.saver.db_path) as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            used_pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute(
+                "PRAGMA freelist_count").fetchone()[0]
+        return page_size * used_pages
+
+    def run(self) -> dict:
+        """Runs one retention pass and returns a report of what was deleted."""
+        started = time.monotonic()
+        size_before = self._data_size()
+        report = {"threads": 0, "pruned_threads": 0, "deleted_checkpoints": 0, "deleted_blobs": 0,
+                  "deleted_writes": 0, "deleted_messages": 0}
+
+        with sqlite_connect(self.saver.db_path) as conn:
+            groups = conn.execute("SELECT thread_id, checkpoint_ns, COUNT(*) FROM checkpoints "
+                                  "GROUP BY thread_id, checkpoint_ns").fetchall()
+            latest = dict(conn.execute("SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"))
+        report["threads"] = len(latest)
+
+        stale_threads = set()
+        if self.thread_max_age_s > 0:
+            cutoff = time.time() - self.thread_max_age_s
+            stale_threads = {thread_id for thread_id, checkpoint_id in latest.items()
+                             if (checkpoint_time(checkpoint_id) or cutoff) < cutoff}
+        for thread_id in stale_threads:
+            with self.saver._lock, sqlite_connect(self.saver.db_path) as conn:
+                self.saver._forget(thread_id)
+                for table in ("checkpoints", "blobs", "writes"):
+                    deleted = conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)).rowcount
+                    report[f"deleted_{table}"] += deleted
+            report["pruned_threads"] += 1
+
+        for thread_id, checkpoint_ns, count in groups:
+            if thread_id not in stale_threads and count > self.keep_latest:
+                self._prune(thread_id, checkpoint_ns, report)
+
+        if self.message_store is not None and self.thread_max_age_s > 0:
+            # Messages are referenced by checkpoints, a message unused for longer than any thread is kept is garbage
+            report["deleted_messages"] = self.message_store.purge(self.thread_max_age_s + 24 * 3600)
+
+        report["reclaimed_bytes"] = size_before - self._data_size()
+        report["duration_s"] = round(time.monotonic() - started, 3)
+        return report
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, report: dict):
+        """Deletes the checkpoints of one thread namespace that aren't retained, with their blobs and writes."""
+        with self.saver._lock, sqlite_connect(self.saver.db_path) as conn:
+            rows = conn.execute("SELECT checkpoint_id, checkpoint_type, checkpoint FROM checkpoints "
+                                "WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)).fetchall()
+            to_delete = set(select_checkpoints_to_delete([row[0] for row in rows], self.keep_latest,
+                                                         self.snapshot_interval_s, self.max_snapshots))
+            if not to_delete:
+                return
+
+            # The memory copy of the thread is reloaded from SQLite on its next access
+            self.saver._forget(thread_id)
+            ids = sorted(to_delete)
+            for i in range(0, len(ids), _DELETE_CHUNK_SIZE):
+                chunk = ids[i:i + _DELETE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                for table, key in (("checkpoints", "deleted_checkpoints"), ("writes", "deleted_writes")):
+                    report[key] += conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN "
+                        f"({placeholders})", (thread_id, checkpoint_ns, *chunk)).rowcount
+
+            referenced = set()
+            for checkpoint_id, c_type, c_value in rows:
+                if checkpoint_id not in to_delete:
+                    referenced.update(self.saver.serde.loads_typed((c_type, c_value))["channel_versions"].items())
+            orphans = [(thread_id, checkpoint_ns, channel, version) for channel, version in conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns)) if (channel, version) not in referenced]
+            conn.executemany("DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND "
+                             "version = ?", orphans)
+            report["deleted_blobs"] += len(orphans)
@@ -1,11 +1,10 @@
 import asyncio
 import datetime
-import json
 import os
+import time
 from pathlib import Path
 
 import discord
-import httpx
 import pytz
 import yaml
 from discord import ChannelType
@@ -13,13 +12,28 @@ from discord.ext import commands, tasks
 from dotenv import load_dotenv
 from langchain_community.callbacks import get_openai_callback
 from langchain_core.messages import HumanMessage
-from langchain_taiga.tools.taiga_tools import get_entity_by_ref_tool, get_project
+from pymongo import MongoClient
 
 from config import scrum_promts
 from scrumagent import util_logging
+from scrumagent.agent_scheduler import AgentScheduler, JobPriority
+from scrumagent.agents.fast_router import fast_router
+from scrumagent.attachment_fetcher import AttachmentFetcher
 from scrumagent.build_agent_graph import build_graph
+from scrumagent.checkpoint_retention import CheckpointRetention
+from scrumagent.checkpoint_serializer import CHECKPOINT_DEDUP, MongoMessageStore
+from scrumagent.discord_streaming import (STREAMING_ERROR_TEXT, DiscordStreamingReply, StreamTextAssembler,
+                                          get_top_level_node)
 from scrumagent.data_collector.discord_chat_collector import DiscordChatCollector
-from scrumagent.utils import split_text_smart, init_discord_chroma_db
+from scrumagent.data_collector.ingestion_queue import IngestionQueue
+from scrumagent.local_checkpointer import LocalCheckpointRetention, LRUSpillSaver
+from scrumagent.llm_cache import llm_cache
+from scrumagent.metrics_store import MetricsStore, NodeLatencyCallbackHandler
+from scrumagent.passive_message_buffer import PASSIVE_MESSAGE_BUFFER, PassiveMessageBuffer
+from scrumagent.scrum_master_digest import ScrumMasterDigestStore, compute_story_digest
+from scrumagent.thread_registry import DiscordThreadRegistry, parse_thread_ref
+from scrumagent.tools.taiga_snapshot_tool import taiga_snapshot
+from scrumagent.utils import gather_bounded, split_text_smart, init_discord_chroma_db
 
 mod_path = Path(__file__).parent
 
@@ -27,6 +41,17 @@ load_dotenv()
 
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_TOKEN")
 DISCORD_THREAD_TYPE = os.getenv("DISCORD_THREAD_TYPE")
+AGENT_SCHEDULER_ASYNC_JOBS = int(os.getenv("AGENT_SCHEDULER_ASYNC_JOBS", "32"))
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "64"))
+INGESTION_BATCH_MAX_AGE = float(os.getenv("INGESTION_BATCH_MAX_AGE", "5"))
+CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", "4"))
+CATCHUP_CHUNK_SIZE = int(os.getenv("CATCHUP_CHUNK_SIZE", "200"))
+USER_STORY_CONCURRENCY = int(os.getenv("USER_STORY_CONCURRENCY", "4"))
+STREAMING_REPLIES = os.getenv("STREAMING_REPLIES", "").lower() in ("true", "1", "yes", "on")
+MONGO_DB_URL = os.getenv("MONGO_DB_URL")
+CHECKPOINT_RETENTION_INTERVAL_HOURS = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL_HOURS", "6"))
+SCRUM_MASTER_CONCURRENCY = int(os.getenv("SCRUM_MASTER_CONCURRENCY", "3"))
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
 OPEN_AI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 intents = discord.Intents.default()
@@ -60,9 +85,22 @@ listener = util_logging.start_listener()
 
 print("Discord Bot initialized.")
 
-# Initialize the multi-agent graph for /ama requests
-multi_agent_graph = build_graph()
-print("Multi-agent graph initialized.")
+# The multi-agent graph for /ama requests. It is built in setup_hook, the async checkpointer needs the running loop.
+multi_agent_graph = None
+
+
+async def setup_hook():
+    global multi_agent_graph, checkpoint_retention
+    multi_agent_graph = build_graph(async_checkpointer=True)
+    if checkpoint_retention is None and isinstance(multi_agent_graph.checkpointer, LRUSpillSaver):
+        # Without MongoDB the same retention runs on the local SQLite checkpoints
+        checkpointer = multi_agent_graph.checkpointer
+        checkpoint_retention = LocalCheckpointRetention(
+            checkpointer, message_store=getattr(checkpointer.serde, "message_store", None))
+    print("Multi-agent graph initialized.")
+
+
+bot.setup_hook = setup_hook
 
 # Draw the graph for visualization purposes (optional)
 # multi_agent_graph.get_graph(xray=True).draw_mermaid_png(output_file_path="multi_agent_graph.png")
@@ -70,35 +108,108 @@ print("Multi-agent graph initialized.")
 # daily_calculated_openai_cost = 0
 summed_up_open_ai_cost = {"undefined": 0}  # per taiga_slug
 
+# Persistent tokens, costs and latencies of every graph invocation (see the /usage command)
+metrics_store = MetricsStore()
+
+# All agent invocations go through this scheduler. The graph runs natively async (ainvoke) on the event loop,
+# so up to AGENT_SCHEDULER_ASYNC_JOBS conversations are served at once without a thread each.
+# Mentions are served before scheduled jobs and runs of the same thread_id stay in order.
+agent_scheduler = AgentScheduler(max_async_jobs=AGENT_SCHEDULER_ASYNC_JOBS)
+
+# Shared async client for message attachments, with a small url cache (bodies deduplicated by sha256)
+attachment_fetcher = AttachmentFetcher(max_bytes=ATTACHMENT_MAX_BYTES)
+
+# Persistent (project_slug, user story ref) -> discord thread id mapping
+thread_registry = DiscordThreadRegistry()
+
+# Keeps the checkpoint collections of the graph bounded (latest checkpoints + snapshots per thread)
+checkpoint_retention = None
+if MONGO_DB_URL:
+    mongo_client = MongoClient(MONGO_DB_URL)
+    checkpoint_retention = CheckpointRetention(
+        mongo_client, message_store=MongoMessageStore(mongo_client["checkpointing_db"]["checkpoint_messages"])
+        if CHECKPOINT_DEDUP else None)
+
+# Messages the bot only listens to, merged into the graph state at the next agent run of the thread (or on a limit)
+passive_message_buffer = PassiveMessageBuffer() if PASSIVE_MESSAGE_BUFFER else None
+
+# Digests of the user story threads at the last scrum master run. Unchanged threads skip the agent run.
+scrum_master_digests = ScrumMasterDigestStore()
+
 # Initialize the data collector database
 discord_chroma_db = init_discord_chroma_db()
 
 # Initialize the data collectors. Deactivated datacollector for now. Only discord chat collector is active.
-discord_chat_collector = DiscordChatCollector(bot, discord_chroma_db, filter_channels=INTERACTABLE_DISCORD_CHANNELS)
+discord_chat_collector = DiscordChatCollector(bot, discord_chroma_db, filter_channels=INTERACTABLE_DISCORD_CHANNELS,
+                                              catchup_concurrency=CATCHUP_CONCURRENCY,
+                                              catchup_chunk_size=CATCHUP_CHUNK_SIZE)
 data_collector_list = [discord_chat_collector]
 
+# Live messages from on_message are only enqueued here and written to Chroma in batches by a background task.
+discord_ingestion_queue = IngestionQueue(discord_chat_collector, max_batch_size=INGESTION_BATCH_SIZE,
+                                         max_batch_age=INGESTION_BATCH_MAX_AGE)
+
 
 # https://python.langchain.com/docs/how_to/trim_messages/#trimming-based-on-message-count
 
 
 @util_logging.exception(__name__)
-def run_agent_in_cb_context(messages: list, config: dict, cost_position=None) -> dict:
+async def run_agent_in_cb_context(messages: list, config: dict, cost_position=None, on_stream_chunk=None,
+                                  trigger: str = "undefined") -> dict:
+    # Per node wall clock times for the metrics store. The config is copied, the caller may reuse it.
+    node_latencies = NodeLatencyCallbackHandler()
+    config = {**config, "callbacks": [*config.get("callbacks", []), node_latencies]}
+
+    if passive_message_buffer:
+        # Runs inside the scheduler job of the thread, so no flush of the same thread runs concurrently
+        messages = passive_message_buffer.take(config["configurable"]["thread_id"]) + messages
+
+    started_at, started = time.time(), time.monotonic()
+    success = False
     with get_openai_callback() as cb:
-        result = multi_agent_graph.invoke(
-            {"messages": messages},
-            config,
-            # debug=True
-        )
-
-        if cost_position:
-            if cost_position not in summed_up_open_ai_cost:
-                summed_up_open_ai_cost[cost_position] = 0
-            summed_up_open_ai_cost[cost_position] += cb.total_cost
-        else:
-            summed_up_open_ai_cost["undefined"] += cb.total_cost
+        try:
+            if on_stream_chunk:
+                # Stream the LLM tokens of all nodes (incl. the react agents of the workers)
+                async for chunk, metadata in multi_agent_graph.astream({"messages": messages}, config,
+                                                                       stream_mode="messages"):
+                    on_stream_chunk(get_top_level_node(metadata), chunk)
+                result = (await multi_agent_graph.aget_state(config)).values
+            else:
+                result = await multi_agent_graph.ainvoke(
+                    {"messages": messages},
+                    config,
+                    # debug=True
+                )
+            success = True
+        finally:
+            if cost_position:
+                if cost_position not in summed_up_open_ai_cost:
+                    summed_up_open_ai_cost[cost_position] = 0
+                summed_up_open_ai_cost[cost_position] += cb.total_cost
+            else:
+                summed_up_open_ai_cost["undefined"] += cb.total_cost
+
+            await asyncio.to_thread(
+                metrics_store.record_invocation,
+                started_at=started_at, duration_s=time.monotonic() - started, project_slug=cost_position,
+                thread_id=config["configurable"]["thread_id"], trigger=trigger, prompt_tokens=cb.prompt_tokens,
+                completion_tokens=cb.completion_tokens, total_cost=cb.total_cost, success=success,
+                node_latencies=node_latencies, cached_prompt_tokens=cb.prompt_tokens_cached)
     return result
 
 
+async def merge_passive_messages(thread_id: str):
+    """Writes the buffered passive messages of the thread into the graph state with a single update_state."""
+
+    async def merge():
+        messages = passive_message_buffer.take(thread_id)
+        if messages:
+            await multi_agent_graph.aupdate_state(config={"configurable": {"thread_id": thread_id}},
+                                                  values={"messages": messages})
+
+    await agent_scheduler.run_async(merge, thread_id=thread_id, priority=JobPriority.SCHEDULED)
+
+
 @bot.event
 @util_logging.exception(__name__)
 async def on_message(message: discord.Message):
@@ -110,9 +221,8 @@ async def on_message(message: discord.Message):
         channel_name = message.author.name
     else:
         channel_name = message.channel.name
-        with get_openai_callback() as cb:
-            new_msg = discord_chat_collector.add_discord_messages_to_db(message.guild, message.channel, [message])
-            summed_up_open_ai_cost["undefined"] += cb.total_cost
+        discord_ingestion_queue.enqueue(
+            *discord_chat_collector.prepare_discord_messages(message.guild, message.channel, [message]))
 
     # Config for stateful agents
     config = {"configurable": {"user_id": channel_name, "thread_id": channel_name}}
@@ -123,8 +233,8 @@ async def on_message(message: discord.Message):
         f"channel_id: {message.channel.id}, timestamp_sent: {message.created_at.timestamp()})")
 
     # Add the taiga slug and user story to the question format if the message is not a direct message
+    taiga_slug = None
     if type(message.channel) != discord.DMChannel:
-        taiga_slug = None
         if message.channel.id in DISCORD_CHANNEL_TO_TAIGA_SLAG_MAP:
             taiga_slug = DISCORD_CHANNEL_TO_TAIGA_SLAG_MAP[message.channel.id]
         elif hasattr(message.channel, "parent"):
@@ -139,19 +249,19 @@ async def on_message(message: discord.Message):
             question_format += f" (Corresponding taiga user story id: {channel_name.split(' ')[0][1:]})"
 
     # Prepare the attachments. Currently only images and text files are supported.
+    # All attachments are fetched concurrently on the shared async client.
     attachments = message.attachments
     attachments_prepared = []
-    for attachment in attachments:
-        response = httpx.get(attachment.url)
-
-        if response.status_code != 200:
-            print(f"Failed to retrieve the file. Status code: {response.status_code}. URL: {attachment.url}")
+    for attachment in await attachment_fetcher.fetch_all(attachments):
+        if not attachment.ok:
+            print(f"Failed to retrieve the file. Status code: {attachment.status_code}. Error: {attachment.error}. "
+                  f"URL: {attachment.url}")
             continue
         attachments_prepared.append(
             f"Attached File: {attachment.filename} (Type: {attachment.content_type}) - {attachment.url}")
         '''
         if attachment.content_type.startswith("image"):
-            image = Image.open(BytesIO(response.content))  # Open image from response content
+            image = Image.open(BytesIO(attachment.content))  # Open image from response content
             image.save("temp_image.jpg")  # Save the image to a temporary file
             description = get_image_description_via_llama("temp_image.jpg")  # Get the image description
             os.remove("temp_image.jpg")
@@ -160,7 +270,7 @@ async def on_message(message: discord.Message):
             # Whisper transcription
         #    pass
         elif attachment.content_type.startswith("text"):
-                text_content = response.text  # Get the content as a string
+                text_content = attachment.content.decode()  # Get the content as a string
                 attachments_prepared.append(f"Attached Textfile: {text_content}")
         else:
             logger.error(f"Unknown attachment type: {attachment.content_type} for {attachment.filename}: {attachment.url}")
@@ -181,20 +291,55 @@ async def on_message(message: discord.Message):
         # current_messages_state.append(HumanMessage(content=question_format))
         # multi_agent_graph.update_state(config=config, values={"messages": current_messages_state})
 
-        multi_agent_graph.update_state(config=config, values={"messages": HumanMessage(content=question_format)})
+        if passive_message_buffer:
+            # No checkpoint write per message, the buffer is merged at the next agent run of the thread
+            if passive_message_buffer.add(config["configurable"]["thread_id"], question_format):
+                await merge_passive_messages(config["configurable"]["thread_id"])
+        else:
+            await multi_agent_graph.aupdate_state(config=config,
+                                                  values={"messages": HumanMessage(content=question_format)})
 
         return
 
+    trigger = "dm" if type(message.channel) == discord.DMChannel else "mention"
+
     # Invoke the multi-agent graph with the question.
     # And get the total cost of the conversation.
-    # Offload the synchronous, blocking call to an executor.
     print(f"Run Agent with question: {question_format}")
+    if STREAMING_REPLIES:
+        # Post a placeholder and edit it while the supervisor and the workers generate tokens
+        streaming_reply = DiscordStreamingReply(message)
+        await streaming_reply.start()
+
+        assembler = StreamTextAssembler()
+
+        def on_stream_chunk(node, chunk):
+            if assembler.add_chunk(node, chunk):
+                streaming_reply.update(assembler.text)
+
+        str_result = None
+        try:
+            result = await agent_scheduler.run_async(
+                lambda: run_agent_in_cb_context([HumanMessage(content=question_format)], config,
+                                                cost_position=taiga_slug, on_stream_chunk=on_stream_chunk,
+                                                trigger=trigger),
+                thread_id=config["configurable"]["thread_id"],
+                priority=JobPriority.INTERACTIVE
+            )
+            str_result = result["messages"][-1].content
+            print(f"Result: {str_result}")
+        finally:
+            # Also on errors: stop the flush loop and don't leave the placeholder behind
+            await streaming_reply.finish(str_result if str_result else STREAMING_ERROR_TEXT)
+        return
+
     async with message.channel.typing():
-        loop = asyncio.get_running_loop()
-        # Use run_in_executor to run the blocking invocation in a separate thread.
-        result = await loop.run_in_executor(
-            None,
-            lambda: run_agent_in_cb_context([HumanMessage(content=question_format)], config)
+        # Run the invocation on the agent scheduler. Mentions have priority over scheduled jobs.
+        result = await agent_scheduler.run_async(
+            lambda: run_agent_in_cb_context([HumanMessage(content=question_format)], config, cost_position=taiga_slug,
+                                            trigger=trigger),
+            thread_id=config["configurable"]["thread_id"],
+            priority=JobPriority.INTERACTIVE
         )
 
     str_result = result["messages"][-1].content
@@ -211,44 +356,40 @@ async def on_message(message: discord.Message):
 
 
 @util_logging.exception(__name__)
-async def manage_user_story_threads(project_slug: str):
+async def manage_user_story_threads(project_slug: str, include_tasks: bool = False):
     print("Manage user story threads started.")
 
-    project = get_project(project_slug)
-    if not project:
-        print(f"Project '{project_slug}' not found: {project}")
+    # Incremental update of the local taiga snapshot. Blocking, keep it off the event loop.
+    await asyncio.to_thread(taiga_snapshot.sync, project_slug, include_tasks=include_tasks)
 
     taiga_thread_channel = bot.get_channel(int(TAIGA_SLAG_TO_DISCORD_CHANNEL_MAP[project_slug]))
 
-    # Get all threads in the discord channel
-    thread_name_to_discord_thread = {}
-    for d_thread in taiga_thread_channel.threads:
-        thread_name_to_discord_thread[d_thread.name] = d_thread
-
-    async def get_all_archived_threads(channel, private):
-        threads = [archived_thread async for archived_thread in
-                   channel.archived_threads(private=private, joined=private, limit=100)]
-        return threads
-
-    # Get all archived threads in the channel. Better save than sorry.
-    all_archived_threads = await get_all_archived_threads(taiga_thread_channel, private=True)
-    all_archived_threads += await get_all_archived_threads(taiga_thread_channel, private=False)
-
-    for d_thread in all_archived_threads:
-        if d_thread.name not in thread_name_to_discord_thread:
-            thread_name_to_discord_thread[d_thread.name] = d_thread
+    # The registry is kept current by the thread events. A fully paginated scan only runs once a day.
+    if thread_registry.needs_full_scan(taiga_thread_channel.id):
+        await thread_registry.full_scan(project_slug, taiga_thread_channel)
+
+    async def get_registered_thread(ref: int):
+        thread_id = thread_registry.get_thread_id(project_slug, ref)
+        if not thread_id:
+            return None
+        # Active threads are cached, archived threads have to be fetched
+        discord_thread = bot.get_channel(thread_id)
+        if discord_thread is None:
+            try:
+                discord_thread = await bot.fetch_channel(thread_id)
+            except discord.NotFound:
+                print(f"Registered thread {thread_id} for #{ref} does not exist anymore.")
+                thread_registry.remove_thread(thread_id)
+                return None
+        return discord_thread
 
     async def manage_user_story(user_story):
-        thread_name = f"#{user_story.ref} {user_story.subject}"
+        thread_name = f"#{user_story['ref']} {user_story['subject']}"
 
-        us_full_infos = get_entity_by_ref_tool({"project_slug": project_slug,
-                                                "entity_ref": user_story.ref,
-                                                "entity_type": "userstory"})
-        us_full_infos = json.loads(us_full_infos)
-
-        if thread_name in thread_name_to_discord_thread:
-            print(f"Thread {thread_name} already exists.")
-            discord_thread = thread_name_to_discord_thread[thread_name]
+        # Matched by ref, so a renamed user story keeps its thread
+        discord_thread = await get_registered_thread(user_story["ref"])
+        if discord_thread:
+            print(f"Thread {discord_thread.name} for {thread_name} already exists.")
 
             tread_pins = await discord_thread.pins()
             if not tread_pins or len(tread_pins) == 0:
@@ -266,27 +407,27 @@ async def manage_user_story_threads(project_slug: str):
                 discord_thread = await taiga_thread_channel.create_thread(name=thread_name,
                                                                           type=ChannelType.private_thread,
                                                                           auto_archive_duration=4320)
+            thread_registry.register_thread(project_slug, discord_thread)
+
             msg = await discord_thread.send(f"**{thread_name}**:\n"
-                                            f"{us_full_infos['description']}\n"
-                                            f"{us_full_infos['url']}")
+                                            f"{user_story['description']}\n"
+                                            f"{user_story['url']}")
             await msg.pin()
 
             init_user_story_thread_promt_format = scrum_promts.init_user_story_thread_promt.format(
-                taiga_ref=user_story.ref,
-                taiga_name=user_story.subject,
+                taiga_ref=user_story["ref"],
+                taiga_name=user_story["subject"],
                 project_slug=project_slug)
 
             config = {
                 "configurable": {"user_id": discord_thread.name, "thread_id": f"{discord_thread.name} thread_init"}}
             async with discord_thread.typing():
-                loop = asyncio.get_running_loop()
-                # Use run_in_executor to run the blocking invocation in a separate thread.
-                result = await loop.run_in_executor(None,
-                                                    lambda: run_agent_in_cb_context([
-                                                        HumanMessage(content=init_user_story_thread_promt_format)
-                                                    ],
-                                                        config)
-                                                    )
+                result = await agent_scheduler.run_async(
+                    lambda: run_agent_in_cb_context([HumanMessage(content=init_user_story_thread_promt_format)],
+                                                    config, cost_position=project_slug, trigger="thread_init"),
+                    thread_id=config["configurable"]["thread_id"],
+                    priority=JobPriority.SCHEDULED
+                )
 
             str_result = result["messages"][-1].content
 
@@ -294,15 +435,13 @@ async def manage_user_story_threads(project_slug: str):
             for segment in str_results_segments:
                 await discord_thread.send(segment, suppress_embeds=True)
 
-            thread_name_to_discord_thread[thread_name] = discord_thread
-
-        associated_users = [w["id"] for w in us_full_infos["watchers"]]
-        if us_full_infos["assigned_to"]:
-            associated_users += [us_full_infos["assigned_to"]["id"]]
+        associated_users = list(user_story["watchers"])
+        if user_story["assigned_to"]:
+            associated_users += [user_story["assigned_to"]]
 
         # associated_users += [20]
 
-        for task in us_full_infos["related"]["tasks"]:
+        for task in user_story["related"]["tasks"]:
             if task.get("assigned_to"):
                 associated_users += [task["assigned_to"]]
             if task.get("watchers"):
@@ -319,19 +458,47 @@ async def manage_user_story_threads(project_slug: str):
                 if not discord_user:
                     print(f"Discord user '{discord_user_name}' for taiga user '{user}' not found.")
                 elif discord_user not in discord_thread.members:
+                    # discord.py waits on the per-route rate limit bucket (and retries 429s) by itself
                     await discord_thread.add_user(discord_user)
-                    await asyncio.sleep(0.5)  # Sleep for 0.5 second to avoid rate limiting
-
-    if project.is_backlog_activated:
-        sprints = project.list_milestones(closed=False)
-        for sprint in sprints:
-            for user_story in sprint.user_stories:
-                if not user_story.is_closed:
-                    await manage_user_story(user_story)
-    else:
-        for us in project.list_user_stories():
-            if not us.is_closed and not us.status_extra_info.get("is_closed"):
-                await manage_user_story(us)
+
+    # Open user stories of open sprints (or all open ones, if the backlog is not activated)
+    open_user_stories = taiga_snapshot.list_open_user_stories(project_slug)
+
+    # Process the user stories in parallel, but only USER_STORY_CONCURRENCY at a time
+    results = await gather_bounded(manage_user_story, open_user_stories, USER_STORY_CONCURRENCY)
+    for user_story, result in zip(open_user_stories, results):
+        if isinstance(result, Exception):
+            logger.error(f"Managing user story thread #{user_story['ref']} in {project_slug} failed: {result!r}")
+
+
+def get_thread_project_slug(thread: discord.Thread):
+    """Returns the taiga slug if the thread belongs to one of the user story thread channels."""
+    for project_slug, channel_id in TAIGA_SLAG_TO_DISCORD_CHANNEL_MAP.items():
+        if int(channel_id) == thread.parent_id:
+            return project_slug
+    return None
+
+
+@bot.event
+@util_logging.exception(__name__)
+async def on_thread_create(thread: discord.Thread):
+    project_slug = get_thread_project_slug(thread)
+    if project_slug:
+        thread_registry.register_thread(project_slug, thread, replace=False)
+
+
+@bot.event
+@util_logging.exception(__name__)
+async def on_thread_update(before: discord.Thread, after: discord.Thread):
+    project_slug = get_thread_project_slug(after)
+    if project_slug and before.name != after.name:
+        thread_registry.register_thread(project_slug, after, replace=False)
+
+
+@bot.event
+@util_logging.exception(__name__)
+async def on_raw_thread_delete(payload: discord.RawThreadDeleteEvent):
+    thread_registry.remove_thread(payload.thread_id)
 
 
 @bot.event
@@ -365,6 +532,25 @@ async def update_taiga_threads():
         await manage_user_story_threads(project_slug)
 
 
+@tasks.loop(hours=CHECKPOINT_RETENTION_INTERVAL_HOURS or 6)
+@util_logging.exception(__name__)
+async def checkpoint_retention_task():
+    report = await asyncio.to_thread(checkpoint_retention.run)
+    reclaimed = report["reclaimed_bytes"]
+    reclaimed = f"{reclaimed / 1024 / 1024:.1f} MB" if reclaimed is not None else "unknown size"
+    print(f"Checkpoint retention: {report['deleted_checkpoints']} checkpoints, {report['deleted_writes']} writes and "
+          f"{report['deleted_messages']} messages deleted, {report['pruned_threads']} of {report['threads']} threads "
+          f"pruned, {reclaimed} reclaimed in {report['duration_s']}s.")
+
+
+@tasks.loop(minutes=1)
+@util_logging.exception(__name__)
+async def passive_message_merge_task():
+    # Threads without an agent run for a while: their passive messages are merged by the time limit
+    for thread_id in passive_message_buffer.due_threads():
+        await merge_passive_messages(thread_id)
+
+
 @tasks.loop(hours=24)
 @util_logging.exception(__name__)
 async def daily_datacollector_task():
@@ -389,46 +575,116 @@ async def output_total_open_ai_cost():
 @tasks.loop(time=datetime.time(hour=8, minute=0, tzinfo=pytz.timezone('Europe/Berlin')))
 @util_logging.exception(__name__)
 async def scrum_master_task():
-    print(f"Scrum master task started at {datetime.datetime.now()}")
+    print(f"Scrum master task started at {datetime.datetime.now()}. Agent scheduler: {agent_scheduler.get_metrics()}, "
+          f"ingestion queue: {discord_ingestion_queue.get_metrics()}, fast router: {fast_router.get_metrics()}, "
+          f"passive messages: {passive_message_buffer.get_metrics() if passive_message_buffer else None}")
     # Only run on weekdays
     if datetime.datetime.today().weekday() > 4:
         print("Scrum master task skipped. Weekend :)")
         return
 
     for project_slug in TAIGA_SLAG_TO_DISCORD_CHANNEL_MAP.keys():
-        await manage_user_story_threads(project_slug)
+        # The digests depend on the tasks, so they are synced even if no user story changed
+        await manage_user_story_threads(project_slug, include_tasks=True)
 
         taiga_thread_channel = bot.get_channel(TAIGA_SLAG_TO_DISCORD_CHANNEL_MAP[project_slug])
-        project = get_project(project_slug)
+        changed_threads = []
         for thread in taiga_thread_channel.threads:
-            taiga_ref, taiga_name = thread.name.split(" ", 1)
-            taiga_ref = taiga_ref.replace("#", "")
-            userstory = project.get_userstory_by_ref(taiga_ref)
-            if userstory.is_closed or userstory.status_extra_info.get("is_closed", False) or userstory.milestone is None:
+            taiga_ref = parse_thread_ref(thread.name)
+            if taiga_ref is None:
+                continue
+            # manage_user_story_threads just synced the snapshot, no need to ask taiga again
+            userstory = taiga_snapshot.get_user_story(project_slug, taiga_ref)
+            if not userstory or userstory["is_closed"] or userstory["milestone"] is None:
                 continue
 
-            print(f"Running Scrummaster for {thread.name}")
+            digest = await get_thread_digest(thread, userstory)
+            if digest == scrum_master_digests.get_digest(project_slug, taiga_ref):
+                # Nothing changed since the last run. Only post the standup prompt, no agent run needed.
+                print(f"Scrummaster: {thread.name} unchanged, posting standup prompt only.")
+                await thread.send(scrum_promts.unchanged_standup_promt.format(
+                    taiga_ref=taiga_ref, taiga_name=userstory["subject"], url=userstory["url"]), suppress_embeds=True)
+            else:
+                changed_threads.append(thread)
+
+        # Run the agents for the changed threads in parallel, but only SCRUM_MASTER_CONCURRENCY at a time
+        results = await gather_bounded(lambda thread: run_scrum_master(project_slug, thread), changed_threads,
+                                       SCRUM_MASTER_CONCURRENCY)
+        for thread, result in zip(changed_threads, results):
+            if isinstance(result, Exception):
+                logger.error(f"Scrum master for {thread.name} in {project_slug} failed: {result!r}")
+
+        # The agents may have updated Taiga themselves. Store the digests after these changes,
+        # so the own updates don't count as changes tomorrow.
+        await asyncio.to_thread(taiga_snapshot.sync, project_slug, include_tasks=True)
+        for thread, result in zip(changed_threads, results):
+            taiga_ref = parse_thread_ref(thread.name)
+            userstory = taiga_snapshot.get_user_story(project_slug, taiga_ref)
+            if not isinstance(result, Exception) and userstory:
+                scrum_master_digests.set_digest(project_slug, taiga_ref, await get_thread_digest(thread, userstory))
+
+
+async def get_thread_digest(thread: discord.Thread, userstory: dict) -> str:
+    # Newest message in the thread according to the chroma collection. The bots own posts are ignored.
+    discord_watermark = await asyncio.to_thread(discord_chat_collector.get_last_msg_timestamps_in_db,
+                                                thread.guild, thread, exclude_author_id=bot.user.id)
+    return compute_story_digest(userstory, discord_watermark)
+
+
+async def run_scrum_master(project_slug: str, thread: discord.Thread):
+    taiga_ref, taiga_name = thread.name.split(" ", 1)
+    taiga_ref = taiga_ref.replace("#", "")
+
+    print(f"Running Scrummaster for {thread.name}")
+
+    scrum_task_promt = scrum_promts.scrum_master_promt.format(taiga_ref=taiga_ref, taiga_name=taiga_name,
+                                                              project_slug=project_slug)
+    config = {"configurable": {"user_id": thread.name, "thread_id": f"{thread.name} scrum_master"}}
+
+    async with thread.typing():
+        result = await agent_scheduler.run_async(
+            lambda: run_agent_in_cb_context([HumanMessage(content=scrum_task_promt)], config,
+                                            cost_position=project_slug, trigger="scrum_master"),
+            thread_id=config["configurable"]["thread_id"],
+            priority=JobPriority.SCHEDULED
+        )
 
-            scrum_task_promt = scrum_promts.scrum_master_promt.format(taiga_ref=taiga_ref, taiga_name=taiga_name,
-                                                                      project_slug=project_slug)
-            config = {"configurable": {"user_id": thread.name, "thread_id": f"{thread.name} scrum_master"}}
+    str_result = result["messages"][-1].content
+    print(f"Scrum master result: {str_result}")
 
-            async with thread.typing():
-                loop = asyncio.get_running_loop()
-                # Use run_in_executor to run the blocking invocation in a separate thread.
-                result = await loop.run_in_executor(None,
-                                                    lambda: run_agent_in_cb_context([
-                                                        HumanMessage(content=scrum_task_promt)
-                                                    ],
-                                                        config)
-                                                    )
+    str_results_segments = split_text_smart(str_result)
+    for segment in str_results_segments:
+        await thread.send(segment, suppress_embeds=True)
 
-            str_result = result["messages"][-1].content
-            print(f"Scrum master result: {str_result}")
 
-            str_results_segments = split_text_smart(str_result)
-            for segment in str_results_segments:
-                await thread.send(segment, suppress_embeds=True)
+@bot.tree.command(name="usage", description="Token usage, costs and latencies of the agents.")
+@discord.app_commands.describe(days="Number of past days to include (default 7)")
+@util_logging.exception(__name__)
+async def usage_command(interaction: discord.Interaction, days: int = 7):
+    await interaction.response.defer(thinking=True)
+
+    per_day = await asyncio.to_thread(metrics_store.aggregate, days, ("day", "project_slug"))
+    per_trigger = await asyncio.to_thread(metrics_store.aggregate, days, ("trigger",))
+    per_node = await asyncio.to_thread(metrics_store.node_latency_summary, days)
+
+    lines = [f"**Agent usage of the last {days} days**", "", "**Per day and project:**"]
+    lines += [f"{r['day']} {r['project_slug']}: {r['invocations']} runs, "
+              f"{r['prompt_tokens']}/{r['completion_tokens']} tokens (prompt/completion), "
+              f"{r['cache_hit_rate']:.0%} cached, ${r['total_cost']:.4f}, "
+              f"avg {r['avg_duration_s']:.1f}s, max {r['max_duration_s']:.1f}s, {r['failed']} failed"
+              for r in per_day] or ["No invocations."]
+    lines += ["", "**Per trigger:**"]
+    lines += [f"{r['trigger']}: {r['invocations']} runs, ${r['total_cost']:.4f}, {r['cache_hit_rate']:.0%} cached, "
+              f"avg {r['avg_duration_s']:.1f}s"
+              for r in per_trigger]
+    lines += ["", "**Per node:**"]
+    lines += [f"{r['node']}: {r['calls']} calls, avg {r['avg_duration_s']:.1f}s, total {r['total_duration_s']:.1f}s"
+              for r in per_node]
+    lines += ["", f"**Fast router (since start):** {fast_router.get_metrics()}"]
+    lines += [f"**LLM response cache (since start):** {llm_cache.get_metrics()}"]
+
+    for segment in split_text_smart("\n".join(lines)):
+        await interaction.followup.send(segment, suppress_embeds=True)
 
 
 @bot.event
@@ -440,6 +696,8 @@ async def on_ready():
 
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
 
+    discord_ingestion_queue.start()
+
     for assistant in data_collector_list:
         await assistant.on_startup()
 
@@ -454,6 +712,10 @@ async def on_ready():
     scrum_master_task.start()
     daily_datacollector_task.start()
     update_taiga_threads.start()
+    if checkpoint_retention and CHECKPOINT_RETENTION_INTERVAL_HOURS > 0:
+        checkpoint_retention_task.start()
+    if passive_message_buffer:
+        passive_message_merge_task.start()
     print(f"Tasks started.")
 
 
@@ -0,0 +1,117 @@
+import time
+from collections import defaultdict
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+
+class NodeLatencyCallbackHandler(BaseCallbackHandler):
+    """Measures the wall clock time spent in each top level node of the multi agent graph."""
+
+    def __init__(self):
+        self.node_durations = defaultdict(float)
+        self.node_calls = defaultdict(int)
+        self._starts: dict[UUID, tuple[str, float]] = {}
+
+    def on_chain_start(self, serialized: dict[str, Any], inputs: dict[str, Any], *, run_id: UUID,
+                       metadata: Optional[dict[str, Any]] = None, **kwargs: Any) -> Any:
+        if not metadata or kwargs.get("name") != metadata.get("langgraph_node"):
+            return
+        # Nodes of the react sub graphs of the workers are counted to their worker node
+        if "|" in metadata.get("langgraph_checkpoint_ns", ""):
+            return
+        self._starts[run_id] = (metadata["langgraph_node"], time.monotonic())
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._record(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._record(run_id)
+
+    def _record(self, run_id: UUID):
+        if run_id in self._starts:
+            node, started = self._starts.pop(run_id)
+            self.node_durations[node] += time.monotonic() - started
+            self.node_calls[node] += 1
+
+
+class MetricsStore:
+    """
+    Persistent per invocation accounting of tokens, costs and latencies of the multi agent graph.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or get_local_state_path("agent_metrics.sqlite")
+        with sqlite_connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS invocations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL, day TEXT, project_slug TEXT,
+                    thread_id TEXT, trigger TEXT, duration_s REAL, prompt_tokens INTEGER, completion_tokens INTEGER,
+                    total_cost REAL, success INTEGER, cached_prompt_tokens INTEGER DEFAULT 0);
+                CREATE INDEX IF NOT EXISTS invocations_by_day ON invocations (day, project_slug);
+                CREATE TABLE IF NOT EXISTS node_latencies (
+                    invocation_id INTEGER, node TEXT, duration_s REAL, calls INTEGER);
+                CREATE INDEX IF NOT EXISTS node_latencies_by_invocation ON node_latencies (invocation_id);
+            """)
+            # Stores created before the cached token accounting
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(invocations)")}
+            if "cached_prompt_tokens" not in columns:
+                conn.execute("ALTER TABLE invocations ADD COLUMN cached_prompt_tokens INTEGER DEFAULT 0")
+
+    def record_invocation(self, started_at: float, duration_s: float, project_slug: Optional[str], thread_id: str,
+                          trigger: str, prompt_tokens: int, completion_tokens: int, total_cost: float,
+                          success: bool = True, node_latencies: NodeLatencyCallbackHandler = None,
+                          cached_prompt_tokens: int = 0) -> int:
+        day = time.strftime("%Y-%m-%d", time.localtime(started_at))
+        with sqlite_connect(self.db_path) as conn:
+            cursor = conn.execute(
+                "INSERT INTO invocations (started_at, day, project_slug, thread_id, trigger, duration_s, "
+                "prompt_tokens, completion_tokens, total_cost, success, cached_prompt_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (started_at, day, project_slug or "undefined", thread_id, trigger, duration_s, prompt_tokens,
+                 completion_tokens, total_cost, int(success), cached_prompt_tokens))
+            invocation_id = cursor.lastrowid
+            if node_latencies:
+                conn.executemany("INSERT INTO node_latencies VALUES (?, ?, ?, ?)",
+                                 [(invocation_id, node, duration, node_latencies.node_calls[node])
+                                  for node, duration in node_latencies.node_durations.items()])
+        return invocation_id
+
+    def aggregate(self, days: int = 7, group_by: tuple = ("day", "project_slug")) -> [dict]:
+        """
+        Aggregated usage of the last days, grouped by any of day, project_slug, trigger and thread_id.
+        Sorted by cost (most expensive first) within each day.
+        """
+        allowed = {"day", "project_slug", "trigger", "thread_id"}
+        if not set(group_by) <= allowed:
+            raise ValueError(f"group_by must be a subset of {allowed}")
+        columns = ", ".join(group_by)
+        since = time.time() - days * 24 * 60 * 60
+        order = ("day DESC, " if "day" in group_by else "") + "SUM(total_cost) DESC"
+        with sqlite_connect(self.db_path) as conn:
+            rows = conn.execute(
+                f"SELECT {columns}, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(total_cost), "
+                f"AVG(duration_s), MAX(duration_s), SUM(1 - success), SUM(cached_prompt_tokens) "
+                f"FROM invocations WHERE started_at >= ? GROUP BY {columns} "
+                f"ORDER BY {order}", (since,)).fetchall()
+
+        keys = list(group_by) + ["invocations", "prompt_tokens", "completion_tokens", "total_cost",
+                                 "avg_duration_s", "max_duration_s", "failed", "cached_prompt_tokens"]
+        result = [dict(zip(keys, row)) for row in rows]
+        for row in result:
+            # Share of the prompt tokens served from the provider's prompt cache
+            row["cache_hit_rate"] = row["cached_prompt_tokens"] / row["prompt_tokens"] if row["prompt_tokens"] else 0.0
+        return result
+
+    def node_latency_summary(self, days: int = 7) -> [dict]:
+        """Average and total latency per node of the last days, slowest nodes first."""
+        since = time.time() - days * 24 * 60 * 60
+        with sqlite_connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT node, SUM(calls), SUM(n.duration_s), SUM(n.duration_s) / SUM(calls) FROM node_latencies n "
+                "JOIN invocations i ON i.id = n.invocation_id WHERE i.started_at >= ? "
+                "GROUP BY node ORDER BY SUM(n.duration_s) DESC", (since,)).fetchall()
+        return [dict(zip(["node", "calls", "total_duration_s", "avg_duration_s"], row)) for row in rows]
@@ -0,0 +1,79 @@
+import os
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+load_dotenv()
+
+PASSIVE_MESSAGE_BUFFER = os.getenv("PASSIVE_MESSAGE_BUFFER", "true").lower() in ("true", "1", "yes", "on")
+PASSIVE_BUFFER_MAX_MESSAGES = int(os.getenv("PASSIVE_BUFFER_MAX_MESSAGES", 50))
+PASSIVE_BUFFER_MAX_AGE_MINUTES = float(os.getenv("PASSIVE_BUFFER_MAX_AGE_MINUTES", 30))
+
+
+class PassiveMessageBuffer:
+    """
+    Pending messages of the conversations the bot only listens to (no mention).
+
+    Every passive message used to be an update_state, i.e. a full checkpoint read and write. Now it is one small
+    SQLite insert. The buffered messages of a thread are merged into the graph state in one step: prepended to the
+    input of the next agent run of the thread, or written with a single update_state once the thread has
+    max_messages pending messages or the oldest one is older than max_age seconds.
+    The buffer is persistent, pending messages survive a restart.
+    """
+
+    def __init__(self, db_path: str = None, max_messages: int = PASSIVE_BUFFER_MAX_MESSAGES,
+                 max_age: float = PASSIVE_BUFFER_MAX_AGE_MINUTES * 60):
+        self.db_path = db_path or get_local_state_path("passive_messages.sqlite")
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._stats = {"buffered": 0, "merged": 0, "merges": 0}
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS passive_messages (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, thread_id TEXT, content TEXT, created_at REAL);
+                CREATE INDEX IF NOT EXISTS passive_messages_by_thread ON passive_messages (thread_id, seq);
+            """)
+
+    def add(self, thread_id: str, content: str) -> bool:
+        """
+        Buffers a message of the thread.
+
+        :return: True if the thread reached max_messages and should be merged now
+        """
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT INTO passive_messages (thread_id, content, created_at) VALUES (?, ?, ?)",
+                         (thread_id, content, time.time()))
+            pending = conn.execute("SELECT COUNT(*) FROM passive_messages WHERE thread_id = ?",
+                                   (thread_id,)).fetchone()[0]
+        self._stats["buffered"] += 1
+        return pending >= self.max_messages
+
+    def take(self, thread_id: str) -> list[HumanMessage]:
+        """Removes and returns the pending messages of the thread, oldest first."""
+        with sqlite_connect(self.db_path) as conn:
+            rows = conn.execute("SELECT seq, content FROM passive_messages WHERE thread_id = ? ORDER BY seq",
+                                (thread_id,)).fetchall()
+            if rows:
+                conn.execute("DELETE FROM passive_messages WHERE thread_id = ? AND seq <= ?",
+                             (thread_id, rows[-1][0]))
+        if rows:
+            self._stats["merged"] += len(rows)
+            self._stats["merges"] += 1
+        return [HumanMessage(content=content) for _, content in rows]
+
+    def due_threads(self) -> list[str]:
+        """Threads with max_messages pending messages or with a pending message older than max_age."""
+        with sqlite_connect(self.db_path) as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT thread_id FROM passive_messages GROUP BY thread_id HAVING COUNT(*) >= ? OR MIN(created_at) < ?",
+                (self.max_messages, time.time() - self.max_age))]
+
+    def get_metrics(self) -> dict:
+        with sqlite_connect(self.db_path) as conn:
+            pending, threads = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT thread_id) FROM passive_messages").fetchone()
+        return {"pending_messages": pending, "pending_threads": threads, **self._stats}
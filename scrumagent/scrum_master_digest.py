@@ -0,0 +1,43 @@
+import hashlib
+import json
+import time
+from typing import Optional
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+
+def compute_story_digest(user_story: dict, discord_watermark: Optional[float]) -> str:
+    """
+    Cheap change digest of a user story thread. Covers the taiga modified date/version of the story,
+    the state of all its tasks and the timestamp of the newest (non bot) discord message in the thread.
+    """
+    digest_source = {
+        "modified_date": user_story.get("modified_date"),
+        "version": user_story.get("version"),
+        "tasks": sorted((task["ref"], task.get("status"), task.get("modified_date"), task.get("version"))
+                        for task in user_story.get("related", {}).get("tasks", [])),
+        "discord_watermark": discord_watermark,
+    }
+    return hashlib.sha256(json.dumps(digest_source, sort_keys=True, default=str).encode("UTF-8")).hexdigest()
+
+
+class ScrumMasterDigestStore:
+    """Remembers the digest of every thread at its last full scrum master run."""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or get_local_state_path("scrum_master_digests.sqlite")
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS digests ("
+                         "project_slug TEXT, ref INTEGER, digest TEXT, updated_at REAL, "
+                         "PRIMARY KEY (project_slug, ref))")
+
+    def get_digest(self, project_slug: str, ref: int) -> Optional[str]:
+        with sqlite_connect(self.db_path) as conn:
+            row = conn.execute("SELECT digest FROM digests WHERE project_slug = ? AND ref = ?",
+                               (project_slug, int(ref))).fetchone()
+        return row[0] if row else None
+
+    def set_digest(self, project_slug: str, ref: int, digest: str):
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                         (project_slug, int(ref), digest, time.time()))
@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from langchain_taiga.tools.taiga_tools import get_project
+from taiga.models import Tasks
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+load_dotenv()
+
+TAIGA_URL = os.getenv("TAIGA_URL")
+
+
+class TaigaSnapshot:
+    """
+    Persistent local snapshot of the user stories and tasks (incl. watchers) of Taiga projects.
+
+    The snapshot is keyed by (project_slug, ref) and updated incrementally: every sync only asks Taiga for
+    user stories with a modified_date newer than the newest one already stored. If nothing changed, that one
+    delta query is all; the tasks are only asked for (delta) when stories changed, on a full sync or with
+    include_tasks. Only stories whose version changed are fetched in detail. Deletions can not be seen in a
+    delta query, so a full listing is done every full_sync_interval seconds.
+    """
+
+    def __init__(self, db_path: str = None, full_sync_interval: float = 24 * 60 * 60):
+        self._db_path = db_path
+        self._db_ready = False
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.Lock()
+        self._sync_locks: dict[str, threading.Lock] = {}
+        # project_slug -> taiga project, fetched again on every full sync
+        self._projects = {}
+
+    @property
+    def db_path(self) -> str:
+        """The db is created on the first use, not at import of the tool module."""
+        if not self._db_ready:
+            with self._lock:
+                if not self._db_ready:
+                    self._db_path = self._db_path or get_local_state_path("taiga_snapshot.sqlite")
+                    self._create_tables()
+                    self._db_ready = True
+        return self._db_path
+
+    def _create_tables(self):
+        with sqlite_connect(self._db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS user_stories (
+                    project_slug TEXT, ref INTEGER, id INTEGER, version INTEGER, modified_date TEXT, data TEXT,
+                    PRIMARY KEY (project_slug, ref));
+                CREATE TABLE IF NOT EXISTS tasks (
+                    project_slug TEXT, ref INTEGER, id INTEGER, user_story_id INTEGER, version INTEGER,
+                    modified_date TEXT, data TEXT,
+                    PRIMARY KEY (project_slug, ref));
+                CREATE INDEX IF NOT EXISTS tasks_by_user_story ON tasks (project_slug, user_story_id);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    project_slug TEXT PRIMARY KEY, is_backlog_activated INTEGER,
+                    us_modified_date TEXT, task_modified_date TEXT, last_full_sync REAL, last_sync REAL);
+            """)
+
+    def _connect(self):
+        return sqlite_connect(self.db_path)
+
+    def sync_if_stale(self, project_slug: str, max_age: float) -> Optional[set]:
+        """Syncs only if the last sync of the project is older than max_age seconds. None if not synced."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT last_sync FROM sync_state WHERE project_slug = ?", (project_slug,)).fetchone()
+        if row and row[0] and time.time() - row[0] < max_age:
+            return None
+        return self.sync(project_slug)
+
+    def sync(self, project_slug: str, force_full: bool = False, include_tasks: bool = False) -> set:
+        """
+        Brings the snapshot of a project up to date. Blocking, run it in a worker thread.
+
+        :param include_tasks: Also ask for changed tasks if no user story changed (task changes don't change
+                              their story)
+        :return: The refs of the user stories that changed (story itself or one of its tasks)
+        """
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(project_slug, threading.Lock())
+
+        with sync_lock:
+            with self._connect() as conn:
+                row = conn.execute("SELECT us_modified_date, task_modified_date, last_full_sync FROM sync_state "
+                                   "WHERE project_slug = ?", (project_slug,)).fetchone()
+            us_since, task_since, last_full_sync = row if row else (None, None, None)
+
+            full_sync = force_full or not last_full_sync or time.time() - last_full_sync > self.full_sync_interval
+            if full_sync:
+                us_since, task_since = None, None
+
+            project = self._projects.get(project_slug) if not full_sync else None
+            if project is None:
+                project = get_project(project_slug)
+                if not project:
+                    print(f"Project '{project_slug}' not found. Snapshot not updated.")
+                    return set()
+                self._projects[project_slug] = project
+
+            user_stories = project.list_user_stories(**({"modified_date__gt": us_since} if us_since else {}))
+            tasks = []
+            if full_sync or user_stories or include_tasks:
+                tasks = Tasks(project.requester).list(project=project.id,
+                                                      **({"modified_date__gt": task_since} if task_since else {}))
+
+            changed_refs = self._store_user_stories(project, user_stories, full_sync)
+            changed_refs |= self._store_tasks(project_slug, tasks, full_sync)
+
+            with self._connect() as conn:
+                us_max, task_max = conn.execute(
+                    "SELECT (SELECT MAX(modified_date) FROM user_stories WHERE project_slug = ?), "
+                    "(SELECT MAX(modified_date) FROM tasks WHERE project_slug = ?)",
+                    (project_slug, project_slug)).fetchone()
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO sync_state VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(project_slug) DO UPDATE SET "
+                    "is_backlog_activated = excluded.is_backlog_activated, us_modified_date = excluded.us_modified_date, "
+                    "task_modified_date = excluded.task_modified_date, last_full_sync = excluded.last_full_sync, "
+                    "last_sync = excluded.last_sync",
+                    (project_slug, int(bool(project.is_backlog_activated)), us_max, task_max,
+                     now if full_sync else last_full_sync, now))
+
+            print(f"Taiga snapshot of {project_slug} synced ({'full' if full_sync else 'delta'}): "
+                  f"{len(user_stories)} user stories, {len(tasks)} tasks received, {len(changed_refs)} changed.")
+            return changed_refs
+
+    def _store_user_stories(self, project, user_stories, full_sync: bool) -> set:
+        project_slug = project.slug
+        with self._connect() as conn:
+            known_versions = dict(conn.execute("SELECT id, version FROM user_stories WHERE project_slug = ?",
+                                               (project_slug,)).fetchall())
+
+        changed_refs, rows = set(), []
+        for us in user_stories:
+            if known_versions.get(us.id) == us.version:
+                continue
+            # The list response doesn't contain the description, so only changed stories are fetched in detail
+            us = project.get_userstory_by_ref(us.ref)
+            status_extra_info = getattr(us, "status_extra_info", None) or {}
+            data = {
+                "ref": us.ref,
+                "id": us.id,
+                "subject": us.subject,
+                "description": getattr(us, "description", ""),
+                "url": f"{TAIGA_URL}/project/{project_slug}/us/{us.ref}",
+                "status": status_extra_info.get("name", "Unknown"),
+                "is_closed": bool(us.is_closed or status_extra_info.get("is_closed")),
+                "milestone": us.milestone,
+                "due_date": getattr(us, "due_date", None),
+                "assigned_to": us.assigned_to,
+                "watchers": list(us.watchers or []),
+                "modified_date": us.modified_date,
+                "version": us.version,
+            }
+            rows.append((project_slug, us.ref, us.id, us.version, us.modified_date, json.dumps(data)))
+            changed_refs.add(us.ref)
+
+        with self._connect() as conn:
+            if full_sync:
+                current_refs = {us.ref for us in user_stories}
+                stored_refs = {r for (r,) in conn.execute("SELECT ref FROM user_stories WHERE project_slug = ?",
+                                                          (project_slug,))}
+                deleted_refs = stored_refs - current_refs
+                conn.executemany("DELETE FROM user_stories WHERE project_slug = ? AND ref = ?",
+                                 [(project_slug, r) for r in deleted_refs])
+                changed_refs |= deleted_refs
+            conn.executemany("INSERT OR REPLACE INTO user_stories VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return changed_refs
+
+    def _store_tasks(self, project_slug: str, tasks, full_sync: bool) -> set:
+        with self._connect() as conn:
+            known_versions = dict(conn.execute("SELECT id, version FROM tasks WHERE project_slug = ?",
+                                               (project_slug,)).fetchall())
+            us_id_to_ref = dict(conn.execute("SELECT id, ref FROM user_stories WHERE project_slug = ?",
+                                             (project_slug,)).fetchall())
+
+        changed_refs, rows = set(), []
+        for task in tasks:
+            if known_versions.get(task.id) == task.version:
+                continue
+            status_extra_info = getattr(task, "status_extra_info", None) or {}
+            data = {
+                "ref": task.ref,
+                "id": task.id,
+                "subject": task.subject,
+                "status": status_extra_info.get("name", "Unknown"),
+                "is_closed": bool(getattr(task, "is_closed", False) or status_extra_info.get("is_closed")),
+                "user_story": task.user_story,
+                "assigned_to": task.assigned_to,
+                "watchers": list(task.watchers or []),
+                "due_date": getattr(task, "due_date", None),
+                "url": f"{TAIGA_URL}/project/{project_slug}/task/{task.ref}",
+                "modified_date": task.modified_date,
+                "version": task.version,
+            }
+            rows.append((project_slug, task.ref, task.id, task.user_story, task.version, task.modified_date,
+                         json.dumps(data)))
+            if task.user_story in us_id_to_ref:
+                changed_refs.add(us_id_to_ref[task.user_story])
+
+        with self._connect() as conn:
+            if full_sync:
+                current_refs = {task.ref for task in tasks}
+                stored_refs = {r for (r,) in conn.execute("SELECT ref FROM tasks WHERE project_slug = ?",
+                                                          (project_slug,))}
+                conn.executemany("DELETE FROM tasks WHERE project_slug = ? AND ref = ?",
+                                 [(project_slug, r) for r in stored_refs - current_refs])
+            conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return changed_refs
+
+    def is_backlog_activated(self, project_slug: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT is_backlog_activated FROM sync_state WHERE project_slug = ?",
+                               (project_slug,)).fetchone()
+        return bool(row[0]) if row else False
+
+    def get_user_story(self, project_slug: str, ref: int) -> Optional[dict]:
+        """Returns the stored user story incl. its tasks under ["related"]["tasks"], or None if unknown."""
+        user_stories = self._load_user_stories(project_slug, ref=int(ref))
+        return user_stories[0] if user_stories else None
+
+    def list_open_user_stories(self, project_slug: str) -> [dict]:
+        """
+        Open user stories of the project. With an activated backlog only stories in a sprint are returned
+        (a sprint with an open story is always open itself).
+        """
+        backlog_activated = self.is_backlog_activated(project_slug)
+        return [us for us in self._load_user_stories(project_slug) if not us["is_closed"] and
+                (not backlog_activated or us["milestone"] is not None)]
+
+    def _load_user_stories(self, project_slug: str, ref: int = None) -> [dict]:
+        with self._connect() as conn:
+            if ref is None:
+                us_rows = conn.execute("SELECT id, data FROM user_stories WHERE project_slug = ? ORDER BY ref",
+                                       (project_slug,)).fetchall()
+                task_rows = conn.execute("SELECT user_story_id, data FROM tasks WHERE project_slug = ? ORDER BY ref",
+                                         (project_slug,)).fetchall()
+            else:
+                us_rows = conn.execute("SELECT id, data FROM user_stories WHERE project_slug = ? AND ref = ?",
+                                       (project_slug, ref)).fetchall()
+                task_rows = conn.execute("SELECT user_story_id, data FROM tasks WHERE project_slug = ? AND "
+                                         "user_story_id IN (SELECT id FROM user_stories WHERE project_slug = ? "
+                                         "AND ref = ?) ORDER BY ref", (project_slug, project_slug, ref)).fetchall()
+
+        tasks_by_us_id = {}
+        for us_id, data in task_rows:
+            tasks_by_us_id.setdefault(us_id, []).append(json.loads(data))
+
+        user_stories = []
+        for us_id, data in us_rows:
+            user_story = json.loads(data)
+            user_story["project_slug"] = project_slug
+            user_story["related"] = {"tasks": tasks_by_us_id.get(us_id, [])}
+            user_stories.append(user_story)
+        return user_stories
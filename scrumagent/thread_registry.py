@@ -0,0 +1,115 @@
+import re
+import time
+from typing import Optional
+
+import discord
+
+from scrumagent.utils import get_local_state_path, sqlite_connect
+
+# User story threads are named "#<ref> <subject>"
+THREAD_REF_REGEX = re.compile(r"^#(\d+)\b")
+
+
+def parse_thread_ref(thread_name: str) -> Optional[int]:
+    match = THREAD_REF_REGEX.match(thread_name or "")
+    return int(match.group(1)) if match else None
+
+
+class DiscordThreadRegistry:
+    """
+    Persistent mapping (project_slug, user story ref) -> discord thread id.
+
+    Kept current by the gateway thread events (create/update/delete) and by a fully paginated scan
+    of the active and archived threads of a channel, which only runs every full_scan_interval seconds.
+    Threads are matched by the ref in their name, so renaming a user story doesn't create a duplicate thread.
+    """
+
+    def __init__(self, db_path: str = None, full_scan_interval: float = 24 * 60 * 60):
+        self.db_path = db_path or get_local_state_path("discord_thread_registry.sqlite")
+        self.full_scan_interval = full_scan_interval
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS threads (
+                    project_slug TEXT, ref INTEGER, thread_id INTEGER, parent_id INTEGER, name TEXT,
+                    updated_at REAL, PRIMARY KEY (project_slug, ref));
+                CREATE INDEX IF NOT EXISTS threads_by_id ON threads (thread_id);
+                CREATE TABLE IF NOT EXISTS channel_scans (channel_id INTEGER PRIMARY KEY, last_full_scan REAL);
+            """)
+
+    def get_thread_id(self, project_slug: str, ref: int) -> Optional[int]:
+        with sqlite_connect(self.db_path) as conn:
+            row = conn.execute("SELECT thread_id FROM threads WHERE project_slug = ? AND ref = ?",
+                               (project_slug, int(ref))).fetchone()
+        return row[0] if row else None
+
+    def get_threads(self, project_slug: str) -> dict:
+        """All registered threads of a project as {ref: thread_id}."""
+        with sqlite_connect(self.db_path) as conn:
+            return dict(conn.execute("SELECT ref, thread_id FROM threads WHERE project_slug = ?", (project_slug,)))
+
+    def register_thread(self, project_slug: str, thread: discord.Thread, replace: bool = True) -> Optional[int]:
+        """
+        Registers a thread under the ref parsed from its name.
+
+        :param replace: If False, an existing mapping of the ref to another thread is kept
+        :return: The parsed ref, or None if the thread is not a user story thread
+        """
+        ref = parse_thread_ref(thread.name)
+        if ref is None:
+            return None
+        with sqlite_connect(self.db_path) as conn:
+            if replace:
+                conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread.id,))
+            conn.execute(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO threads VALUES (?, ?, ?, ?, ?, ?)",
+                         (project_slug, ref, thread.id, thread.parent_id, thread.name, time.time()))
+            # Keep the name up to date for the thread that is actually registered
+            conn.execute("UPDATE threads SET name = ?, updated_at = ? WHERE thread_id = ?",
+                         (thread.name, time.time(), thread.id))
+        return ref
+
+    def remove_thread(self, thread_id: int):
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+    def needs_full_scan(self, channel_id: int) -> bool:
+        with sqlite_connect(self.db_path) as conn:
+            row = conn.execute("SELECT last_full_scan FROM channel_scans WHERE channel_id = ?",
+                               (channel_id,)).fetchone()
+        return not row or time.time() - row[0] > self.full_scan_interval
+
+    async def full_scan(self, project_slug: str, channel: discord.TextChannel) -> int:
+        """
+        Registers all active and archived (public and private) threads of the channel.
+        The archive iterators are fully paginated (limit=None).
+
+        :return: Number of registered user story threads
+        """
+        threads = list(channel.threads)
+        threads += [t async for t in channel.archived_threads(private=False, limit=None)]
+        try:
+            threads += [t async for t in channel.archived_threads(private=True, joined=True, limit=None)]
+        except discord.Forbidden:
+            print(f"No access to private archived threads of {channel.name}")
+
+        existing_thread_ids = set(self.get_threads(project_slug).values())
+        scanned_thread_ids = {t.id for t in threads}
+
+        # Drop mappings to threads that don't exist anymore
+        with sqlite_connect(self.db_path) as conn:
+            conn.executemany("DELETE FROM threads WHERE thread_id = ? AND parent_id = ?",
+                             [(t_id, channel.id) for t_id in existing_thread_ids - scanned_thread_ids])
+
+        # If a ref has several threads (e.g. duplicates from earlier renames), the registered one is kept,
+        # otherwise the oldest thread wins
+        registered = 0
+        for thread in sorted(threads, key=lambda t: t.id):
+            if self.register_thread(project_slug, thread, replace=False) is not None:
+                registered += 1
+
+        with sqlite_connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO channel_scans VALUES (?, ?)", (channel.id, time.time()))
+
+        print(f"Thread registry: full scan of {channel.name} found {len(threads)} threads, "
+              f"{registered} user story threads.")
+        return registered
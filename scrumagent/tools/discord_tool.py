@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from datetime import datetime
@@ -16,6 +17,11 @@ chroma_db_inst = init_discord_chroma_db()
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 
+# Shared clients, so the connections to the Discord API are reused across tool calls.
+# The async client serves the coroutine variants of the tools (graph.ainvoke).
+http_client = httpx.Client()
+async_http_client = httpx.AsyncClient()
+
 
 @tool(parse_docstring=True)
 def discord_search_tool(query: str, max_results: int = 5) -> str:
@@ -38,7 +44,17 @@ def discord_search_tool(query: str, max_results: int = 5) -> str:
     Returns:
         str: A formatted summary of the matched messages or a notice if no relevant results were found.
     """
-    results = chroma_db_inst.similarity_search(query, k=max_results)
+    return _format_search_results(chroma_db_inst.similarity_search(query, k=max_results))
+
+
+async def _adiscord_search(query: str, max_results: int = 5) -> str:
+    return _format_search_results(await chroma_db_inst.asimilarity_search(query, k=max_results))
+
+
+discord_search_tool.coroutine = _adiscord_search
+
+
+def _format_search_results(results: list) -> str:
     str_format = ""
     for result in results:
         content = result.page_content.replace("\n", " ")
@@ -78,11 +94,25 @@ def discord_channel_msgs_tool(channel_name: str = None, timeframe: str = None) -
         - If the user requests something like "show me the messages from #my-channel yesterday".
         - If you need to gather conversation context from a certain channel/time.
     """
+    where_filter = _channel_msgs_filter(channel_name, interpret_timeframe_tool(timeframe))
+    return _format_channel_msgs(chroma_db_inst.get(where={"$and": where_filter}))
+
+
+async def _adiscord_channel_msgs(channel_name: str = None, timeframe: str = None) -> str:
+    where_filter = _channel_msgs_filter(channel_name, await interpret_timeframe_tool.arun(timeframe))
+    # Chroma has no async client API, the local query runs in a worker thread
+    return _format_channel_msgs(await asyncio.to_thread(chroma_db_inst.get, where={"$and": where_filter}))
+
+
+discord_channel_msgs_tool.coroutine = _adiscord_channel_msgs
+
+
+def _channel_msgs_filter(channel_name: str, timeframe_json: str) -> list:
     where_filter = [{"source": "discord_chat"}]
     if channel_name:
         where_filter.append({"channel_name": channel_name})
 
-    timeframes = json.loads(interpret_timeframe_tool(timeframe))
+    timeframes = json.loads(timeframe_json)
     before = timeframes.get("before")
     after = timeframes.get("after")
 
@@ -93,8 +123,10 @@ def discord_channel_msgs_tool(channel_name: str = None, timeframe: str = None) -
         where_filter.append({"timestamp": {"$gte": after}})  # greater than or equal
 
     print(where_filter)
+    return where_filter
+
 
-    results_dict = chroma_db_inst.get(where={"$and": where_filter})
+def _format_channel_msgs(results_dict: dict) -> str:
     print("!!!" + str(results_dict))
     str_format = ""
     # json_results = []
@@ -140,22 +172,42 @@ def discord_get_recent_messages_tool(channel_id: str, limit: int = 200) -> str:
     if not DISCORD_TOKEN:
         return "Error: DISCORD_BOT_TOKEN is not set in environment variables."
 
-    # The Discord API endpoint for fetching channel messages:
-    url = f"https://discord.com/api/v10/channels/{channel_id}/messages?limit={limit}"
+    try:
+        response = http_client.get(_recent_messages_url(channel_id, limit), headers=_discord_headers())
+        response.raise_for_status()  # Will raise an HTTPError if non-2xx status
+    except httpx.HTTPError as e:
+        return f"Error fetching messages from Discord API: {str(e)}"
+    return _format_recent_messages(response.json())
 
-    headers = {
-        "Authorization": f"Bot {DISCORD_TOKEN}",
-        "Content-Type": "application/json"
-    }
+
+async def _adiscord_get_recent_messages(channel_id: str, limit: int = 200) -> str:
+    if not DISCORD_TOKEN:
+        return "Error: DISCORD_BOT_TOKEN is not set in environment variables."
 
     try:
-        response = httpx.get(url, headers=headers)
-        response.raise_for_status()  # Will raise an HTTPError if non-2xx status
+        response = await async_http_client.get(_recent_messages_url(channel_id, limit), headers=_discord_headers())
+        response.raise_for_status()
     except httpx.HTTPError as e:
         return f"Error fetching messages from Discord API: {str(e)}"
+    return _format_recent_messages(response.json())
+
+
+discord_get_recent_messages_tool.coroutine = _adiscord_get_recent_messages
+
+
+def _discord_headers() -> dict:
+    return {
+        "Authorization": f"Bot {DISCORD_TOKEN}",
+        "Content-Type": "application/json"
+    }
+
+
+def _recent_messages_url(channel_id: str, limit: int) -> str:
+    # The Discord API endpoint for fetching channel messages:
+    return f"https://discord.com/api/v10/channels/{channel_id}/messages?limit={limit}"
 
-    messages = response.json()
 
+def _format_recent_messages(messages) -> str:
     # If the response is not an array of messages, handle error:
     if not isinstance(messages, list):
         return f"Unexpected response from Discord: {messages}"
@@ -222,22 +274,33 @@ def discord_send_message_tool(channel_id: str, message: str) -> str:
 
     # The Discord API endpoint for sending messages:
     url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
-
-    headers = {
-        "Authorization": f"Bot {DISCORD_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
     payload = {"content": message}
 
     try:
-        response = httpx.post(url, headers=headers, json=payload)
+        response = http_client.post(url, headers=_discord_headers(), json=payload)
         response.raise_for_status()  # Will raise an HTTPError if a non-2xx status is returned
     except httpx.HTTPError as e:
         return f"Error sending message via Discord API: {str(e)}"
+    return _format_sent_message(response.json())
 
-    sent_message = response.json()
 
+async def _adiscord_send_message(channel_id: str, message: str) -> str:
+    if not DISCORD_TOKEN:
+        return "Error: DISCORD_BOT_TOKEN is not set in environment variables."
+
+    url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
+    try:
+        response = await async_http_client.post(url, headers=_discord_headers(), json={"content": message})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        return f"Error sending message via Discord API: {str(e)}"
+    return _format_sent_message(response.json())
+
+
+discord_send_message_tool.coroutine = _adiscord_send_message
+
+
+def _format_sent_message(sent_message: dict) -> str:
     # Optionally, you can format the response or extract specific fields.
     content_sent = sent_message.get("content", "")
     message_id = sent_message.get("id", "N/A")
@@ -266,20 +329,55 @@ def discord_list_channels_with_threads_tool(guild_id: str) -> str:
     if not DISCORD_TOKEN:
         return json.dumps({"error": "DISCORD_BOT_TOKEN is not set in environment variables."})
 
-    headers = {
-        "Authorization": f"Bot {DISCORD_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
     # --- Fetch all guild channels ---
-    channels_url = f"https://discord.com/api/v10/guilds/{guild_id}/channels"
     try:
-        channels_response = httpx.get(channels_url, headers=headers)
+        channels_response = http_client.get(_channels_url(guild_id), headers=_discord_headers())
         channels_response.raise_for_status()
     except httpx.HTTPError as e:
         return json.dumps({"error": f"Error fetching channels from Discord API: {str(e)}"})
 
-    channels_data = channels_response.json()
+    # --- Fetch active threads in the guild ---
+    try:
+        threads_response = http_client.get(_active_threads_url(guild_id), headers=_discord_headers())
+        threads_response.raise_for_status()
+    except httpx.HTTPError as e:
+        return json.dumps({"error": f"Error fetching active threads from Discord API: {str(e)}"})
+
+    return _format_channels_with_threads(channels_response.json(), threads_response.json())
+
+
+async def _adiscord_list_channels_with_threads(guild_id: str) -> str:
+    if not DISCORD_TOKEN:
+        return json.dumps({"error": "DISCORD_BOT_TOKEN is not set in environment variables."})
+
+    # Both requests are independent
+    channels_response, threads_response = await asyncio.gather(
+        async_http_client.get(_channels_url(guild_id), headers=_discord_headers()),
+        async_http_client.get(_active_threads_url(guild_id), headers=_discord_headers()),
+        return_exceptions=True)
+    for response, what in ((channels_response, "channels"), (threads_response, "active threads")):
+        try:
+            if isinstance(response, BaseException):
+                raise response
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return json.dumps({"error": f"Error fetching {what} from Discord API: {str(e)}"})
+
+    return _format_channels_with_threads(channels_response.json(), threads_response.json())
+
+
+discord_list_channels_with_threads_tool.coroutine = _adiscord_list_channels_with_threads
+
+
+def _channels_url(guild_id: str) -> str:
+    return f"https://discord.com/api/v10/guilds/{guild_id}/channels"
+
+
+def _active_threads_url(guild_id: str) -> str:
+    return f"https://discord.com/api/v10/guilds/{guild_id}/threads/active"
+
+
+def _format_channels_with_threads(channels_data, threads_data) -> str:
     if not isinstance(channels_data, list):
         return json.dumps({"error": f"Unexpected response from Discord channels: {channels_data}"})
 
@@ -295,15 +393,6 @@ def discord_list_channels_with_threads_tool(guild_id: str) -> str:
         channels_list.append(channel_obj)
         channels_dict[channel.get("id")] = channel_obj
 
-    # --- Fetch active threads in the guild ---
-    threads_url = f"https://discord.com/api/v10/guilds/{guild_id}/threads/active"
-    try:
-        threads_response = httpx.get(threads_url, headers=headers)
-        threads_response.raise_for_status()
-    except httpx.HTTPError as e:
-        return json.dumps({"error": f"Error fetching active threads from Discord API: {str(e)}"})
-
-    threads_data = threads_response.json()
     active_threads = threads_data.get("threads", [])
 
     # Place each active thread under its parent channel in our channels_dict
@@ -9,12 +9,17 @@ from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from tqdm import tqdm
 
+from scrumagent.llm_cache import llm_cache
+
 load_dotenv()
 
 GITEA_BASE_URL = os.environ.get("GITEA_BASE_URL")
 GITEA_API_TOKEN = os.environ.get("GITEA_API_TOKEN")
 DISCORD_TOKEN = os.environ.get("DISCORD_TOKEN")
 
+# The summaries are deterministic (temperature 0), unchanged commit lists are answered from the cache
+gitea_summary_cache = llm_cache.for_call_site("gitea_summary", ttl=7 * 24 * 60 * 60)
+
 
 def get_headers() -> Dict[str, str]:
     """
@@ -174,7 +179,7 @@ def summarize_repo_changes(repo_name: str, commits_by_branch: Dict[str, List[str
             "but make it clear and easy to understand."
         )
     )
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
+    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini", cache=gitea_summary_cache)
     chain = LLMChain(llm=llm, prompt=prompt)
     return chain.run(repo_name=repo_name, commit_messages_main_or_master=text_block_main_or_master,
                      commit_messages_other_branches=text_block_other_branches)
@@ -198,7 +203,7 @@ def summarize_overall_changes(summaries: Dict[str, str]) -> str:
             "Make the answer be maximum 1200 characters."
         )
     )
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
+    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini", cache=gitea_summary_cache)
     chain = LLMChain(llm=llm, prompt=prompt)
     return chain.run(repo_summaries=repo_summaries_text)
 
@@ -221,7 +226,7 @@ def summarize_overall_changes_non_technical(summaries: Dict[str, str]) -> str:
             "Make it very short and non-technical, suitable for sharing with non-technical stakeholders."
         )
     )
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
+    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini", cache=gitea_summary_cache)
     chain = LLMChain(llm=llm, prompt=prompt)
     return chain.run(repo_summaries=repo_summaries_text)
 
@@ -0,0 +1,37 @@
+import json
+import os
+
+from dotenv import load_dotenv
+from langchain_core.tools import tool
+
+from scrumagent.taiga_snapshot import TaigaSnapshot
+
+load_dotenv()
+
+# The bot syncs the snapshot every hour. A lookup only syncs if the last sync is older than this.
+TAIGA_SNAPSHOT_MAX_AGE = float(os.getenv("TAIGA_SNAPSHOT_MAX_AGE", 5 * 60))
+
+# The db is created on the first use
+taiga_snapshot = TaigaSnapshot()
+
+
+@tool(parse_docstring=True)
+def taiga_snapshot_user_story_tool(project_slug: str, entity_ref: int) -> str:
+    """
+    Read-only lookup of a Taiga user story with all its tasks (status, assigned user, watchers, due dates)
+    from the local, incrementally synced Taiga snapshot. Much faster than get_entity_by_ref_tool.
+    Use it for overviews and status questions. Before modifying an entity, still verify it with get_entity_by_ref_tool.
+
+    Args:
+        project_slug (str): Project identifier.
+        entity_ref (int): Visible reference number of the user story (not the database ID).
+
+    Returns:
+        str: JSON structure with the user story details and its tasks under "related", or an error message.
+    """
+    taiga_snapshot.sync_if_stale(project_slug, max_age=TAIGA_SNAPSHOT_MAX_AGE)
+    user_story = taiga_snapshot.get_user_story(project_slug, entity_ref)
+    if not user_story:
+        return json.dumps({"error": f"userstory {entity_ref} not found in the snapshot of {project_slug}. "
+                                    f"Use get_entity_by_ref_tool instead.", "code": 404}, indent=2)
+    return json.dumps(user_story, indent=2)
@@ -9,6 +9,8 @@ from langchain.prompts import PromptTemplate
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 
+from scrumagent.llm_cache import llm_cache
+
 # ---------------------------
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -33,7 +35,8 @@ Answer:
 )
 
 multi_lang_time_parser_chain = LLMChain(
-    llm=ChatOpenAI(model_name="gpt-4o-mini", temperature=0.0),
+    llm=ChatOpenAI(model_name="gpt-4o-mini", temperature=0.0,
+                   cache=llm_cache.for_call_site("timeframe_parser", ttl=24 * 60 * 60)),
     prompt=multi_lang_time_parser_prompt
 )
 
@@ -56,10 +59,26 @@ def interpret_timeframe_tool(raw_timeframe: str) -> str:
     Returns:
         str: A JSON string in the format {"before": <unixtimestamp>, "after": <unixtimestamp>}.
     """
-    current_time_iso = datetime.datetime.utcnow().isoformat()
-    response = multi_lang_time_parser_chain.run(
-        {"raw_timeframe": raw_timeframe, "current_time": current_time_iso}
-    )
+    response = multi_lang_time_parser_chain.run(_parser_input(raw_timeframe))
+    return _absolute_timeframe(raw_timeframe, response)
+
+
+async def _ainterpret_timeframe(raw_timeframe: str) -> str:
+    response = await multi_lang_time_parser_chain.arun(_parser_input(raw_timeframe))
+    return _absolute_timeframe(raw_timeframe, response)
+
+
+interpret_timeframe_tool.coroutine = _ainterpret_timeframe
+
+
+def _parser_input(raw_timeframe: str) -> dict:
+    # Minute resolution is enough for relative offsets and makes repeated timeframes cache hits
+    current_time_iso = datetime.datetime.utcnow().isoformat(timespec="minutes")
+    return {"raw_timeframe": raw_timeframe, "current_time": current_time_iso}
+
+
+def _absolute_timeframe(raw_timeframe: str, response: str) -> str:
+    """Turns the relative offsets of the parser response into absolute timestamps."""
     # Define simple heuristics for past and future
     raw_lower = raw_timeframe.lower()
     past_keywords = ["ago", "last", "past", "previous", "yesterday"]
@@ -1,6 +1,10 @@
+import asyncio
 import os
 import re
+import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Awaitable, Callable, Iterable
 
 import ollama
 import chromadb
@@ -28,7 +32,11 @@ def init_discord_chroma_db():
     CHROMA_DB_DISCORD_CHAT_DATA_NAME = os.getenv("CHROMA_DB_DISCORD_CHAT_DATA_NAME")
 
     # embeddings = SpacyEmbeddings(model_name="en_core_web_sm")
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    # Persistent cache: texts that were embedded before cost no request (utils is imported by the cache module).
+    # The misses go through the dispatcher (token packed, parallel requests), which also owns the retries.
+    from scrumagent.embedding_cache import cached_embeddings
+    from scrumagent.embedding_dispatcher import EmbeddingDispatcher
+    embeddings = cached_embeddings(EmbeddingDispatcher(OpenAIEmbeddings(model="text-embedding-3-large", max_retries=0)))
 
     persistent_chromadb = chromadb.PersistentClient(CHROMA_PATH)
     persistent_chromadb.get_or_create_collection(CHROMA_DB_DISCORD_CHAT_DATA_NAME)
@@ -41,6 +49,41 @@ def init_discord_chroma_db():
     return chroma_db_inst
 
 
+def get_local_state_path(file_name: str) -> str:
+    """
+    Returns the path of a local state file (sqlite dbs etc.) inside LOCAL_STATE_PATH.
+    Relative paths are resolved like CHROMA_DB_PATH. The directory is created if needed.
+    """
+    state_dir = mod_path / os.getenv("LOCAL_STATE_PATH", "resources/state")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return str(state_dir / file_name)
+
+
+@contextmanager
+def sqlite_connect(db_path: str):
+    """Opens a sqlite connection, commits on success (rollback on error) and always closes it."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+async def gather_bounded(func: Callable[..., Awaitable], items: Iterable, limit: int) -> list:
+    """
+    Runs func(item) for all items concurrently, but at most limit at a time.
+    The results keep the order of the items. A failing item doesn't stop the others, its result is the exception.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_bounded(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*[run_bounded(item) for item in items], return_exceptions=True)
+
+
 def split_text_smart(text, max_length=2000):
     """
     Splits a given text into sections of up to max_length characters,
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import unittest
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, HumanMessage
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-dummy")
+os.environ.setdefault("MAX_MSG_COUNT", "30")
+
+from scrumagent.agents import fast_router as fast_router_module
+from scrumagent.agents.fast_router import FastRouter, fast_router_node, afast_router_node
+
+
+class KeywordEmbeddings(Embeddings):
+    """One dimension per keyword, enough to test the similarity logic offline."""
+    keywords = ["deploy", "paper", "status", "meeting"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(k in t.lower()) for k in self.keywords] + [0.1] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+EXAMPLES = {"discord": ["when was the deploy discussed", "meeting notes"],
+            "web_browser": ["find a paper"],
+            "taiga": ["what is the status"]}
+
+
+class FastRouterTest(unittest.TestCase):
+    def test_rules(self):
+        router = FastRouter(embeddings=KeywordEmbeddings(), examples={})
+        self.assertEqual(router.route("Which user stories are in the sprint?").node, "taiga")
+        self.assertEqual(router.route("Search discord for the release date").node, "discord")
+        self.assertEqual(router.route("look it up on wikipedia").node, "web_browser")
+        # Needs two workers -> supervisor
+        self.assertIsNone(router.route("Search discord and update the user story"))
+        # Task updates only fire in a user story thread
+        self.assertIsNone(router.route("Set the task to done"))
+        self.assertEqual(router.route("Set the task to done", in_user_story_thread=True).reason, "user_story_rule")
+
+        metrics = router.get_metrics()
+        self.assertEqual(metrics["turns"], 6)
+        self.assertEqual(metrics["fallbacks"], 2)
+        self.assertAlmostEqual(metrics["hit_rate"], 0.667)
+
+    def test_embedding_classifier(self):
+        embeddings = KeywordEmbeddings()
+        router = FastRouter(embeddings=embeddings, examples=EXAMPLES, min_similarity=0.9, min_margin=0.1)
+        decision = router.route("the deploy yesterday?")
+        self.assertEqual((decision.node, decision.reason), ("discord", "embedding"))
+        # Nothing similar enough
+        self.assertIsNone(router.route("tell me a joke"))
+
+        calls = embeddings.calls
+        router.route("the deploy yesterday?")
+        self.assertEqual(embeddings.calls, calls, "examples and repeated queries must be cached")
+
+    def test_node(self):
+        original = fast_router_module.fast_router
+        fast_router_module.fast_router = FastRouter(embeddings=KeywordEmbeddings(), examples={})
+        try:
+            msg = ("DiscordMsg: please set the task to done (From user: nemo, channel_name: #12 Login, "
+                   "channel_id: 1, timestamp_sent: 0) (Corresponding taiga user story id: 12)")
+            self.assertEqual(fast_router_node({"messages": [HumanMessage(content=msg)]}).goto, "taiga")
+
+            # Channel name and metadata are not classified
+            msg = "DiscordMsg: hi there (From user: nemo, channel_name: taiga-sprint, channel_id: 1)"
+            self.assertEqual(fast_router_node({"messages": [HumanMessage(content=msg)]}).goto, "supervisor")
+
+            # Scheduled prompts and later hops always go to the supervisor
+            self.assertEqual(fast_router_node({"messages": [HumanMessage(content="Check the user story")]}).goto,
+                             "supervisor")
+            self.assertEqual(fast_router_node({"messages": [AIMessage(content="user story")]}).goto, "supervisor")
+        finally:
+            fast_router_module.fast_router = original
+
+    def test_async_route(self):
+        embeddings = KeywordEmbeddings()
+        router = FastRouter(embeddings=embeddings, examples=EXAMPLES, min_similarity=0.9, min_margin=0.1)
+        decision = asyncio.run(router.aroute("the deploy yesterday?"))
+        self.assertEqual((decision.node, decision.reason), ("discord", "embedding"))
+
+        # The sync path shares the example vectors and the query cache
+        calls = embeddings.calls
+        self.assertEqual(router.route("the deploy yesterday?"), decision)
+        self.assertEqual(embeddings.calls, calls)
+
+        original = fast_router_module.fast_router
+        fast_router_module.fast_router = router
+        try:
+            msg = "DiscordMsg: the deploy yesterday? (From user: nemo, channel_name: general, channel_id: 1)"
+            command = asyncio.run(afast_router_node({"messages": [HumanMessage(content=msg)]}))
+            self.assertEqual(command.goto, "discord")
+        finally:
+            fast_router_module.fast_router = original
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from scrumagent.agents.prompt_layout import cache_friendly_prompt, dynamic_context_message
+
+
+class PromptLayoutTest(unittest.TestCase):
+    def test_static_prefix_dynamic_suffix(self):
+        prompt = cache_friendly_prompt("You are a helpful worker.")
+        state = {"messages": [HumanMessage(content="hi")]}
+        first, second = prompt(state), prompt(state)
+
+        # The prefix is byte identical between requests, the context comes last
+        self.assertEqual(first[0].content, "You are a helpful worker.")
+        self.assertEqual(first[:2], second[:2])
+        self.assertIsInstance(first[-1], SystemMessage)
+        self.assertIn("Unix timestamp", first[-1].content)
+
+    def test_context_message(self):
+        self.assertIn("Conversation: #12 Login.", dynamic_context_message(conversation="#12 Login").content)
+        self.assertNotIn("Conversation", dynamic_context_message().content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from scrumagent.agents.rolling_summary import split_evicted, update_rolling_summary, with_summary
+
+
+class RecordingChatModel(FakeMessagesListChatModel):
+    received: list = []
+
+    def _generate(self, messages, *args, **kwargs):
+        self.received.append(messages)
+        return super()._generate(messages, *args, **kwargs)
+
+
+class RollingSummaryTest(unittest.TestCase):
+    def test_split_evicted(self):
+        history = [HumanMessage(content="q1"), AIMessage(content="a1"), HumanMessage(content="q2"),
+                   AIMessage(content="a2"), AIMessage(content="a2b"), HumanMessage(content="q3")]
+        evicted, kept = split_evicted(history, keep_recent=3)
+        # The kept window is moved forward to start at a human message
+        self.assertEqual([m.content for m in evicted], ["q1", "a1", "q2", "a2", "a2b"])
+        self.assertEqual([m.content for m in kept], ["q3"])
+
+        evicted, kept = split_evicted(history, keep_recent=10)
+        self.assertEqual((evicted, kept), ([], history))
+
+    def test_update_only_sends_evicted(self):
+        llm = RecordingChatModel(responses=[AIMessage(content="summary v2")], received=[])
+        summary = update_rolling_summary(llm, "summary v1", [HumanMessage(content="evicted question")])
+        self.assertEqual(summary, "summary v2")
+
+        prompt = llm.received[0][-1].content
+        self.assertIn("summary v1", prompt)
+        self.assertIn("human: evicted question", prompt)
+
+        # Nothing evicted, no LLM call
+        self.assertEqual(update_rolling_summary(llm, "summary v2", []), "summary v2")
+        self.assertEqual(len(llm.received), 1)
+
+    def test_with_summary(self):
+        state = {"messages": [HumanMessage(content="q")], "summary": "older stuff"}
+        messages = with_summary(state)["messages"]
+        self.assertIsInstance(messages[0], SystemMessage)
+        self.assertIn("older stuff", messages[0].content)
+        self.assertEqual(with_summary({"messages": state["messages"]})["messages"], state["messages"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 load_dotenv()
 os.environ.pop("MONGO_DB_URL", None)
 #del os.environ['MONGO_DB_URL'] # force MemorySaver
+os.environ["LOCAL_CHECKPOINT_PERSIST"] = "false"
 
 
 class SupervisorAgent(unittest.TestCase):
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-dummy")
+os.environ.setdefault("MAX_MSG_COUNT", "30")
+
+from scrumagent.agents import supervisor_agent
+from scrumagent.agents.supervisor_agent import resolve_next_nodes, asupervisor_node
+
+
+class AsyncOnlyLLM:
+    """Answers only async calls, so a sync call in the async node fails the test."""
+
+    def __init__(self, next_nodes):
+        self.next_nodes = next_nodes
+        self.prompts = []
+
+    def with_structured_output(self, schema):
+        async def route(messages):
+            self.prompts.append(messages)
+            return {"next": self.next_nodes, "messages": "sub-requests"}
+        return RunnableLambda(route)
+
+    async def ainvoke(self, messages):
+        return AIMessage(content="summary of q1")
+
+
+class SupervisorRoutingTest(unittest.TestCase):
+    def test_resolve_next_nodes(self):
+        self.assertEqual(resolve_next_nodes(["taiga"]), "taiga")
+        self.assertEqual(resolve_next_nodes("taiga"), "taiga")
+        self.assertEqual(resolve_next_nodes(["taiga", "discord", "taiga"]), ["taiga", "discord"])
+        self.assertEqual(resolve_next_nodes(["FINISH"]), END)
+        self.assertEqual(resolve_next_nodes([]), END)
+        self.assertEqual(resolve_next_nodes(["taiga", "FINISH"]), "taiga")
+        self.assertEqual(resolve_next_nodes(["discord", "human_input"]), "human_input")
+
+    def test_async_supervisor_node(self):
+        config = {"configurable": {"thread_id": "general"}}
+        llm = AsyncOnlyLLM(["taiga", "discord"])
+        with mock.patch.object(supervisor_agent, "llm", llm):
+            command = asyncio.run(asupervisor_node({"messages": [HumanMessage(content="q")]}, config))
+        self.assertEqual(command.goto, ["taiga", "discord"])
+        self.assertEqual(command.update["messages"][-1].content, "sub-requests")
+        self.assertIn("Conversation: general", llm.prompts[0][-1].content)
+
+    def test_async_supervisor_node_summary(self):
+        history = [HumanMessage(content="q1", id="1"), AIMessage(content="a1", id="2"),
+                   HumanMessage(content="q2", id="3"), AIMessage(content="a2", id="4")]
+        llm = AsyncOnlyLLM(["FINISH"])
+        with mock.patch.multiple(supervisor_agent, llm=llm, MAX_MSG_MODE="summary", MAX_MSG_COUNT=3,
+                                 SUMMARY_KEEP_RECENT=2):
+            command = asyncio.run(asupervisor_node({"messages": history, "summary": ""},
+                                                   {"configurable": {"thread_id": "t"}}))
+        self.assertEqual(command.goto, END)
+        self.assertEqual(command.update["summary"], "summary of q1")
+        removed = [m.id for m in command.update["messages"] if isinstance(m, RemoveMessage)]
+        self.assertEqual(removed, ["1", "2"])
+        self.assertIn("summary of q1", llm.prompts[0][1].content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage, trim_messages
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-dummy")
+os.environ.setdefault("MAX_MSG_COUNT", "30")
+
+from scrumagent.agents.token_budget import MessageTokenCounter, TOKENS_PER_MESSAGE
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return text.split()
+
+
+class MessageTokenCounterTest(unittest.TestCase):
+    def test_cached_by_id(self):
+        encoder = CountingEncoder()
+        counter = MessageTokenCounter(encode=encoder)
+        message = HumanMessage(content="one two three", id="1")
+        self.assertEqual(counter.count_message(message), TOKENS_PER_MESSAGE + 3)
+        self.assertEqual(counter([message, message]), 2 * (TOKENS_PER_MESSAGE + 3))
+        self.assertEqual(encoder.calls, 1)
+
+        # Messages without id (e.g. the system prompt) are not cached
+        counter.count_message(HumanMessage(content="x"))
+        counter.count_message(HumanMessage(content="x"))
+        self.assertEqual(encoder.calls, 3)
+
+    def test_fallback_estimate(self):
+        counter = MessageTokenCounter(encode=False)
+        self.assertEqual(counter.count_text("x" * 40), 10)
+
+    def test_trim_to_budget(self):
+        counter = MessageTokenCounter(encode=CountingEncoder())
+        history = [HumanMessage(content="question " * 50, id="1"), AIMessage(content="huge " * 500, id="2"),
+                   HumanMessage(content="short question", id="3"), AIMessage(content="short answer", id="4")]
+        trimmed = trim_messages(history, strategy="last", max_tokens=100, token_counter=counter, start_on="human")
+        self.assertEqual([m.id for m in trimmed], ["3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
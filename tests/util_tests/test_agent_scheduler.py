@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+from scrumagent.agent_scheduler import AgentScheduler, JobPriority
+
+
+class AgentSchedulerTest(unittest.TestCase):
+    def test_fifo_per_thread(self):
+        order = []
+
+        async def job(i):
+            await asyncio.sleep(0.01)
+            order.append(i)
+            return i
+
+        async def run():
+            scheduler = AgentScheduler(max_async_jobs=4)
+            return await asyncio.gather(*[scheduler.run_async(lambda i=i: job(i), thread_id="thread_a")
+                                          for i in range(5)])
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [0, 1, 2, 3, 4])
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_interactive_before_scheduled(self):
+        order = []
+
+        async def job(name, blocker=None):
+            if blocker is not None:
+                await blocker.wait()
+            order.append(name)
+
+        async def run():
+            blocker = asyncio.Event()
+            scheduler = AgentScheduler(max_async_jobs=1)
+            first = asyncio.create_task(scheduler.run_async(lambda: job("blocker", blocker), thread_id="a"))
+            await asyncio.sleep(0.01)
+            scheduled = asyncio.create_task(scheduler.run_async(lambda: job("scheduled"), thread_id="b"))
+            interactive = asyncio.create_task(scheduler.run_async(lambda: job("interactive"), thread_id="c",
+                                                                  priority=JobPriority.INTERACTIVE))
+            await asyncio.sleep(0.01)
+            self.assertEqual(scheduler.queue_depth(), 2)
+            blocker.set()
+            await asyncio.gather(first, scheduled, interactive)
+            return scheduler.get_metrics()
+
+        metrics = asyncio.run(run())
+        self.assertEqual(order, ["blocker", "interactive", "scheduled"])
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["scheduled"]["completed"], 2)
+        self.assertEqual(metrics["interactive"]["completed"], 1)
+
+    def test_concurrency_limit(self):
+        order = []
+        running = 0
+        max_running = 0
+
+        async def job(name):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            order.append(name)
+            running -= 1
+            return name
+
+        async def run():
+            scheduler = AgentScheduler(max_async_jobs=3)
+            jobs = [scheduler.run_async(lambda i=i: job(f"a{i}"), thread_id="a") for i in range(3)]
+            jobs += [scheduler.run_async(lambda i=i: job(f"t{i}"), thread_id=f"t{i}") for i in range(4)]
+            results = await asyncio.gather(*jobs)
+            return results, scheduler.get_metrics()
+
+        results, metrics = asyncio.run(run())
+        self.assertEqual(results, ["a0", "a1", "a2", "t0", "t1", "t2", "t3"])
+        self.assertEqual([name for name in order if name.startswith("a")], ["a0", "a1", "a2"])
+        self.assertEqual(max_running, 3)
+        self.assertEqual(metrics["busy_async_slots"], 0)
+        self.assertEqual(metrics["scheduled"]["completed"], 7)
+
+    def test_exception_is_propagated(self):
+        async def failing():
+            raise ValueError("boom")
+
+        def failing_before_coroutine():
+            raise ValueError("boom")
+
+        async def run():
+            scheduler = AgentScheduler(max_async_jobs=1)
+            with self.assertRaises(ValueError):
+                await scheduler.run_async(failing, thread_id="a")
+            with self.assertRaises(ValueError):
+                await scheduler.run_async(failing_before_coroutine, thread_id="a")
+            # The thread queue must be released after a failure
+            result = await scheduler.run_async(lambda: asyncio.sleep(0, result=42), thread_id="a")
+            return result, scheduler.get_metrics()
+
+        result, metrics = asyncio.run(run())
+        self.assertEqual(result, 42)
+        self.assertEqual(metrics["scheduled"]["failed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
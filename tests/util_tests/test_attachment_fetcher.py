@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+import httpx
+
+from scrumagent.attachment_fetcher import AttachmentFetcher
+
+
+def make_attachment(filename, url, size, content_type):
+    return SimpleNamespace(filename=filename, url=url, size=size, content_type=content_type)
+
+
+class AttachmentFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.requested_urls = []
+
+        def handler(request: httpx.Request):
+            self.requested_urls.append(str(request.url))
+            if request.url.path.endswith("missing.png"):
+                return httpx.Response(404)
+            if request.url.path.endswith(".zip"):
+                return httpx.Response(200, headers={"content-type": "application/zip"}, content=b"zip")
+            return httpx.Response(200, headers={"content-type": "image/png"}, content=b"png-bytes")
+
+        self.fetcher = AttachmentFetcher(max_bytes=1000)
+        self.fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def test_fetch_all_and_cache(self):
+        attachments = [make_attachment("a.png", "https://cdn/1/a.png", 9, "image/png"),
+                       make_attachment("missing.png", "https://cdn/2/missing.png", 9, "image/png"),
+                       make_attachment("b.zip", "https://cdn/3/b.zip", 3, "application/zip"),
+                       make_attachment("huge.png", "https://cdn/4/huge.png", 5000, "image/png")]
+
+        results = asyncio.run(self.fetcher.fetch_all(attachments))
+
+        self.assertEqual([r.ok for r in results], [True, False, True, False])
+        self.assertEqual(results[0].content, b"png-bytes")
+        self.assertEqual(results[1].status_code, 404)
+        self.assertIsNone(results[2].content)  # Not a downloadable type
+        self.assertNotIn("https://cdn/4/huge.png", self.requested_urls)
+
+        # The same url is served from the cache
+        again = asyncio.run(self.fetcher.fetch(attachments[0]))
+        self.assertTrue(again.from_cache)
+        self.assertEqual(self.requested_urls.count("https://cdn/1/a.png"), 1)
+
+        # A file with the same name, size and type under a new url is downloaded, the body is stored once
+        reposted = asyncio.run(self.fetcher.fetch(make_attachment("a.png", "https://cdn/5/a.png", 9, "image/png")))
+        self.assertFalse(reposted.from_cache)
+        self.assertEqual(reposted.sha256, results[0].sha256)
+        self.assertIn("https://cdn/5/a.png", self.requested_urls)
+        self.assertEqual(len(self.fetcher._cache), 1)
+
+    def test_same_fingerprint_other_content(self):
+        def handler(request: httpx.Request):
+            return httpx.Response(200, headers={"content-type": "text/plain"}, content=request.url.path[-3:].encode())
+
+        self.fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        first = asyncio.run(self.fetcher.fetch(make_attachment("notes.txt", "https://cdn/1/aaa", 3, "text/plain")))
+        second = asyncio.run(self.fetcher.fetch(make_attachment("notes.txt", "https://cdn/2/bbb", 3, "text/plain")))
+
+        self.assertEqual((first.content, second.content), (b"aaa", b"bbb"))
+        self.assertFalse(second.from_cache)
+
+    def test_eviction_drops_all_urls_of_a_body(self):
+        def handler(request: httpx.Request):
+            return httpx.Response(200, headers={"content-type": "text/plain"}, content=request.url.path[-3:].encode())
+
+        self.fetcher = AttachmentFetcher(max_bytes=1000, cache_max_bytes=6)
+        self.fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        for url in ("https://cdn/1/aaa", "https://cdn/2/aaa", "https://cdn/3/bbb"):
+            asyncio.run(self.fetcher.fetch(make_attachment("notes.txt", url, 3, "text/plain")))
+        self.assertEqual(self.fetcher._hash_to_urls[self.fetcher._url_to_hash["https://cdn/1/aaa"]],
+                         {"https://cdn/1/aaa", "https://cdn/2/aaa"})
+
+        # A third body evicts the oldest one together with both of its urls
+        asyncio.run(self.fetcher.fetch(make_attachment("notes.txt", "https://cdn/4/ccc", 3, "text/plain")))
+        self.assertEqual(set(self.fetcher._url_to_hash), {"https://cdn/3/bbb", "https://cdn/4/ccc"})
+        self.assertEqual(len(self.fetcher._hash_to_urls), 2)
+        again = asyncio.run(self.fetcher.fetch(make_attachment("notes.txt", "https://cdn/3/bbb", 3, "text/plain")))
+        self.assertTrue(again.from_cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
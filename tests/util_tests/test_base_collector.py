@@ -0,0 +1,47 @@
+import unittest
+import uuid
+
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from scrumagent.data_collector.base_collector import BaseCollector
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+class BaseCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = CountingEmbedding(size=8, embedded=[])
+        db = Chroma(client=chromadb.EphemeralClient(), collection_name=f"test_{uuid.uuid4().hex}",
+                    embedding_function=self.embeddings)
+        self.collector = BaseCollector(bot=None, db=db)
+
+    def test_unchanged_docs_are_not_embedded(self):
+        self.collector.add_to_db_batch(ids=["a", "b"], texts=["hello", "world"], metadatas=[{"n": 1}, {"n": 2}])
+        self.assertEqual(self.embeddings.embedded, ["hello", "world"])
+
+        # A re-run with the same texts costs nothing, changed and new texts are embedded
+        self.collector.add_to_db_batch(ids=["a", "b"], texts=["hello", "world"], metadatas=[{"n": 1}, {"n": 2}])
+        self.collector.add_to_db_batch(ids=["a", "b", "c", "c"], texts=["hello", "world!", "x", "new"],
+                                       metadatas=[{}, {}, {}, {}])
+        self.assertEqual(self.embeddings.embedded, ["hello", "world", "world!", "new"])
+
+        stored = self.collector.db.get(ids=["b", "c"])
+        self.assertEqual(sorted(stored["documents"]), ["new", "world!"])
+
+    def test_docs_without_content_hash(self):
+        # Stored before the content hash existed: compared by the stored text
+        self.collector.db.add_texts(texts=["legacy"], metadatas=[{"n": 1}], ids=["old"])
+        self.collector.add_to_db_batch(ids=["old"], texts=["legacy"], metadatas=[{"n": 1}])
+        self.assertEqual(self.embeddings.embedded, ["legacy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import time
+import unittest
+import uuid
+
+from langgraph.checkpoint.base.id import uuid6
+
+from scrumagent.checkpoint_retention import checkpoint_time, select_checkpoints_to_delete
+
+HOUR = 3600
+
+
+def checkpoint_id_at(unix_time: float, seq: int = 0) -> str:
+    """A langgraph checkpoint id (UUIDv6) for the given time."""
+    timestamp = int(unix_time * 1e7) + 0x01B21DD213814000
+    # time_high/time_mid (48 bits), version 6, time_low (12 bits), variant, clock sequence
+    value = (timestamp >> 12) << 80 | 6 << 76 | (timestamp & 0xFFF) << 64 | 0b10 << 62 | seq
+    return str(uuid.UUID(int=value))
+
+
+class CheckpointRetentionTest(unittest.TestCase):
+    def test_checkpoint_time(self):
+        now = time.time()
+        self.assertAlmostEqual(checkpoint_time(str(uuid6(clock_seq=1))), now, delta=5)
+        self.assertAlmostEqual(checkpoint_time(checkpoint_id_at(now - 10 * HOUR)), now - 10 * HOUR, delta=1)
+        self.assertIsNone(checkpoint_time("not-a-uuid"))
+
+    def test_select_checkpoints_to_delete(self):
+        start = 1_700_000_000 // (24 * HOUR) * 24 * HOUR
+        # 10 checkpoints per day for 5 days
+        ids = [checkpoint_id_at(start + day * 24 * HOUR + i * HOUR, seq=i) for day in range(5) for i in range(10)]
+
+        to_delete = select_checkpoints_to_delete(ids, keep_latest=12, snapshot_interval_s=24 * HOUR, max_snapshots=2)
+        kept = sorted(set(ids) - set(to_delete), reverse=True)
+        newest_first = sorted(ids, reverse=True)
+
+        self.assertEqual(kept[:12], newest_first[:12])
+        # Snapshots: the newest checkpoint of the next two days (day 3 has 8 checkpoints left, then day 2)
+        self.assertEqual(kept[12:], [newest_first[12], newest_first[20]])
+        self.assertEqual(len(to_delete), 50 - 14)
+
+        self.assertEqual(select_checkpoints_to_delete(ids[:5], keep_latest=12), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import StateGraph, START, MessagesState
+
+from scrumagent.checkpoint_serializer import (DEDUP_TYPE_PREFIX, AsyncMongoMessageStore, DedupAsyncMongoDBSaver,
+                                              DedupCompressSerializer, SQLiteMessageStore)
+from scrumagent.local_checkpointer import LRUSpillSaver
+from scrumagent.utils import sqlite_connect
+
+
+def conversation(length: int) -> list:
+    return [HumanMessage(content=f"question {i} " * 50, id=f"h{i}") if i % 2 == 0
+            else AIMessage(content=f"answer {i} " * 50, id=f"a{i}") for i in range(length)]
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict) and "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif isinstance(condition, dict) and "$lt" in condition:
+            if value is None or not value < condition["$lt"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs: list):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            await asyncio.sleep(0)
+            yield doc
+
+
+class FakeMotorCollection:
+    """The motor collection calls of the AsyncMongoDBSaver and the AsyncMongoMessageStore, in memory."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query: dict, sort: list = None, limit: int = 0) -> FakeCursor:
+        docs = [doc for doc in self.docs if matches(doc, query)]
+        for key, direction in sort or []:
+            docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return FakeCursor(docs[:limit] if limit else docs)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        self._update(query, update, upsert)
+
+    async def update_many(self, query: dict, update: dict):
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(update.get("$set", {}))
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        for operation in operations:
+            self._update(operation._filter, operation._doc, operation._upsert)
+
+    async def create_index(self, key: str):
+        pass
+
+    def _update(self, query: dict, update: dict, upsert: bool):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is None and upsert:
+            doc = dict(query)
+            doc.update(update.get("$setOnInsert", {}))
+            self.docs.append(doc)
+        if doc is not None:
+            doc.update(update.get("$set", {}))
+
+
+class FakeMotorClient(defaultdict):
+    def __init__(self):
+        super().__init__(lambda: defaultdict(FakeMotorCollection))
+
+
+class DedupCompressSerializerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "checkpoints.sqlite")
+        self.store = SQLiteMessageStore(self.db_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def stored_messages(self) -> int:
+        with sqlite_connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM checkpoint_messages").fetchone()[0]
+
+    def test_roundtrip_and_dedup(self):
+        serde = DedupCompressSerializer(self.store)
+        value = {"messages": conversation(10), "summary": "rolling summary"}
+        type_, data = serde.dumps_typed(value)
+        self.assertTrue(type_.startswith(DEDUP_TYPE_PREFIX))
+        self.assertEqual(serde.loads_typed((type_, data)), value)
+        self.assertEqual(self.stored_messages(), 10)
+
+        # The next checkpoint repeats the history, only the new messages are stored
+        serde.dumps_typed({"messages": conversation(12)})
+        self.assertEqual(self.stored_messages(), 12)
+
+        # A new process (empty cache) reads the messages from the store
+        self.assertEqual(DedupCompressSerializer(self.store).loads_typed((type_, data)), value)
+
+    def test_smaller_than_plain(self):
+        value = {"messages": conversation(20)}
+        _, plain = JsonPlusSerializer().dumps_typed(value)
+        _, dedup = DedupCompressSerializer(self.store).dumps_typed(value)
+        self.assertLess(len(dedup) * 10, len(plain))
+
+    def test_plain_checkpoints_still_load(self):
+        value = {"messages": conversation(3)}
+        plain = JsonPlusSerializer().dumps_typed(value)
+        self.assertEqual(DedupCompressSerializer(self.store).loads_typed(plain), value)
+
+
+    def test_missing_message_is_dropped(self):
+        serde = DedupCompressSerializer(self.store)
+        data = serde.dumps_typed({"messages": conversation(3)})
+        self.assertEqual(self.store.purge(-60), 3)
+        loaded = DedupCompressSerializer(self.store).loads_typed(data)
+        self.assertEqual(loaded, {"messages": []})
+
+    def test_graph_with_local_checkpointer(self):
+        serde = DedupCompressSerializer(self.store)
+        builder = StateGraph(MessagesState)
+        builder.add_node("echo", lambda state: {"messages": [AIMessage(f"echo {state['messages'][-1].content}")]})
+        builder.add_edge(START, "echo")
+        graph = builder.compile(checkpointer=LRUSpillSaver(db_path=self.db_path, serde=serde))
+
+        config = {"configurable": {"thread_id": "t"}}
+        graph.invoke({"messages": [HumanMessage(content="a")]}, config)
+        graph.invoke({"messages": [HumanMessage(content="b")]}, config)
+
+        # Restart: new checkpointer and serializer on the same db
+        restarted = builder.compile(checkpointer=LRUSpillSaver(
+            db_path=self.db_path, serde=DedupCompressSerializer(SQLiteMessageStore(self.db_path))))
+        contents = [m.content for m in restarted.get_state(config).values["messages"]]
+        self.assertEqual(contents, ["a", "echo a", "b", "echo b"])
+
+
+class DedupAsyncMongoDBSaverTest(unittest.TestCase):
+    def test_graph_with_async_saver(self):
+        client = FakeMotorClient()
+        messages = client["checkpointing_db"]["checkpoint_messages"]
+        checkpoints = client["checkpointing_db"]["checkpoints"]
+        builder = StateGraph(MessagesState)
+        builder.add_node("echo", lambda state: {"messages": [AIMessage(f"echo {state['messages'][-1].content}")]})
+        builder.add_edge(START, "echo")
+        config = {"configurable": {"thread_id": "t"}}
+
+        def saver():
+            return DedupAsyncMongoDBSaver(client, AsyncMongoMessageStore(messages),
+                                          checkpoint_collection_name="checkpoints",
+                                          writes_collection_name="checkpoint_writes")
+
+        # Hex digests, so an inline message doesn't compress to nothing
+        a, b = ("".join(hashlib.sha256(f"{prefix}{i}".encode()).hexdigest() for i in range(20)) for prefix in "ab")
+
+        async def run():
+            graph = builder.compile(checkpointer=saver())
+            await graph.ainvoke({"messages": [HumanMessage(content=a)]}, config)
+            await graph.ainvoke({"messages": [HumanMessage(content=b)]}, config)
+
+            # Restart: new saver and serializer (empty cache), the references are resolved from the store
+            restarted = builder.compile(checkpointer=saver())
+            state = await restarted.aget_state(config)
+            history = [snapshot async for snapshot in restarted.aget_state_history(config)]
+            return state, history
+
+        state, history = asyncio.run(run())
+        self.assertEqual([m.content for m in state.values["messages"]], [a, f"echo {a}", b, f"echo {b}"])
+        self.assertEqual([len(snapshot.values.get("messages", [])) for snapshot in history], [4, 3, 2, 2, 1, 0])
+
+        # Every message is stored once, the checkpoints only hold references. The two inputs are stored a second
+        # time by the write of the __start__ task, before add_messages gives them an id.
+        self.assertEqual(len(messages.docs), 6)
+        self.assertTrue(all(doc["type"].startswith(DEDUP_TYPE_PREFIX) for doc in checkpoints.docs))
+        self.assertTrue(all(len(doc["checkpoint"]) < 500 for doc in checkpoints.docs))
+
+    def test_async_serializer_does_no_store_io(self):
+        class NoSyncCalls:
+            def __getattr__(self, name):
+                raise AssertionError(f"blocking message store call {name}")
+
+        serde = DedupCompressSerializer(NoSyncCalls(), async_store=True)
+        value = {"messages": conversation(4)}
+        # Not stored yet: the messages stay inline
+        self.assertEqual(serde.loads_typed(serde.dumps_typed(value)), value)
+
+        serde.message_store = AsyncMongoMessageStore(FakeMotorCollection())
+        asyncio.run(serde.astore_messages(value))
+        data = serde.dumps_typed(value)
+        cold = DedupCompressSerializer(serde.message_store, async_store=True)
+        partly_loaded = cold.loads_typed(data)
+        self.assertNotEqual(partly_loaded, value)
+        self.assertEqual(asyncio.run(cold.aresolve_messages([partly_loaded])), [value])
+
+
+if __name__ == "__main__":
+    unittest.main()
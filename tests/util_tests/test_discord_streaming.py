@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from langchain_core.messages import AIMessageChunk
+
+from scrumagent.discord_streaming import (DiscordStreamingReply, StreamTextAssembler, extract_partial_json_string,
+                                          get_top_level_node)
+
+
+class DiscordStreamingTest(unittest.TestCase):
+    def test_extract_partial_json_string(self):
+        self.assertEqual(extract_partial_json_string('{"next": "FINISH", "messages": "Hello Wor', "messages"),
+                         "Hello Wor")
+        self.assertEqual(extract_partial_json_string('{"messages": "Line\\nTwo", "next": "taiga"}', "messages"),
+                         "Line\nTwo")
+        self.assertEqual(extract_partial_json_string('{"messages": "Quote \\', "messages"), "Quote ")
+        self.assertIsNone(extract_partial_json_string('{"next": "FIN', "messages"))
+
+    def test_get_top_level_node(self):
+        self.assertEqual(get_top_level_node({"langgraph_checkpoint_ns": "taiga:123|agent:456",
+                                             "langgraph_node": "agent"}), "taiga")
+        self.assertEqual(get_top_level_node({"langgraph_node": "supervisor"}), "supervisor")
+
+    def test_assembler(self):
+        assembler = StreamTextAssembler()
+        assembler.add_chunk("taiga", AIMessageChunk(content="Story #5 ", id="1"))
+        assembler.add_chunk("taiga", AIMessageChunk(content="is done", id="1"))
+        self.assertEqual(assembler.text, "_taiga is working..._\nStory #5 is done")
+
+        # Parallel workers keep their own output
+        assembler.add_chunk("discord", AIMessageChunk(content="3 messages", id="3"))
+        assembler.add_chunk("taiga", AIMessageChunk(content=".", id="1"))
+        self.assertEqual(assembler.text, "_taiga is working..._\nStory #5 is done.\n_discord is working..._\n3 messages")
+
+        for args in ['{"next": "FIN', 'ISH", "mess', 'ages": "All', ' good"}']:
+            assembler.add_chunk("supervisor", AIMessageChunk(
+                content="", id="2", tool_call_chunks=[{"name": None, "args": args, "id": None, "index": 0}]))
+        self.assertEqual(assembler.text, "All good")
+
+
+class FakeSentMessage:
+    def __init__(self, content):
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+
+
+class FakeChannel:
+    def __init__(self, send_delay: float):
+        self.send_delay = send_delay
+        self.sent = []
+
+    async def send(self, content, suppress_embeds=False):
+        await asyncio.sleep(self.send_delay)
+        sent = FakeSentMessage(content)
+        self.sent.append(sent)
+        return sent
+
+
+class FakeMessage:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def reply(self, content, suppress_embeds=False):
+        return FakeSentMessage(content)
+
+
+class DiscordStreamingReplyTest(unittest.IsolatedAsyncioTestCase):
+    async def test_finish_waits_for_the_flush_loop(self):
+        channel = FakeChannel(send_delay=0.05)
+        reply = DiscordStreamingReply(FakeMessage(channel), min_edit_interval=0)
+        await reply.start()
+        flush_task = reply._flush_task
+
+        # The flush loop is sending the second segment when the final text arrives
+        reply.update("a" * 1500 + "\n\n" + "b" * 1500)
+        await asyncio.sleep(0.01)
+        await reply.finish("Done")
+
+        self.assertTrue(flush_task.cancelled())
+        self.assertEqual(channel.sent, [])
+        self.assertEqual(reply._sent_texts, ["Done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
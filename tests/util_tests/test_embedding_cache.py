@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from scrumagent.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    model = "counting"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append([text])
+        return [float(len(text)), 0.25]
+
+
+class CachedEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "embedding_cache.sqlite")
+        self.model = CountingEmbeddings()
+        self.cache = CachedEmbeddings(self.model, db_path=self.db_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_misses_are_embedded(self):
+        self.assertEqual(self.cache.embed_documents(["ok", "thanks", "ok"]), [[2.0, 0.5], [6.0, 0.5], [2.0, 0.5]])
+        self.assertEqual(self.cache.embed_documents(["thanks", "new message"]), [[6.0, 0.5], [11.0, 0.5]])
+        self.assertEqual(self.model.embedded, [["ok", "thanks"], ["new message"]])
+        self.assertEqual(self.cache.get_metrics(), {"hits": 2, "misses": 3})
+
+    def test_query_and_persistence(self):
+        self.assertEqual(self.cache.embed_query("sprint"), [6.0, 0.25])
+        restarted = CachedEmbeddings(self.model, db_path=self.db_path)
+        self.assertEqual(restarted.embed_query("sprint"), [6.0, 0.25])
+        self.assertEqual(self.model.embedded, [["sprint"]])
+
+        # Another model doesn't share the entries
+        other = CachedEmbeddings(self.model, db_path=self.db_path, model="other")
+        other.embed_query("sprint")
+        self.assertEqual(len(self.model.embedded), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
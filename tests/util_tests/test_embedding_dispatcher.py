@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from scrumagent.embedding_dispatcher import EmbeddingDispatcher
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+class FakeEmbeddings(Embeddings):
+    model = "fake"
+
+    def __init__(self, failures=()):
+        self.requests = []
+        self.failures = list(failures)
+        self.active, self.max_active = 0, 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests.append(list(texts))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(0.02)
+            if failure:
+                raise failure
+            return [[float(len(text))] for text in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+def dispatcher(embeddings, **kwargs) -> EmbeddingDispatcher:
+    return EmbeddingDispatcher(embeddings, token_counter=len, base_delay=0.001, **kwargs)
+
+
+class EmbeddingDispatcherTest(unittest.TestCase):
+    def test_packing(self):
+        packer = dispatcher(FakeEmbeddings(), max_batch_tokens=10, max_batch_texts=3)
+        self.assertEqual(packer.pack(["aaaa", "bbbb", "cc", "dddddddddddd", "e", "f", "g", "h"]),
+                         [(0, 3, 10), (3, 4, 12), (4, 7, 3), (7, 8, 1)])
+
+    def test_parallel_requests_keep_order(self):
+        embeddings = FakeEmbeddings()
+        texts = ["x" * (i % 7 + 1) for i in range(40)]
+        vectors = dispatcher(embeddings, max_batch_tokens=20, parallel_requests=3).embed_documents(texts)
+        self.assertEqual(vectors, [[float(len(text))] for text in texts])
+        self.assertGreater(len(embeddings.requests), 3)
+        self.assertLessEqual(embeddings.max_active, 3)
+        self.assertGreater(embeddings.max_active, 1)
+
+    def test_retries(self):
+        embeddings = FakeEmbeddings(failures=[RateLimitError(), RateLimitError()])
+        embedder = dispatcher(embeddings, parallel_requests=1)
+        self.assertEqual(embedder.embed_documents(["ab"]), [[2.0]])
+        metrics = embedder.get_metrics()
+        self.assertEqual((metrics["requests"], metrics["retries"], metrics["texts"]), (3, 2, 1))
+
+        # Client errors are not retried
+        embeddings.failures = [BadRequestError()]
+        with self.assertRaises(BadRequestError):
+            embedder.embed_documents(["ab"])
+        self.assertEqual(embedder.get_metrics()["failed_requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
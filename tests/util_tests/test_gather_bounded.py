@@ -0,0 +1,39 @@
+import asyncio
+import unittest
+
+from scrumagent.utils import gather_bounded
+
+
+class GatherBoundedTest(unittest.TestCase):
+    def test_limit_and_failure_isolation(self):
+        running = 0
+        max_running = 0
+        managed = []
+
+        async def manage_user_story(user_story):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            try:
+                await asyncio.sleep(0.01)  # Taiga and discord calls
+                if user_story["ref"] == 3:
+                    raise RuntimeError("taiga unavailable")
+                managed.append(user_story["ref"])
+                return user_story["ref"]
+            finally:
+                running -= 1
+
+        user_stories = [{"ref": ref} for ref in range(1, 11)]
+        results = asyncio.run(gather_bounded(manage_user_story, user_stories, limit=4))
+
+        self.assertEqual(max_running, 4)
+        self.assertEqual(sorted(managed), [1, 2, 4, 5, 6, 7, 8, 9, 10])
+        self.assertIsInstance(results[2], RuntimeError)
+        self.assertEqual(results[:2] + results[3:], [1, 2, 4, 5, 6, 7, 8, 9, 10])
+
+    def test_empty(self):
+        self.assertEqual(asyncio.run(gather_bounded(asyncio.sleep, [], limit=2)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
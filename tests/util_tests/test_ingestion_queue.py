@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from scrumagent.data_collector.ingestion_queue import IngestionQueue
+
+
+class FakeCollector:
+    def __init__(self):
+        self.batches = []
+
+    def add_to_db_batch(self, ids, texts, metadatas):
+        self.batches.append(list(ids))
+        return ids
+
+
+class IngestionQueueTest(unittest.TestCase):
+    def test_flush_by_size(self):
+        collector = FakeCollector()
+
+        async def run():
+            queue = IngestionQueue(collector, max_batch_size=3, max_batch_age=60)
+            queue.start()
+            for i in range(7):
+                queue.enqueue([f"id_{i}"], [f"text {i}"], [{}])
+            await asyncio.sleep(0.1)
+            backlog = queue.backlog()
+            await queue.stop()
+            return backlog
+
+        backlog = asyncio.run(run())
+        self.assertEqual(backlog, 1)
+        self.assertEqual(collector.batches[:2], [["id_0", "id_1", "id_2"], ["id_3", "id_4", "id_5"]])
+        self.assertEqual(collector.batches[-1], ["id_6"])
+
+    def test_flush_by_age(self):
+        collector = FakeCollector()
+
+        async def run():
+            queue = IngestionQueue(collector, max_batch_size=100, max_batch_age=0.05)
+            queue.start()
+            queue.enqueue(["a", "b"], ["x", "y"], [{}, {}])
+            await asyncio.sleep(0.2)
+            metrics = queue.get_metrics()
+            await queue.stop()
+            return metrics
+
+        metrics = asyncio.run(run())
+        self.assertEqual(collector.batches, [["a", "b"]])
+        self.assertEqual(metrics["backlog"], 0)
+        self.assertEqual(metrics["flushed_docs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
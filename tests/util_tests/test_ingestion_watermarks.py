@@ -0,0 +1,117 @@
+import asyncio
+import datetime
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import discord
+
+from scrumagent.data_collector.discord_chat_collector import DiscordChatCollector
+from scrumagent.data_collector.ingestion_watermarks import IngestionWatermarks
+
+
+def metadata(channel_id, author_id, timestamp):
+    return {"guild_id": 1, "channel_id": channel_id, "author_id": author_id, "timestamp": timestamp}
+
+
+def make_message(message_id):
+    return SimpleNamespace(id=message_id, content=f"message {message_id}", type=discord.MessageType.default,
+                           created_at=datetime.datetime.fromtimestamp(message_id),
+                           author=SimpleNamespace(id=7, name="a"), flags=None, reference=None, attachments=[])
+
+
+class FakeChannel(discord.TextChannel):
+    type = "text"
+
+    def __init__(self, channel_id, messages):
+        self.id, self.name, self.messages = channel_id, f"channel {channel_id}", messages
+
+    async def history(self, limit=None, after=None, oldest_first=None):
+        assert oldest_first
+        for msg in self.messages:
+            if after is None or msg.id > after.id:
+                yield msg
+
+
+class FakeChroma:
+    def __init__(self, ids=(), metadatas=(), fail_after_batches=None):
+        self.ids, self.metadatas = list(ids), list(metadatas)
+        self.documents = [None] * len(self.ids)
+        self.batches = 0
+        self.fail_after_batches = fail_after_batches
+
+    def get(self, where=None, include=(), ids=None):
+        if ids is None:
+            return {"ids": self.ids, "metadatas": self.metadatas}
+        found = [i for i, _id in enumerate(self.ids) if _id in ids]
+        return {"ids": [self.ids[i] for i in found], "metadatas": [self.metadatas[i] for i in found],
+                "documents": [self.documents[i] for i in found]}
+
+    def add_texts(self, texts, metadatas, ids):
+        if self.fail_after_batches is not None and self.batches >= self.fail_after_batches:
+            raise ConnectionError("embedding request failed")
+        self.batches += 1
+        self.ids += ids
+        self.metadatas += metadatas
+        self.documents += texts
+        return ids
+
+
+class IngestionWatermarksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.watermarks = IngestionWatermarks(db_path=os.path.join(self.tmp_dir.name, "watermarks.sqlite"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_advance(self):
+        self.assertEqual(self.watermarks.get(1, 10), (None, None))
+        self.watermarks.advance([100, 102], [metadata(10, 7, 1.0), metadata(10, 8, 3.0)])
+        self.watermarks.advance([101], [metadata(10, 7, 2.0)])
+        # An older message doesn't move the watermark back
+        self.watermarks.advance([99], [metadata(10, 7, 0.5)])
+
+        self.assertEqual(self.watermarks.get(1, 10), (102, 3.0))
+        self.assertEqual(self.watermarks.get(1, 10, exclude_author_id=8), (101, 2.0))
+        self.assertEqual(self.watermarks.get(1, 11), (None, None))
+
+    def test_collector_backfill_and_batches(self):
+        chroma = FakeChroma(["discord_chat_5", "discord_chat_6"], [metadata(10, 7, 5.0), metadata(10, 7, 6.0)])
+        collector = DiscordChatCollector(SimpleNamespace(guilds=[]), chroma, watermarks=self.watermarks)
+        guild, channel = SimpleNamespace(id=1), SimpleNamespace(id=10)
+
+        self.assertFalse(self.watermarks.is_backfilled())
+        collector.backfill_watermarks()
+        self.assertTrue(self.watermarks.is_backfilled())
+        self.assertEqual(collector.get_last_msg_timestamps_in_db(guild, channel), 6.0)
+
+        collector.add_to_db_batch(ids=["discord_chat_9"], texts=["hi"], metadatas=[metadata(10, 3, 9.0)])
+        self.assertEqual(self.watermarks.get(1, 10), (9, 9.0))
+        self.assertEqual(collector.get_last_msg_timestamps_in_db(guild, channel, exclude_author_id=3), 6.0)
+
+    def test_chunked_catchup_resumes(self):
+        channels = [FakeChannel(10, [make_message(i) for i in range(1, 11)]),
+                    FakeChannel(11, [make_message(i) for i in range(20, 23)])]
+        guild = SimpleNamespace(id=1, name="guild", channels=channels, threads=[])
+        chroma = FakeChroma(fail_after_batches=2)
+        collector = DiscordChatCollector(SimpleNamespace(guilds=[guild]), chroma, watermarks=self.watermarks,
+                                         catchup_concurrency=1, catchup_chunk_size=4)
+
+        # Channel 10 is written in chunks of 4, the third chunk fails
+        asyncio.run(collector.check_all_unread_massages())
+        self.assertEqual(chroma.ids[:8], [f"discord_chat_{i}" for i in range(1, 9)])
+        self.assertEqual(self.watermarks.get_catchup_cursor(1, 10), (True, 8))
+
+        # The next run resumes after message 8 and completes both channels
+        chroma.fail_after_batches = None
+        asyncio.run(collector.check_all_unread_massages())
+        self.assertEqual(sorted(set(chroma.ids)), sorted(f"discord_chat_{i}" for i in [*range(1, 11), 20, 21, 22]))
+        self.assertEqual(len(chroma.ids), 13)
+        self.assertEqual(self.watermarks.get_catchup_cursor(1, 10), (False, None))
+        self.assertEqual(self.watermarks.get(1, 10)[0], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
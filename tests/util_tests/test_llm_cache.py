@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from scrumagent.agents.prompt_layout import cache_friendly_prompt, dynamic_context_message
+from scrumagent.llm_cache import LLMCacheStore
+
+
+class CountingChatModel(FakeMessagesListChatModel):
+    calls: int = 0
+
+    def _generate(self, messages, *args, **kwargs):
+        self.calls += 1
+        return super()._generate(messages, *args, **kwargs)
+
+
+class PrefixEmbeddings(Embeddings):
+    """Texts starting with the same word are identical."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(text.split()[0].lower() == word) for word in ("yesterday", "tomorrow", "today")] + [0.01]
+
+
+def answer(content):
+    return AIMessage(content=content, usage_metadata={"input_tokens": 10, "output_tokens": 1, "total_tokens": 11})
+
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = LLMCacheStore(db_path=os.path.join(self.tmp_dir.name, "llm_cache.sqlite"),
+                                   embeddings=PrefixEmbeddings(), semantic_threshold=0.99)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_exact_match(self):
+        llm = CountingChatModel(responses=[answer("first"), answer("second")],
+                                cache=self.store.for_call_site("gitea_summary", ttl=60, tags=("gitea",),
+                                                               semantic=False))
+        first = llm.invoke([SystemMessage(content="sys"), HumanMessage(content="open stories?", id="a")])
+        # Same conversation, other message ids
+        second = llm.invoke([SystemMessage(content="sys"), HumanMessage(content="open stories?", id="b")])
+        self.assertEqual((first.content, second.content, llm.calls), ("first", "first", 1))
+        self.assertNotEqual(first.id, second.id)
+        self.assertIsNone(second.usage_metadata, "cache hits must not be counted as token usage")
+
+        self.assertEqual(self.store.invalidate(tag="gitea"), 1)
+        self.assertEqual(llm.invoke("open stories?").content, "second")
+        self.assertEqual(self.store.get_metrics()["gitea_summary"], {"misses": 2, "exact_hits": 1})
+
+    def test_ttl_and_call_sites(self):
+        cache = self.store.for_call_site("web_browser", ttl=60, semantic=False)
+        llm = CountingChatModel(responses=[answer("a"), answer("b"), answer("c")], cache=cache)
+        llm.invoke("question")
+        cache.ttl = -1  # everything is expired
+        llm.invoke("question")
+        self.assertEqual(llm.calls, 2)
+
+        other_site = CountingChatModel(responses=[answer("x")],
+                                       cache=self.store.for_call_site("timeframe_parser", ttl=60, semantic=False))
+        self.assertEqual(other_site.invoke("question").content, "x")
+
+    def test_semantic_match(self):
+        llm = CountingChatModel(responses=[answer("-86400"), answer("+86400")],
+                                cache=self.store.for_call_site("timeframe_parser", ttl=60, semantic=True))
+        self.assertEqual(llm.invoke("yesterday please").content, "-86400")
+        self.assertEqual(llm.invoke("Yesterday at work").content, "-86400")
+        self.assertEqual(llm.invoke("tomorrow please").content, "+86400")
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(self.store.get_metrics()["timeframe_parser"]["semantic_hits"], 1)
+
+    @mock.patch("scrumagent.agents.prompt_layout.time.time", return_value=1_700_000_000)
+    def test_request_context_isolates_entries(self, now):
+        llm = CountingChatModel(responses=[answer("channel a"), answer("channel b"), answer("later")],
+                                cache=self.store.for_call_site("web_browser", ttl=3600, semantic=False))
+        question = [SystemMessage(content="sys"), HumanMessage(content="what happened today?")]
+
+        def ask(conversation):
+            return llm.invoke(question + [dynamic_context_message(conversation=conversation)]).content
+
+        self.assertEqual(ask("channel-a"), "channel a")
+        self.assertEqual(ask("channel-a"), "channel a")
+        # Never served to another conversation ...
+        self.assertEqual(ask("channel-b"), "channel b")
+        # ... or after the minute it was generated for
+        now.return_value += 60
+        self.assertEqual(ask("channel-a"), "later")
+        self.assertEqual(llm.calls, 3)
+
+    @mock.patch("scrumagent.agents.prompt_layout.time.time", return_value=1_700_000_000)
+    def test_semantic_match_with_prompt_layout(self, now):
+        # The last message of the prompt is the request context, the similarity must use the question
+        prompt = cache_friendly_prompt("You are a helpful worker.")
+        llm = CountingChatModel(responses=[answer("yesterday's messages"), answer("tomorrow's plan"),
+                                           answer("a minute later")],
+                                cache=self.store.for_call_site("web_browser", ttl=3600, semantic=True))
+        self.assertEqual(llm.invoke(prompt({"messages": [HumanMessage(content="yesterday please")]})).content,
+                         "yesterday's messages")
+        self.assertEqual(llm.invoke(prompt({"messages": [HumanMessage(content="tomorrow please")]})).content,
+                         "tomorrow's plan")
+        self.assertEqual(llm.invoke(prompt({"messages": [HumanMessage(content="Yesterday at work")]})).content,
+                         "yesterday's messages")
+        self.assertEqual(llm.calls, 2)
+
+        # Similar prompts are only looked up among the entries with the same request context
+        now.return_value += 60
+        self.assertEqual(llm.invoke(prompt({"messages": [HumanMessage(content="Yesterday at work")]})).content,
+                         "a minute later")
+
+    def test_no_db_before_first_use(self):
+        store = LLMCacheStore(db_path=os.path.join(self.tmp_dir.name, "lazy.sqlite"))
+        store.for_call_site("web_browser", ttl=60)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "lazy.sqlite")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import operator
+import os
+import tempfile
+import time
+import unittest
+from typing import Annotated
+from unittest import mock
+
+from langgraph.graph import StateGraph, START
+from typing_extensions import TypedDict
+
+from scrumagent.local_checkpointer import LocalCheckpointRetention, LRUSpillSaver
+from scrumagent.utils import sqlite_connect
+
+
+class EchoState(TypedDict):
+    texts: Annotated[list, operator.add]
+
+
+def build_echo_graph(checkpointer):
+    builder = StateGraph(EchoState)
+    builder.add_node("echo", lambda state: {"texts": [f"echo {state['texts'][-1]}"]})
+    builder.add_edge(START, "echo")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+class LRUSpillSaverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "checkpoints.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_eviction_and_reload(self):
+        saver = LRUSpillSaver(db_path=self.db_path, max_memory_bytes=3000)
+        graph = build_echo_graph(saver)
+        for i in range(5):
+            graph.invoke({"texts": [f"hello {i}" * 20]}, config(f"thread {i}"))
+
+        metrics = saver.get_metrics()
+        self.assertGreater(metrics["evictions"], 0)
+        self.assertLess(metrics["hot_threads"], 5)
+        self.assertLessEqual(metrics["memory_bytes"], 3000 + 2000)  # Only the current thread may exceed the cap
+
+        # An evicted thread is loaded from SQLite and continues where it stopped
+        result = graph.invoke({"texts": ["again"]}, config("thread 0"))
+        self.assertEqual(result["texts"], ["hello 0" * 20, "echo " + "hello 0" * 20, "again", "echo again"])
+        self.assertGreater(saver.get_metrics()["loads"], 0)
+
+    def test_restart(self):
+        graph = build_echo_graph(LRUSpillSaver(db_path=self.db_path))
+        graph.invoke({"texts": ["a"]}, config("t"))
+
+        async def continue_after_restart():
+            restarted = build_echo_graph(LRUSpillSaver(db_path=self.db_path))
+            await restarted.ainvoke({"texts": ["b"]}, config("t"))
+            history = [s async for s in restarted.aget_state_history(config("t"))]
+            return (await restarted.aget_state(config("t"))).values, history
+
+        values, history = asyncio.run(continue_after_restart())
+        self.assertEqual(values["texts"], ["a", "echo a", "b", "echo b"])
+        self.assertEqual(len(history), 6)  # input, loop step and echo of both runs
+
+    def test_delete_thread(self):
+        saver = LRUSpillSaver(db_path=self.db_path)
+        graph = build_echo_graph(saver)
+        graph.invoke({"texts": ["a"]}, config("t"))
+        saver.delete_thread("t")
+        self.assertEqual(build_echo_graph(LRUSpillSaver(db_path=self.db_path)).get_state(config("t")).values, {})
+
+    def test_thread_over_the_cap(self):
+        saver = LRUSpillSaver(db_path=self.db_path, max_memory_bytes=1, hot_checkpoints=3)
+        graph = build_echo_graph(saver)
+        for i in range(10):
+            graph.invoke({"texts": [f"hello {i}"]}, config("t"))
+
+        # Only the latest checkpoints of the single (never evicted) thread stay in memory
+        self.assertEqual(len(saver.storage["t"][""]), 3)
+        self.assertLessEqual(len([key for key in saver.blobs if key[0] == "t"]), 3 * 4)  # 4 channels
+        self.assertEqual(saver.get_metrics()["evictions"], 0)
+
+        history = list(graph.get_state_history(config("t")))
+        self.assertEqual(len(history), 30)
+        oldest = graph.get_state(history[-1].config)
+        self.assertEqual(oldest.values, {"texts": []})
+        self.assertEqual(graph.get_state(history[-3].config).values["texts"], ["hello 0", "echo hello 0"])
+        self.assertGreater(saver.get_metrics()["cold_reads"], 0)
+
+        result = graph.invoke({"texts": ["again"]}, config("t"))
+        self.assertEqual(result["texts"][-2:], ["again", "echo again"])
+        self.assertEqual(len(result["texts"]), 22)
+
+    def test_retention(self):
+        saver = LRUSpillSaver(db_path=self.db_path)
+        graph = build_echo_graph(saver)
+        for i in range(10):
+            graph.invoke({"texts": [f"hello {i}"]}, config("t"))
+        graph.invoke({"texts": ["old"]}, config("old"))
+
+        retention = LocalCheckpointRetention(saver, keep_latest=5, snapshot_interval_hours=0, thread_max_age_days=1)
+        with mock.patch("scrumagent.local_checkpointer.time.time", return_value=time.time()):
+            report = retention.run()
+        self.assertEqual(report["threads"], 2)
+        self.assertEqual(report["pruned_threads"], 0)
+        self.assertEqual(report["deleted_checkpoints"], 25)
+        self.assertGreater(report["deleted_blobs"], 0)
+        self.assertGreater(report["deleted_writes"], 0)
+
+        with sqlite_connect(self.db_path) as conn:
+            checkpoints = conn.execute("SELECT checkpoint_id, checkpoint_type, checkpoint FROM checkpoints "
+                                       "WHERE thread_id = 't'").fetchall()
+            blobs = set(conn.execute("SELECT channel, version FROM blobs WHERE thread_id = 't'"))
+            orphan_writes = conn.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 't' AND checkpoint_id NOT IN "
+                                         "(SELECT checkpoint_id FROM checkpoints)").fetchone()[0]
+        referenced = {item for _, c_type, c_value in checkpoints
+                      for item in saver.serde.loads_typed((c_type, c_value))["channel_versions"].items()}
+        self.assertEqual(len(checkpoints), 5)
+        self.assertEqual(blobs, referenced)
+        self.assertEqual(orphan_writes, 0)
+
+        restarted = build_echo_graph(LRUSpillSaver(db_path=self.db_path))
+        self.assertEqual(restarted.get_state(config("t")).values["texts"][-2:], ["hello 9", "echo hello 9"])
+        self.assertEqual(len(list(restarted.get_state_history(config("t")))), 5)
+
+        # A thread without a checkpoint for longer than thread_max_age_days is deleted
+        with mock.patch("scrumagent.local_checkpointer.time.time", return_value=time.time() + 2 * 24 * 3600):
+            report = retention.run()
+        self.assertEqual(report["pruned_threads"], 2)
+        self.assertEqual(restarted.get_state(config("old")).values, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from uuid import uuid4
+
+from scrumagent.metrics_store import MetricsStore, NodeLatencyCallbackHandler
+
+
+class MetricsStoreTest(unittest.TestCase):
+    def test_aggregate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = MetricsStore(db_path=os.path.join(tmp_dir, "metrics.sqlite"))
+            now = time.time()
+            store.record_invocation(now, 2.0, "proj_a", "#1 story", "mention", 100, 10, 0.01, cached_prompt_tokens=80)
+            store.record_invocation(now, 4.0, "proj_a", "#1 story scrum_master", "scrum_master", 300, 30, 0.03,
+                                    success=False)
+            store.record_invocation(now, 1.0, None, "user", "dm", 50, 5, 0.005)
+            # Older than the aggregation window
+            store.record_invocation(now - 10 * 24 * 60 * 60, 1.0, "proj_a", "#1 story", "mention", 1, 1, 1.0)
+
+            per_project = {r["project_slug"]: r for r in store.aggregate(days=7)}
+            self.assertEqual(per_project["proj_a"]["invocations"], 2)
+            self.assertEqual(per_project["proj_a"]["prompt_tokens"], 400)
+            self.assertAlmostEqual(per_project["proj_a"]["total_cost"], 0.04)
+            self.assertEqual(per_project["proj_a"]["max_duration_s"], 4.0)
+            self.assertEqual(per_project["proj_a"]["failed"], 1)
+            self.assertEqual(per_project["undefined"]["invocations"], 1)
+            self.assertAlmostEqual(per_project["proj_a"]["cache_hit_rate"], 0.2)
+
+            per_trigger = store.aggregate(days=7, group_by=("trigger",))
+            self.assertEqual([r["trigger"] for r in per_trigger], ["scrum_master", "mention", "dm"])
+
+            with self.assertRaises(ValueError):
+                store.aggregate(group_by=("total_cost",))
+
+    def test_migrates_old_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "metrics.sqlite")
+            conn = sqlite3.connect(db_path)
+            conn.execute("CREATE TABLE invocations (id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL, day TEXT, "
+                         "project_slug TEXT, thread_id TEXT, trigger TEXT, duration_s REAL, prompt_tokens INTEGER, "
+                         "completion_tokens INTEGER, total_cost REAL, success INTEGER)")
+            conn.commit()
+            conn.close()
+
+            store = MetricsStore(db_path=db_path)
+            store.record_invocation(time.time(), 1.0, "proj", "t", "dm", 10, 1, 0.0, cached_prompt_tokens=5)
+            self.assertEqual(store.aggregate()[0]["cached_prompt_tokens"], 5)
+
+    def test_node_latencies(self):
+        handler = NodeLatencyCallbackHandler()
+        run_id, sub_run_id = uuid4(), uuid4()
+        handler.on_chain_start({}, {}, run_id=run_id, name="taiga",
+                               metadata={"langgraph_node": "taiga", "langgraph_checkpoint_ns": "taiga:1"})
+        # Nodes of the react sub graph are not counted separately
+        handler.on_chain_start({}, {}, run_id=sub_run_id, name="agent",
+                               metadata={"langgraph_node": "agent", "langgraph_checkpoint_ns": "taiga:1|agent:2"})
+        handler.on_chain_end({}, run_id=sub_run_id)
+        handler.on_chain_end({}, run_id=run_id)
+        self.assertEqual(dict(handler.node_calls), {"taiga": 1})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = MetricsStore(db_path=os.path.join(tmp_dir, "metrics.sqlite"))
+            store.record_invocation(time.time(), 1.0, "proj", "t", "mention", 1, 1, 0.0, node_latencies=handler)
+            summary = store.node_latency_summary()
+            self.assertEqual([(r["node"], r["calls"]) for r in summary], [("taiga", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import time
+import unittest
+
+from scrumagent.passive_message_buffer import PassiveMessageBuffer
+
+
+class PassiveMessageBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "passive_messages.sqlite")
+        self.buffer = PassiveMessageBuffer(db_path=self.db_path, max_messages=3, max_age=60)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_take_in_order(self):
+        self.buffer.add("a", "first")
+        self.buffer.add("b", "other thread")
+        self.buffer.add("a", "second")
+
+        self.assertEqual([m.content for m in self.buffer.take("a")], ["first", "second"])
+        self.assertEqual(self.buffer.take("a"), [])
+        self.assertEqual(self.buffer.get_metrics()["pending_messages"], 1)
+
+    def test_limits(self):
+        self.assertFalse(self.buffer.add("a", "1"))
+        self.assertFalse(self.buffer.add("a", "2"))
+        self.assertTrue(self.buffer.add("a", "3"))
+        self.assertEqual(self.buffer.due_threads(), ["a"])
+
+        self.buffer.add("b", "old")
+        self.assertNotIn("b", self.buffer.due_threads())
+        self.buffer.max_age = 0
+        time.sleep(0.01)
+        self.assertIn("b", self.buffer.due_threads())
+
+    def test_persistent(self):
+        self.buffer.add("a", "before restart")
+        restarted = PassiveMessageBuffer(db_path=self.db_path)
+        self.assertEqual([m.content for m in restarted.take("a")], ["before restart"])
+
+
+if __name__ == "__main__":
+    unittest.main()
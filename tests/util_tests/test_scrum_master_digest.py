@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+
+from scrumagent.scrum_master_digest import ScrumMasterDigestStore, compute_story_digest
+
+
+class ScrumMasterDigestTest(unittest.TestCase):
+    def test_digest_changes(self):
+        user_story = {"modified_date": "2025-01-01", "version": 3,
+                      "related": {"tasks": [{"ref": 2, "status": "New", "modified_date": "2025-01-01", "version": 1},
+                                            {"ref": 1, "status": "Done", "modified_date": "2025-01-01", "version": 4}]}}
+        digest = compute_story_digest(user_story, 1700000000.0)
+
+        reordered = dict(user_story, related={"tasks": list(reversed(user_story["related"]["tasks"]))})
+        self.assertEqual(digest, compute_story_digest(reordered, 1700000000.0))
+        self.assertNotEqual(digest, compute_story_digest(user_story, 1700000001.0))
+
+        task_changed = dict(user_story, related={"tasks": [dict(user_story["related"]["tasks"][0], status="Done"),
+                                                           user_story["related"]["tasks"][1]]})
+        self.assertNotEqual(digest, compute_story_digest(task_changed, 1700000000.0))
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ScrumMasterDigestStore(db_path=os.path.join(tmp_dir, "digests.sqlite"))
+            self.assertIsNone(store.get_digest("proj", 1))
+            store.set_digest("proj", 1, "abc")
+            self.assertEqual(store.get_digest("proj", 1), "abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
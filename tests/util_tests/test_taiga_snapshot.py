@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from scrumagent.taiga_snapshot import TaigaSnapshot
+
+
+def make_us(ref, version, modified_date, milestone=1, is_closed=False, watchers=()):
+    return SimpleNamespace(id=ref * 10, ref=ref, version=version, modified_date=modified_date, subject=f"Story {ref}",
+                           description=f"Description {ref}", is_closed=is_closed, milestone=milestone,
+                           assigned_to=None, watchers=list(watchers), status_extra_info={"name": "New"})
+
+
+def make_task(ref, us_ref, version, modified_date, assigned_to=None):
+    return SimpleNamespace(id=ref * 100, ref=ref, version=version, modified_date=modified_date, subject=f"Task {ref}",
+                           user_story=us_ref * 10, assigned_to=assigned_to, watchers=[],
+                           status_extra_info={"name": "In progress", "is_closed": False})
+
+
+class FakeProject:
+    slug = "test-project"
+    id = 1
+    requester = None
+    is_backlog_activated = True
+
+    def __init__(self):
+        self.user_stories = []
+        self.list_calls = []
+        self.detail_calls = []
+
+    def list_user_stories(self, **queryparams):
+        self.list_calls.append(queryparams)
+        since = queryparams.get("modified_date__gt")
+        return [us for us in self.user_stories if not since or us.modified_date > since]
+
+    def get_userstory_by_ref(self, ref):
+        self.detail_calls.append(ref)
+        return next(us for us in self.user_stories if us.ref == ref)
+
+
+class TaigaSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.snapshot = TaigaSnapshot(db_path=os.path.join(self.tmp_dir.name, "snapshot.sqlite"))
+        self.project = FakeProject()
+        self.tasks = []
+        self.task_calls = []
+
+        def list_tasks(**queryparams):
+            self.task_calls.append(queryparams)
+            since = queryparams.get("modified_date__gt")
+            return [t for t in self.tasks if not since or t.modified_date > since]
+
+        self.get_project = mock.Mock(return_value=self.project)
+        self.patches = [mock.patch("scrumagent.taiga_snapshot.get_project", self.get_project),
+                        mock.patch("scrumagent.taiga_snapshot.Tasks",
+                                   return_value=SimpleNamespace(list=list_tasks))]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp_dir.cleanup()
+
+    def test_incremental_sync(self):
+        self.project.user_stories = [make_us(1, 1, "2025-01-01T00:00:00Z", watchers=[5]),
+                                     make_us(2, 1, "2025-01-02T00:00:00Z", milestone=None)]
+        self.tasks = [make_task(3, 1, 1, "2025-01-01T01:00:00Z", assigned_to=7)]
+
+        self.assertEqual(self.snapshot.sync("test-project"), {1, 2})
+        self.assertEqual(self.project.detail_calls, [1, 2])
+
+        # Nothing changed: one delta query, no project, task or detail requests
+        self.assertEqual(self.snapshot.sync("test-project"), set())
+        self.assertEqual(self.project.list_calls[-1], {"modified_date__gt": "2025-01-02T00:00:00Z"})
+        self.assertEqual(self.project.detail_calls, [1, 2])
+        self.assertEqual((self.get_project.call_count, len(self.task_calls)), (1, 1))
+
+        # A task change alone is only seen with include_tasks (or with a story change / full sync)
+        self.tasks[0] = make_task(3, 1, 2, "2025-01-03T00:00:00Z", assigned_to=8)
+        self.assertEqual(self.snapshot.sync("test-project"), set())
+        self.assertEqual(self.snapshot.sync("test-project", include_tasks=True), {1})
+        self.assertEqual(self.task_calls[-1], {"project": 1, "modified_date__gt": "2025-01-01T01:00:00Z"})
+
+        user_story = self.snapshot.get_user_story("test-project", 1)
+        self.assertEqual(user_story["watchers"], [5])
+        self.assertEqual(user_story["related"]["tasks"][0]["assigned_to"], 8)
+
+        # Backlog is activated, so only stories in a sprint are open
+        self.assertEqual([us["ref"] for us in self.snapshot.list_open_user_stories("test-project")], [1])
+
+    def test_sync_if_stale(self):
+        self.assertIsNotNone(self.snapshot.sync_if_stale("test-project", max_age=60))
+        self.assertIsNone(self.snapshot.sync_if_stale("test-project", max_age=60))
+        self.assertEqual(len(self.project.list_calls), 1)
+        self.assertIsNotNone(self.snapshot.sync_if_stale("test-project", max_age=0))
+
+    def test_full_sync_removes_deleted_stories(self):
+        self.project.user_stories = [make_us(1, 1, "2025-01-01T00:00:00Z"), make_us(2, 1, "2025-01-02T00:00:00Z")]
+        self.snapshot.sync("test-project")
+
+        self.project.user_stories = self.project.user_stories[:1]
+        self.assertEqual(self.snapshot.sync("test-project", force_full=True), {2})
+        self.assertIsNone(self.snapshot.get_user_story("test-project", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from scrumagent.thread_registry import DiscordThreadRegistry, parse_thread_ref
+
+
+def make_thread(thread_id, name, parent_id=1):
+    return SimpleNamespace(id=thread_id, name=name, parent_id=parent_id)
+
+
+class FakeChannel:
+    id = 1
+    name = "taiga-threads"
+
+    def __init__(self, active, archived_public, archived_private):
+        self.threads = active
+        self._archived = {False: archived_public, True: archived_private}
+
+    async def archived_threads(self, private=False, joined=False, limit=100):
+        for thread in self._archived[private]:
+            yield thread
+
+
+class DiscordThreadRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.registry = DiscordThreadRegistry(db_path=os.path.join(self.tmp_dir.name, "registry.sqlite"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_thread_ref(self):
+        self.assertEqual(parse_thread_ref("#123 Some story"), 123)
+        self.assertIsNone(parse_thread_ref("general"))
+        self.assertIsNone(parse_thread_ref("#abc story"))
+
+    def test_full_scan_and_rename(self):
+        channel = FakeChannel(active=[make_thread(30, "#5 New subject")],
+                              archived_public=[make_thread(20, "#5 Old subject"), make_thread(21, "#6 Other")],
+                              archived_private=[make_thread(22, "no user story")])
+        self.assertTrue(self.registry.needs_full_scan(channel.id))
+        registered = asyncio.run(self.registry.full_scan("proj", channel))
+
+        self.assertEqual(registered, 3)
+        self.assertFalse(self.registry.needs_full_scan(channel.id))
+        # The oldest thread of a duplicated ref wins
+        self.assertEqual(self.registry.get_threads("proj"), {5: 20, 6: 21})
+
+        # Renaming the registered thread keeps the mapping
+        self.registry.register_thread("proj", make_thread(20, "#5 Renamed"), replace=False)
+        self.assertEqual(self.registry.get_thread_id("proj", 5), 20)
+
+        self.registry.remove_thread(20)
+        self.assertIsNone(self.registry.get_thread_id("proj", 5))
+
+
+if __name__ == "__main__":
+    unittest.main()